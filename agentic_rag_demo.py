@@ -6,6 +6,7 @@ import pdfplumber
 from datetime import datetime
 import re
 from vector_store import (
+    COMMON_SURNAMES,
     vectorize_document, 
     search_similar, 
     num_tokens_from_string,
@@ -15,17 +16,39 @@ from vector_store import (
 import pandas as pd
 import json
 import os
+import shutil
 from pymongo import MongoClient
 from bson import json_util
 import time
 import traceback
 from config import (
     get_openai_client, 
+    make_api_request,
+    stream_api_request,
     get_mongodb_config, 
     get_system_config,
     get_graph_database_config,
-    ENV_CONFIG
+    get_neo4j_driver,
+    get_sentence_transformer_config,
+    get_tokenizer_config,
+    ENV_CONFIG,
+    OPENAI_CONFIG
 )
+from model_registry import model_registry
+from vector_upsert import source_record_key
+from tokenizer_service import tokenizer_service
+from retrieval_executor import retrieval_executor
+from graph_store import get_graph_store
+from graph_snapshot import file_version, snapshot_path_for
+from graph_builder import update_graph_from_mongodb
+from graph_query_engine import GraphQueryEngine, format_report, format_rows
+from graph_cypher import Neo4jGraphQueryEngine
+from neo4j_sync import sync_graph
+from query_plan_cache import get_query_plan_cache
+from llm_health import get_llm_health_monitor
+from rate_limiter import get_rate_limiter
+from llm_client_pool import get_client_pool
+from llm_stream import AnswerStreamError, stream_answer
 
 def check_data_initialized():
     """检查是否已有数据"""
@@ -121,9 +144,9 @@ def get_structured_data(text: str) -> dict:
             text=text
         )
 
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
+        response = make_api_request(
+            client, model,
+            [
                 {
                     "role": "system", 
                     "content": "你是一个医疗信息结构化专家，擅长从病历中提取关键医疗信息并生成规范的JSON数据。请严格按照示例格式提取信息，使用中文字段名。"
@@ -133,7 +156,7 @@ def get_structured_data(text: str) -> dict:
                     "content": prompt
                 }
             ],
-            temperature=temperature
+            temperature
         )
         
         # 获取并解析JSON响应
@@ -219,9 +242,9 @@ def get_database_commands(text: str) -> dict:
         st.write("发送给AI的提示词：")
         st.code(prompt[:200] + "...")  # 只显示前200个字符
         
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
+        response = make_api_request(
+            client, model,
+            [
                 {
                     "role": "system", 
                     "content": "你是一个医疗数据库专家。请严格按照JSON格式返回数据库命令，确保SQL语句和图数据库命令都是完整且可执行的。"
@@ -231,7 +254,7 @@ def get_database_commands(text: str) -> dict:
                     "content": prompt
                 }
             ],
-            temperature=temperature
+            temperature
         )
         
         # 获取响应文本
@@ -341,6 +364,16 @@ if 'file_indices' not in st.session_state:
 if 'structured_data' not in st.session_state:
     st.session_state.structured_data = {}
 
+# 预加载向量模型（进程内只加载一次，之后的重跑和新会话直接复用）
+if get_sentence_transformer_config().get("warm_up_on_startup", False):
+    if not model_registry.is_loaded():
+        with st.spinner("正在加载向量模型..."):
+            model_registry.warm_up()
+
+# 预加载分词词典和医学用户词典（同样每个进程只做一次）
+if get_tokenizer_config().get("warm_up_on_startup", False):
+    tokenizer_service.initialize()
+
 # PDF解析类
 class MedicalRecordParser:
     def __init__(self, pdf_content):
@@ -562,24 +595,33 @@ def import_medical_data(pdf_content):
             st.error("结构化数据提取失败")
             return False
         
-        # 添加元数据
+        # 添加元数据；record_key 由源文档内容生成，同一份文档重复导入时对应同一条记录
+        record_key = source_record_key(pdf_content)
         data['metadata'] = {
             'import_time': datetime.now().isoformat(),
             'source_type': 'pdf',
+            'record_key': record_key,
             'last_updated': datetime.now().isoformat()
         }
         
         # 保存到MongoDB
         st.write("保存结构化数据到MongoDB...")
         try:
-            # 保存到patients集合
-            result = db.patients.insert_one(data)
-            st.write(f" 数据保存到MongoDB (ID: {result.inserted_id})")
+            # 保存到patients集合：已导入过的文档覆盖原记录并沿用其 _id，不新增重复记录
+            existing = db.patients.find_one({'metadata.record_key': record_key}, {'_id': 1, 'metadata.import_time': 1})
+            if existing:
+                record_id = existing['_id']
+                data['metadata']['import_time'] = existing.get('metadata', {}).get('import_time', data['metadata']['import_time'])
+                db.patients.replace_one({'_id': record_id}, data)
+                st.write(f" 数据已存在，更新MongoDB记录 (ID: {record_id})")
+            else:
+                record_id = db.patients.insert_one(data).inserted_id
+                st.write(f" 数据保存到MongoDB (ID: {record_id})")
             
             # 保存ID到session state以便后续查询
             if 'mongodb_records' not in st.session_state:
                 st.session_state.mongodb_records = []
-            st.session_state.mongodb_records.append(str(result.inserted_id))
+            st.session_state.mongodb_records.append(str(record_id))
             
             # 同时保存到session state用于即时查询
             st.session_state.structured_data = data
@@ -590,12 +632,17 @@ def import_medical_data(pdf_content):
         
         # 向量化文档
         st.write("开始向量文档...")
-        chunks, index = vectorize_document(pdf_content)
-        # 使用患者姓名作为文件名
+        # 使用患者姓名作为文件名，块 ID 以源文档标识区分同一患者的多份病历；重复导入同一份文档时不写入新向量
         file_name = f"{data.get('患者姓名', '未知患者')}的病历"
+        chunks, index = vectorize_document(pdf_content, file_name, record_id=record_key)
         st.session_state.file_chunks[file_name] = chunks
         st.session_state.file_indices[file_name] = index
         st.write(f"✅ 向量化成功，共生成 {len(chunks)} 个文档块")
+        upsert_stats = st.session_state.get('last_upsert_stats')
+        if upsert_stats:
+            st.write(f"   上传 {upsert_stats['vectors']} 个（{upsert_stats['batches']} 批，"
+                     f"重试 {upsert_stats['retries']} 次），跳过已存在的 {upsert_stats['skipped']} 个，"
+                     f"删除旧块 {upsert_stats.get('deleted', 0)} 个，耗时 {upsert_stats['seconds']:.2f}s")
         
         return True
     except Exception as e:
@@ -630,8 +677,7 @@ def generate_simple_graph_query(query: str) -> dict:
         query_lower = query.lower()
         
         # 提取患者姓名
-        common_surnames = "李王张刘陈杨黄周吴马蒲赵钱孙朱胡郭何高林罗郑梁谢宋唐许邓冯韩曹曾彭萧蔡潘田董袁于余叶蒋杜苏魏程吕丁沈任姚卢傅钟姜崔谭廖范汪陆金石戴贾韦夏邱方侯邹熊孟秦白江阎薛尹段雷黎史龙陶贺顾毛郝龚邵万钱严覃武戴莫孔向汤"
-        pattern = f'([{common_surnames}])某某'
+        pattern = f'([{COMMON_SURNAMES}])某某'
         patient_match = re.search(pattern, query)
         patient_name = patient_match.group(0) if patient_match else "周某某"  # 默认患者
         
@@ -676,36 +722,54 @@ def generate_simple_graph_query(query: str) -> dict:
         st.error(f"生成简化查询条件错误: {str(e)}")
         return None
 
+def get_cached_query_plan(kind: str, query: str):
+    """查询计划缓存：命中时返回代入当前槽位后的计划，未命中或缓存不可用时返回 None"""
+    try:
+        plan_cache = get_query_plan_cache()
+        cached = plan_cache.lookup(kind, query) if plan_cache is not None else None
+    except Exception as e:
+        st.warning(f"查询计划缓存不可用: {str(e)}")
+        return None
+    if cached is None:
+        return None
+    plan, match_type, similarity = cached
+    st.write(f"✅ 命中查询计划缓存（{'精确匹配' if match_type == 'exact' else f'相似问题，相似度 {similarity:.2f}'}），跳过LLM调用")
+    st.code(json.dumps(plan, ensure_ascii=False, indent=2), language="json")
+    return plan
+
+def cache_query_plan(kind: str, query: str, plan: dict, generate_seconds: float):
+    """缓存LLM生成的查询计划"""
+    try:
+        plan_cache = get_query_plan_cache()
+        if plan_cache is not None:
+            plan_cache.store(kind, query, plan, generate_seconds)
+    except Exception as e:
+        st.warning(f"写入查询计划缓存失败: {str(e)}")
+
 def generate_graph_query(query: str) -> dict:
     """使用LLM生成图数据库查询条件"""
     try:
+        cached_plan = get_cached_query_plan("graph", query)
+        if cached_plan is not None:
+            return cached_plan
+        generate_start = time.perf_counter()
+        
         st.write("开始创建OpenAI客户端...")
         
-        # 首先测试API连接
-        from config import test_openai_client
-        api_working, api_message = test_openai_client()
-        if not api_working:
-            st.error(f"API连接测试失败: {api_message}")
+        # 读取后台健康检查缓存的端点状态，不在查询路径上额外发送测试请求
+        health_monitor = get_llm_health_monitor()
+        if health_monitor is not None and not health_monitor.any_available():
+            st.error("LLM端点均处于熔断状态，暂不可用")
             st.warning("将使用简化的图查询方式")
             return generate_simple_graph_query(query)
         
-        st.write(f"✅ API连接测试成功: {api_message}")
         client, model, temperature = get_openai_client()
         
-        # 读取图数据库的结构信息
-        G = nx.read_gexf("medical_graph.gexf")
-        
-        # 获取图的基本信息
-        graph_info = {
-            "node_types": list(set(nx.get_node_attributes(G, 'node_type').values())),
-            "relationships": list(set(nx.get_edge_attributes(G, 'edge_type').values())),
-            "nodes_sample": {
-                node: data for node, data in list(G.nodes(data=True))[:5]
-            },
-            "edges_sample": {
-                f"{u}->{v}": data for u, v, data in list(G.edges(data=True))[:5]
-            }
-        }
+        # 读取图数据库的结构信息（图文件未变化时直接复用缓存）
+        graph_info = get_graph_store().schema()
+        if graph_info is None:
+            st.warning("图数据库文件不存在，请先导入数据")
+            return None
         
         prompt = f"""请根据问题和图数据库结构生成图数据库查询条件。
 
@@ -743,6 +807,26 @@ def generate_graph_query(query: str) -> dict:
     "return": ["end_node.name", "end_node.value"]
 }}
 
+4. 涉及多个条件或多跳关系的问题（例如：哪些诊断为脑梗死的患者肌酐偏高），使用路径模式：
+{{
+    "match": [
+        {{"path": [
+            {{"var": "p", "type": "patient"}},
+            {{"type": "has_diagnosis"}},
+            {{"var": "d", "type": "diagnosis", "where": {{"content": {{"$contains": "脑梗死"}}}}}}
+        ]}},
+        {{"path": [
+            {{"var": "p"}},
+            {{"type": "has_lab_result"}},
+            {{"var": "l", "type": "lab_result", "where": {{"indicator_name": "肌酐", "indicator_value": {{"$gt": 133}}}}}}
+        ]}}
+    ],
+    "return": ["p.name", "d.content", "l.indicator_value"],
+    "limit": 20
+}}
+path 中节点与关系交替出现，同名变量表示同一个节点，多个 path 必须通过同名变量相连；节点可用 "name" 指定一个或多个节点ID；
+where 支持 $eq $ne $in $contains $regex $gt $gte $lt $lte
+
 注意：
 1. 从用户问题中提取正确的患者姓名
 2. 使用正确的节点类型和关系类型
@@ -752,7 +836,6 @@ def generate_graph_query(query: str) -> dict:
 请直接返回查询条件的JSON字符串，不要包含任何其他内容。"""
 
         st.write("🔄 正在调用OpenAI API...")
-        from config import make_api_request
         response = make_api_request(
             client, model,
             [
@@ -785,7 +868,9 @@ def generate_graph_query(query: str) -> dict:
         st.write("生成的图数据库查询条件：")
         st.code(query_str, language="json")
         
-        return json.loads(query_str)
+        query_obj = json.loads(query_str)
+        cache_query_plan("graph", query, query_obj, time.perf_counter() - generate_start)
+        return query_obj
         
     except Exception as e:
         st.error(f"生成图数据库查询条件错误: {str(e)}")
@@ -797,7 +882,8 @@ def get_graph_search_results(query: str) -> list:
     """从图数据库中搜索相关信息"""
     try:
         # 检查图数据库文件是否存在
-        if not os.path.exists("medical_graph.gexf"):
+        graph_store = get_graph_store()
+        if not graph_store.exists():
             st.warning("图数据库文件不存在，请先导入数据")
             return []
             
@@ -806,62 +892,64 @@ def get_graph_search_results(query: str) -> list:
         if not query_obj:
             return []
         
-        G = nx.read_gexf("medical_graph.gexf")
+        # 多跳、多模式查询和旧的单跳查询都交给查询引擎，一次求值得到全部结果
+        query_result = None
+        if get_graph_database_config().get("query_backend") == "neo4j":
+            # 编译成参数化 Cypher，通过共享的 Neo4j Driver 执行；失败时回退到本地图
+            try:
+                query_result = Neo4jGraphQueryEngine(get_neo4j_driver()).execute(query_obj)
+            except Exception as neo_error:
+                st.warning(f"Neo4j 查询失败，改用本地图查询: {str(neo_error)}")
+        if query_result is None:
+            query_result = GraphQueryEngine(graph_store).execute(query_obj)
+        st.caption(f"图查询代价: {format_report(query_result.report)}")
+        if "match" in query_obj:
+            return format_rows(query_result)
+        
+        # 旧格式沿用原有的结果拼接方式
         results = []
-        
-        # 根据查询条件执行搜索
-        start_nodes = [node for node, data in G.nodes(data=True)
-                      if data.get('node_type') == query_obj["start_node"]["type"] and 
-                         node == query_obj["start_node"]["name"]]
-        
-        for start_node in start_nodes:
-            # 获取所有邻居节点
-            for neighbor in G.neighbors(start_node):
-                edge_data = G.get_edge_data(start_node, neighbor)
-                neighbor_data = G.nodes[neighbor]
-                
-                # 检查关系类型和终点节点类型是否匹配
-                if (edge_data.get("edge_type") == query_obj["relationship"] and
-                    neighbor_data.get('node_type') == query_obj["end_node"]["type"]):
-                    
-                    # 构建结果
-                    result = []
-                    for attr in query_obj["return"]:
-                        node_type, attr_name = attr.split(".")
-                        if node_type == "end_node":
-                            # 根据节点类型优先查找相应的属性
-                            if neighbor_data.get('node_type') == 'lab_result':
-                                # 实验室结果：优先indicator_name和indicator_value
-                                if attr_name == 'field_name':
-                                    value = neighbor_data.get('indicator_name', '')
-                                elif attr_name == 'field_value':
-                                    value = neighbor_data.get('indicator_value', '')
-                                else:
-                                    value = (neighbor_data.get('indicator_name') or 
-                                           neighbor_data.get('indicator_value') or 
-                                           neighbor_data.get(attr_name) or '')
-                            elif neighbor_data.get('node_type') == 'basic_info':
-                                # 基本信息：使用field_name和field_value
-                                value = (neighbor_data.get('field_value') or 
-                                       neighbor_data.get('field_name') or 
-                                       neighbor_data.get(attr_name) or '')
-                            else:
-                                # 其他类型：优先content属性
-                                value = (neighbor_data.get('content') or 
-                                       neighbor_data.get('field_value') or 
-                                       neighbor_data.get('indicator_value') or
-                                       neighbor_data.get(attr_name) or '')
-                            result.append(f"{attr_name}: {value}")
+        for binding in query_result.bindings:
+            start_node = binding["start_node"]
+            neighbor_data = query_result.node(binding["end_node"])
+            edge_data = binding["relationship"]
+            # 构建结果
+            result = []
+            for attr in query_obj["return"]:
+                node_type, attr_name = attr.split(".")
+                if node_type == "end_node":
+                    # 根据节点类型优先查找相应的属性
+                    if neighbor_data.get('node_type') == 'lab_result':
+                        # 实验室结果：优先indicator_name和indicator_value
+                        if attr_name == 'field_name':
+                            value = neighbor_data.get('indicator_name', '')
+                        elif attr_name == 'field_value':
+                            value = neighbor_data.get('indicator_value', '')
+                        else:
+                            value = (neighbor_data.get('indicator_name') or 
+                                   neighbor_data.get('indicator_value') or 
+                                   neighbor_data.get(attr_name) or '')
+                    elif neighbor_data.get('node_type') == 'basic_info':
+                        # 基本信息：使用field_name和field_value
+                        value = (neighbor_data.get('field_value') or 
+                               neighbor_data.get('field_name') or 
+                               neighbor_data.get(attr_name) or '')
+                    else:
+                        # 其他类型：优先content属性
+                        value = (neighbor_data.get('content') or 
+                               neighbor_data.get('field_value') or 
+                               neighbor_data.get('indicator_value') or
+                               neighbor_data.get(attr_name) or '')
+                    result.append(f"{attr_name}: {value}")
                     
-                    results.append(f"{start_node} -> {edge_data.get('edge_type')} -> {' | '.join(result)}")
+            results.append(f"{start_node} -> {edge_data.get('edge_type')} -> {' | '.join(result)}")
         
         return results
     except Exception as e:
         st.error(f"图数据库搜索错误: {str(e)}")
         return []
 
-def build_graph_from_mongodb():
-    """从MongoDB数据构建图数据库"""
+def build_graph_from_mongodb(full_rebuild=False):
+    """从MongoDB数据构建图数据库：只更新病历有变化的患者，full_rebuild=True 时全量重建"""
     try:
         # 连接MongoDB
         st.write("连接MongoDB...")
@@ -870,126 +958,17 @@ def build_graph_from_mongodb():
             st.error("MongoDB连接失败")
             return False
         
-        # 获取所有患者数据
-        st.write("获取患者数据...")
-        docs = list(db.patients.find())
-        if not docs:
+        if db.patients.count_documents({}, limit=1) == 0:
             st.warning("MongoDB中没有患者数据，请先导入数据")
             return False
         
-        st.write(f"找到 {len(docs)} 个患者记录")
-        
-        # 创建图
-        G = nx.Graph()
-        
-        for doc in docs:
-            try:
-                patient_name = doc.get('患者姓名', '未知患者')
-                st.write(f"处理患者: {patient_name}")
-                
-                # 添加患者节点
-                G.add_node(patient_name, node_type="patient")
-                
-                # 添加基本信息节点
-                try:
-                    basic_info_fields = ['性别', '年龄', '民族', '职业', '婚姻状况']
-                    for field in basic_info_fields:
-                        if field in doc and doc[field]:
-                            node_id = f"{field}_{doc[field]}_{patient_name}"
-                            G.add_node(node_id, 
-                                      node_type="basic_info",
-                                      field_name=field, 
-                                      field_value=str(doc[field]))
-                            G.add_edge(patient_name, node_id, edge_type="has_basic_info")
-                except Exception as basic_error:
-                    st.warning(f"处理患者 {patient_name} 的基本信息时出错: {str(basic_error)}")
-                
-                # 添加诊断节点
-                try:
-                    if '诊断' in doc and doc['诊断']:
-                        diagnosis_node = f"诊断_{doc['诊断']}_{patient_name}"
-                        G.add_node(diagnosis_node,
-                                  node_type="diagnosis", 
-                                  content=str(doc['诊断']))
-                        G.add_edge(patient_name, diagnosis_node, edge_type="has_diagnosis")
-                except Exception as diag_error:
-                    st.warning(f"处理患者 {patient_name} 的诊断时出错: {str(diag_error)}")
-                
-                # 添加主诉节点
-                try:
-                    if '主诉' in doc and doc['主诉']:
-                        complaint_node = f"主诉_{patient_name}"
-                        G.add_node(complaint_node,
-                                  node_type="chief_complaint",
-                                  content=str(doc['主诉']))
-                        G.add_edge(patient_name, complaint_node, edge_type="has_complaint")
-                except Exception as complaint_error:
-                    st.warning(f"处理患者 {patient_name} 的主诉时出错: {str(complaint_error)}")
-                
-                # 添加现病史节点
-                try:
-                    if '现病史' in doc and doc['现病史']:
-                        history_node = f"现病史_{patient_name}"
-                        G.add_node(history_node,
-                                  node_type="present_illness",
-                                  content=str(doc['现病史']))
-                        G.add_edge(patient_name, history_node, edge_type="has_present_illness")
-                except Exception as history_error:
-                    st.warning(f"处理患者 {patient_name} 的现病史时出错: {str(history_error)}")
-                
-                # 添加生化指标节点
-                try:
-                    if '生化指标' in doc and doc['生化指标']:
-                        lab_data = doc['生化指标']
-                        st.write(f"生化指标数据类型: {type(lab_data)}")
-                        if isinstance(lab_data, dict):
-                            for indicator, value in lab_data.items():
-                                if value:
-                                    indicator_node = f"生化指标_{indicator}_{value}_{patient_name}"
-                                    G.add_node(indicator_node,
-                                              node_type="lab_result",
-                                              indicator_name=str(indicator),
-                                              indicator_value=str(value))
-                                    G.add_edge(patient_name, indicator_node, edge_type="has_lab_result")
-                        elif isinstance(lab_data, list):
-                            for i, item in enumerate(lab_data):
-                                if isinstance(item, dict):
-                                    for indicator, value in item.items():
-                                        if value:
-                                            indicator_node = f"生化指标_{indicator}_{value}_{patient_name}_{i}"
-                                            G.add_node(indicator_node,
-                                                      node_type="lab_result",
-                                                      indicator_name=str(indicator),
-                                                      indicator_value=str(value))
-                                            G.add_edge(patient_name, indicator_node, edge_type="has_lab_result")
-                        else:
-                            st.warning(f"患者 {patient_name} 的生化指标数据格式不支持: {type(lab_data)}")
-                except Exception as lab_error:
-                    st.warning(f"处理患者 {patient_name} 的生化指标时出错: {str(lab_error)}")
-                    st.write(f"生化指标数据: {doc.get('生化指标', 'N/A')}")
-                
-                # 添加治疗方案节点
-                try:
-                    if '治疗方案' in doc and doc['治疗方案']:
-                        treatment_node = f"治疗方案_{patient_name}"
-                        G.add_node(treatment_node,
-                                  node_type="treatment",
-                                  content=str(doc['治疗方案']))
-                        G.add_edge(patient_name, treatment_node, edge_type="has_treatment")
-                except Exception as treatment_error:
-                    st.warning(f"处理患者 {patient_name} 的治疗方案时出错: {str(treatment_error)}")
-            
-            except Exception as patient_error:
-                st.error(f"处理患者数据时出错: {str(patient_error)}")
-                st.write(f"患者数据: {doc}")
-                continue
-        
-        # 保存图数据库
-        st.write("保存图数据库...")
-        graph_config = get_graph_database_config()
-        nx.write_gexf(G, graph_config["graph_file"])
+        st.write("比对患者病历版本并更新图数据库...")
+        stats = update_graph_from_mongodb(db, full=full_rebuild, warn=st.warning)
         
-        st.success(f"✅ 图数据库构建成功！包含 {len(G.nodes)} 个节点和 {len(G.edges)} 条边")
+        mode = "全量重建" if stats["full"] else "增量更新"
+        st.write(f"{mode}: 新增 {stats['added']} 个患者，更新 {stats['updated']} 个，"
+                 f"删除 {stats['removed']} 个，未变化 {stats['unchanged']} 个，耗时 {stats['seconds']:.2f} 秒")
+        st.success(f"✅ 图数据库构建成功！包含 {stats['nodes']} 个节点和 {stats['edges']} 条边")
         return True
         
     except Exception as e:
@@ -1000,6 +979,11 @@ def build_graph_from_mongodb():
 def generate_mongodb_query(query: str) -> dict:
     """使用LLM生成MongoDB查询条件和投影"""
     try:
+        cached_plan = get_cached_query_plan("mongodb", query)
+        if cached_plan is not None:
+            return cached_plan
+        generate_start = time.perf_counter()
+        
         st.write("开始创建OpenAI客端...")
         client, model, temperature = get_openai_client()
         st.write("✅ OpenAI客户端创建成功")
@@ -1036,9 +1020,9 @@ def generate_mongodb_query(query: str) -> dict:
 请直接返回查询对象，不要包含任何解释或说明。"""
 
         st.write("🔄 正在调用OpenAI API...")
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
+        response = make_api_request(
+            client, model,
+            [
                 {
                     "role": "system", 
                     "content": "你是一个MongoDB查询专家。请只返回JSON格式的查询对象，不要返回任何其他内容。"
@@ -1048,7 +1032,7 @@ def generate_mongodb_query(query: str) -> dict:
                     "content": prompt
                 }
             ],
-            temperature=temperature
+            temperature
         )
         st.write("✅ OpenAI API调用成")
         
@@ -1069,7 +1053,9 @@ def generate_mongodb_query(query: str) -> dict:
         st.write("生成的MongoDB查询条件：")
         st.code(query_str, language="json")
         
-        return json.loads(query_str)
+        query_obj = json.loads(query_str)
+        cache_query_plan("mongodb", query, query_obj, time.perf_counter() - generate_start)
+        return query_obj
         
     except Exception as e:
         st.error(f"生成查询条件错误: {str(e)}")
@@ -1138,9 +1124,9 @@ def get_llm_response(query: str, search_results: dict) -> str:
 3. 不要添加任何不在相关内容中的信息
 4. 保持回答的准确性和客观性"""
 
-        response = client.chat.completions.create(
-            model=model,
-            messages=[
+        response = make_api_request(
+            client, model,
+            [
                 {
                     "role": "system", 
                     "content": "你是一个专业的医疗助手，擅长解读医疗信息并提供准确的解答。"
@@ -1150,13 +1136,21 @@ def get_llm_response(query: str, search_results: dict) -> str:
                     "content": prompt
                 }
             ],
-            temperature=temperature
+            temperature
         )
         return response.choices[0].message.content
     except Exception as e:
         st.error(f"LLM响应错误: {str(e)}")
         return "抱歉，生成回答时出现错误。"
 
+def request_answer_stream(messages: list):
+    """生成最终回答的文本片段；每次尝试重新取客户端，熔断时自动使用备用端点"""
+    client, model, temperature = get_openai_client()
+    if get_system_config().get("stream_answer", True):
+        return stream_api_request(client, model, messages, temperature)
+    response = make_api_request(client, model, messages, temperature)
+    return [response.choices[0].message.content]
+
 # 页面标题和开发者信息
 st.title("🏥 医疗 RAG 系统")
 st.markdown("""
@@ -1172,23 +1166,86 @@ with st.sidebar:
     # API使用统计
     st.subheader("📊 API使用统计")
     try:
-        from config import api_manager
-        stats = api_manager.get_stats()
+        stats = get_rate_limiter(OPENAI_CONFIG["base_url"], OPENAI_CONFIG["api_key"]).get_stats()
         
         col1, col2 = st.columns(2)
         with col1:
             st.metric("本分钟请求", f"{stats['requests_this_minute']}/{stats['max_requests_per_minute']}")
         with col2:
-            st.metric("请求间隔", f"{stats['request_interval']}秒")
+            st.metric("限流等待", f"{stats['waits']}次", f"{stats['wait_seconds']:.1f}秒", delta_color="off")
         
         if stats['time_since_last_request'] > 0:
             st.info(f"⏰ 上次请求: {stats['time_since_last_request']:.1f}秒前")
         
         # 显示限制信息
-        st.caption(f"💡 免费账户限制: {stats['max_requests_per_minute']}请求/分钟")
+        token_limit = f"，{stats['max_tokens_per_minute']} tokens/分钟" if stats['max_tokens_per_minute'] else ""
+        st.caption(f"💡 免费账户限制: {stats['max_requests_per_minute']}请求/分钟{token_limit}，可突发 {stats['burst']} 个请求")
+        pool_stats = get_client_pool().get_stats()
+        st.caption(f"🔌 客户端池: {pool_stats['clients']} 个端点连接池 | 复用 {pool_stats['hits']} 次")
+        
+        # 端点健康状态（后台探测和真实请求结果）
+        health_monitor = get_llm_health_monitor()
+        if health_monitor is not None:
+            state_labels = {"closed": "🟢 正常", "half_open": "🟡 试探中", "open": "🔴 熔断"}
+            for name, endpoint_stats in health_monitor.get_stats().items():
+                latency = endpoint_stats["last_latency"]
+                latency_text = f" | 延迟 {latency * 1000:.0f}ms" if latency is not None else ""
+                st.caption(f"{'主端点' if name == 'primary' else '备用端点'}: "
+                           f"{state_labels[endpoint_stats['state']]}{latency_text}")
+                if endpoint_stats["last_error"]:
+                    st.caption(f"↳ 最近错误: {endpoint_stats['last_error'][:80]}")
     except Exception as e:
         st.error(f"API统计获取失败: {str(e)}")
     
+    # 向量模型加载状态
+    st.subheader("🧠 向量模型")
+    model_stats = model_registry.get_stats()
+    if model_stats:
+        for stats in model_stats:
+            if stats["loaded"]:
+                st.caption(
+                    f"{stats['model_name']} | 加载耗时 {stats['load_seconds']:.1f}秒 | "
+                    f"参数 {stats['param_bytes'] / 1024 / 1024:.0f}MB | "
+                    f"常驻内存增量 {stats['rss_delta_bytes'] / 1024 / 1024:.0f}MB | "
+                    f"复用 {stats['hits']} 次"
+                )
+            else:
+                st.caption(f"{stats['model_name']} 加载失败: {stats['last_error']}")
+    else:
+        st.caption("模型尚未加载")
+    
+    try:
+        from embedding_cache import get_embedding_cache
+        embedding_cache = get_embedding_cache()
+        if embedding_cache is not None:
+            cache_stats = embedding_cache.get_stats()
+            st.caption(
+                f"向量缓存 | 命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']} "
+                f"({cache_stats['hit_rate']:.0%}) | {cache_stats['entries']} 条 | "
+                f"约节省编码 {cache_stats['saved_seconds']:.1f}秒"
+            )
+    except Exception as e:
+        st.caption(f"向量缓存不可用: {str(e)}")
+    
+    try:
+        plan_cache = get_query_plan_cache()
+        if plan_cache is not None:
+            plan_stats = plan_cache.get_stats()
+            st.caption(
+                f"查询计划缓存 | 精确命中 {plan_stats['exact_hits']} / 相似命中 {plan_stats['semantic_hits']} / "
+                f"未命中 {plan_stats['misses']} ({plan_stats['hit_rate']:.0%}) | {plan_stats['entries']} 条 | "
+                f"约节省LLM调用 {plan_stats['saved_seconds']:.1f}秒"
+            )
+    except Exception as e:
+        st.caption(f"查询计划缓存不可用: {str(e)}")
+    
+    tokenizer_stats = tokenizer_service.get_stats()
+    if tokenizer_stats["initialized"]:
+        st.caption(
+            f"分词 | 词典加载 {tokenizer_stats['init_seconds']:.1f}秒 | 医学词条 {tokenizer_stats['user_dict_terms']} | "
+            f"缓存命中 {tokenizer_stats['hit_rate']:.0%} | {tokenizer_stats['chars_per_second']:,.0f} 字/秒"
+        )
+    
     st.divider()
     
     # 显示数据状态
@@ -1267,9 +1324,10 @@ with st.sidebar:
             st.warning("请先上传PDF文件")
     
     elif import_db == "图数据库":
+        full_rebuild = st.checkbox("全量重建", value=False, help="默认只更新病历有变化的患者")
         if st.button("从MongoDB构建图数据库"):
             try:
-                success = build_graph_from_mongodb()
+                success = build_graph_from_mongodb(full_rebuild=full_rebuild)
                 if success:
                     st.success("✅ 图数据库构建成功！")
                     st.rerun()
@@ -1413,7 +1471,7 @@ with st.sidebar:
             # 首先检查本地是否有GEXF文件
             if os.path.exists(graph_cfg["graph_file"]):
                 try:
-                    G = nx.read_gexf(graph_cfg["graph_file"])
+                    G = get_graph_store(graph_cfg["graph_file"]).graph
                     st.info("ℹ️ 使用本地GEXF文件")
                     st.success(f"📊 本地图数据库 | 节点: {len(G.nodes)} | 关系: {len(G.edges)}")
                     
@@ -1457,7 +1515,6 @@ with st.sidebar:
                                 node_count = session.run("MATCH (n) RETURN count(n) AS c").single()["c"]
                                 rel_count = session.run("MATCH ()-[r]->() RETURN count(r) AS c").single()["c"]
                                 st.info(f"🔗 Neo4j 连接状态：已连接 | 节点: {node_count} | 关系: {rel_count}")
-                            driver.close()
                         else:
                             st.warning("🔗 Neo4j 连接状态：无法连接")
                     except Exception:
@@ -1481,7 +1538,6 @@ with st.sidebar:
                                 with st.expander("部分关系示例"):
                                     for record in session.run("MATCH (a)-[r]->(b) RETURN a,r,b LIMIT 15"):
                                         st.write(record[0], record[1].type, record[2])
-                            driver.close()
                         else:
                             st.warning("图数据库中暂无数据")
                     except Exception as neo_error:
@@ -1504,7 +1560,6 @@ with st.sidebar:
                             with st.expander("部分关系示例"):
                                 for record in session.run("MATCH (a)-[r]->(b) RETURN a,r,b LIMIT 15"):
                                     st.write(record[0], record[1].type, record[2])
-                        driver.close()
                     else:
                         st.warning("无法连接到图数据库")
                 except Exception as e:
@@ -1589,11 +1644,28 @@ if submit_button:
                     st.write("未找到相关内容")
                     
             else:  # 混合检索
-                # 使用 vector_store.py 中的函数进行向量搜索
+                # 三路检索并发执行，超时或出错的一路返回空结果，不拖慢其余两路
                 from vector_store import get_vector_search_results
-                vector_results = get_vector_search_results(query)
-                mongodb_results = get_structured_search_results(query)
-                graph_results = get_graph_search_results(query)
+                outcome = retrieval_executor.run({
+                    "vector": get_vector_search_results,
+                    "structured": get_structured_search_results,
+                    "graph": get_graph_search_results
+                }, query)
+                vector_results = outcome.results["vector"]
+                mongodb_results = outcome.results["structured"]
+                graph_results = outcome.results["graph"]
+                
+                retriever_labels = {"vector": "向量搜索", "structured": "MongoDB", "graph": "图数据库"}
+                for name, status in outcome.status.items():
+                    if status == "timeout":
+                        st.warning(f"{retriever_labels[name]}检索超时（{outcome.latencies[name]:.1f}秒），本次使用其余检索结果")
+                    elif status == "error":
+                        st.warning(f"{retriever_labels[name]}检索失败: {outcome.errors[name]}")
+                st.caption(
+                    "检索耗时：" + "，".join(
+                        f"{retriever_labels[name]} {seconds:.1f}秒" for name, seconds in outcome.latencies.items()
+                    ) + f"；并发总耗时 {outcome.total_seconds:.1f}秒"
+                )
                 
                 search_results = {
                     "vector": vector_results,
@@ -1621,9 +1693,9 @@ if submit_button:
                             
                             请简洁地总结相关信息。如果没有找到相关信息，请直接说明。"""
                             
-                            response = client.chat.completions.create(
-                                model=model,
-                                messages=[
+                            response = make_api_request(
+                                client, model,
+                                [
                                     {
                                         "role": "system", 
                                         "content": "你是一个专业的医疗助手，请简洁地总结搜索结果。"
@@ -1633,7 +1705,7 @@ if submit_button:
                                         "content": prompt
                                     }
                                 ],
-                                temperature=temperature
+                                temperature
                             )
                             st.info(response.choices[0].message.content)
                         except Exception as e:
@@ -1658,106 +1730,81 @@ if submit_button:
                     else:
                         st.write("未找到相关内容")
             
-            # 使用LLM生成最终答案 - 添加动态分析效果
-            analysis_placeholder = st.empty()
-            progress_placeholder = st.empty()
+            # 使用LLM生成最终答案：流式输出，第一个片段到达即开始显示
+            st.markdown("### 🎯 AI智能分析结果")
+            status_placeholder = st.empty()
+            answer_placeholder = st.empty()
+            status_placeholder.caption("🧠 AI正在分析检索结果...")
             
-            # 显示分析进度
-            with analysis_placeholder:
-                st.markdown("### 🤖 AI正在分析最终结果...")
-                
-            with progress_placeholder:
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                import time
-                # 模拟分析进度
-                steps = [
-                    (20, "🔍 整合向量搜索结果..."),
-                    (40, "📄 分析MongoDB文档数据..."),
-                    (60, "🕸️ 解析图数据库关系..."),
-                    (80, "🧠 AI深度理解与推理..."),
-                    (100, "✨ 生成智能答案...")
-                ]
+            # 准备提示词
+            prompt = f"""请基于以下相关内容回答问题：
+            
+            用户问题: {query}
+            
+            相关内容:
+            {search_results}
+            
+            请注意：
+            1. 只使用提供的相关内容回答问题
+            2. 如果相关内容中没有答案，请明确说明
+            3. 不要添加任何不在相关内容中的信息
+            4. 保持回答的准确性和客观性"""
+            messages = [
+                {
+                    "role": "system", 
+                    "content": "你是一个专业的医疗助手，擅长解读医疗信息并提供准确的解答。"
+                },
+                {
+                    "role": "user", 
+                    "content": prompt
+                }
+            ]
+            max_retries = get_system_config().get("answer_max_retries", 3)  # 最大尝试次数
+            
+            def show_retry(attempt, error):
+                status_placeholder.warning(f"第 {attempt} 次生成中断（{type(error).__name__}），正在从断点继续...")
+            
+            try:
+                answer, stream_stats = stream_answer(
+                    request_answer_stream, messages,
+                    on_text=lambda text: answer_placeholder.success(text + "▌"),
+                    on_retry=show_retry,
+                    max_retries=max_retries
+                )
+                answer_placeholder.success(answer)
+                ttft = stream_stats["ttft_seconds"]
+                timing = f"⏱️ 首字延迟 {ttft:.1f}秒 | " if ttft is not None else "⏱️ "
+                timing += f"总耗时 {stream_stats['total_seconds']:.1f}秒"
+                if stream_stats["resumed"]:
+                    timing += f" | 中断续写 {stream_stats['resumed']} 次"
+                status_placeholder.caption(timing)
                 
-                for progress, message in steps:
-                    progress_bar.progress(progress)
-                    status_text.text(message)
-                    time.sleep(0.3)  # 每步延迟0.3秒
-                max_retries = 3  # 最大重试次数
-                retry_count = 0
+                # 更新对话历史
+                st.session_state.chat_history.append({
+                    "query": query,
+                    "response": answer,
+                    "search_results": search_results,
+                    "search_type": search_type
+                })
                 
-                while retry_count < max_retries:
-                    try:
-                        # 创建OpenAI客户端，使用配置文件设置
-                        client, model, temperature = get_openai_client()
-                        
-                        # 准备提示词
-                        prompt = f"""请基于以下相关内容回答问题：
-                        
-                        用户问题: {query}
-                        
-                        相关内容:
-                        {search_results}
-                        
-                        请注意：
-                        1. 只使用提供的相关内容回答问题
-                        2. 如果相关内容中没有答案，请明确说明
-                        3. 不要添加任何不在相关内容中的信息
-                        4. 保持回答的准确性和客观性"""
-                        
-                        response = client.chat.completions.create(
-                            model=model,
-                            messages=[
-                                {
-                                    "role": "system", 
-                                    "content": "你是一个专业的医疗助手，擅长解读医疗信息并提供准确的解答。"
-                                },
-                                {
-                                    "role": "user", 
-                                    "content": prompt
-                                }
-                            ],
-                            temperature=temperature
-                        )
-                        
-                        answer = response.choices[0].message.content
-                        
-                        # 清除分析中的提示，显示最终结果
-                        analysis_placeholder.empty()
-                        progress_placeholder.empty()
-                        st.markdown("### 🎯 AI智能分析结果")
-                        st.success(answer)
-                        
-                        # 更新对话历史
-                        st.session_state.chat_history.append({
-                            "query": query,
-                            "response": answer,
-                            "search_results": search_results,
-                            "search_type": search_type
-                        })
-                        
-                        break  # 成功后跳出循环
-                        
-                    except Exception as e:
-                        retry_count += 1
-                        if retry_count == max_retries:
-                            # 清除分析中的提示
-                            analysis_placeholder.empty()
-                            progress_placeholder.empty()
-                            st.error(f"生成回答失败，已重试 {max_retries} 次")
-                            st.error(f"错误类型: {type(e).__name__}")
-                            st.error(f"错误信息: {str(e)}")
-                            # 提供一个基本的回答
-                            basic_answer = "抱歉，当前无法连接到AI服务。根据搜索结果，"
-                            if search_results.get('structured'):
-                                basic_answer += "找到以下相关信息：\n" + "\n".join(search_results['structured'])
-                            else:
-                                basic_answer += "未找到相关信息。"
-                            st.info(basic_answer)
-                        else:
-                            st.warning(f"第 {retry_count} 次尝试失败，正在重试...")
-                            time.sleep(2)  # 等待2秒后重试
+            except AnswerStreamError as e:
+                cause = e.__cause__ or e
+                status_placeholder.empty()
+                if e.partial_answer:
+                    # 保留已经显示的部分回答
+                    answer_placeholder.success(e.partial_answer)
+                else:
+                    answer_placeholder.empty()
+                st.error(f"生成回答失败，已重试 {max_retries} 次")
+                st.error(f"错误类型: {type(cause).__name__}")
+                st.error(f"错误信息: {str(cause)}")
+                # 提供一个基本的回答
+                basic_answer = "抱歉，当前无法连接到AI服务。根据搜索结果，"
+                if search_results.get('structured'):
+                    basic_answer += "找到以下相关信息：\n" + "\n".join(search_results['structured'])
+                else:
+                    basic_answer += "未找到相关信息。"
+                st.info(basic_answer)
 
 # 修改对话历史显示部分
 st.subheader("💬 对话历史")
@@ -1904,14 +1951,21 @@ def clean_graph_data():
         graph_config = get_graph_database_config()
         if os.path.exists(graph_config["graph_file"]):
             os.remove(graph_config["graph_file"])
+        snapshot_path = snapshot_path_for(graph_config["graph_file"])
+        if os.path.isdir(snapshot_path):
+            shutil.rmtree(snapshot_path)
+        state_file = graph_config.get("build_state_file")
+        if state_file and os.path.exists(state_file):
+            os.remove(state_file)
+        get_graph_store(graph_config["graph_file"]).invalidate()
         st.success("✅ 图数据库已清空")
         return True
     except Exception as e:
         st.error(f"清理图数据库错误: {str(e)}")
         return False
 
-def import_graph_to_neo4j():
-    """将本地图数据导入到Neo4j云端数据库"""
+def import_graph_to_neo4j(full=False):
+    """将本地图数据同步到Neo4j云端数据库：默认只同步变化的节点和关系，full=True 时清空后全量导入"""
     try:
         # 检查本地图文件是否存在
         graph_config = get_graph_database_config()
@@ -1921,7 +1975,7 @@ def import_graph_to_neo4j():
         
         # 读取本地图数据
         st.write("读取本地图数据...")
-        G = nx.read_gexf(graph_config["graph_file"])
+        G = get_graph_store(graph_config["graph_file"]).graph
         st.write(f"本地图包含 {len(G.nodes)} 个节点和 {len(G.edges)} 条边")
         
         # 连接Neo4j
@@ -1932,94 +1986,45 @@ def import_graph_to_neo4j():
             st.error("无法连接到Neo4j数据库，请检查配置")
             return False
         
+        # 按标签建 id 唯一约束，节点和关系用 UNWIND 批量写入，多个线程并行
+        progress_bar = st.progress(0.0)
+        progress_text = st.empty()
+        phase_names = {
+            "nodes": "写入节点",
+            "relationships": "写入关系",
+            "delete_nodes": "删除节点",
+            "delete_relationships": "删除关系"
+        }
+        
+        def show_progress(phase, done, total, rows_per_second):
+            progress_bar.progress(done / total if total else 1.0)
+            progress_text.write(f"{phase_names.get(phase, phase)}: {done}/{total}（{rows_per_second:,.0f} 行/秒）")
+        
+        stats = sync_graph(
+            G, driver,
+            graph_version=file_version(graph_config["graph_file"]),
+            full=full,
+            progress_callback=show_progress
+        )
+        if stats["mode"] == "unchanged":
+            progress_bar.progress(1.0)
+            st.write("本地图自上次同步后没有变化，无需写入")
+        else:
+            mode = "全量导入" if stats["mode"] == "full" else "增量同步"
+            st.write(f"✅ {mode}：写入 {stats['nodes_upserted']} 个节点、{stats['relationships_upserted']} 条关系，"
+                     f"删除 {stats['nodes_deleted']} 个节点、{stats['relationships_deleted']} 条关系，"
+                     f"{stats['transactions']} 个事务，耗时 {stats['seconds']:.1f} 秒")
+        
+        # 验证导入结果
+        st.write("验证导入结果...")
         with driver.session() as session:
-            # 清空Neo4j中的现有数据
-            st.write("清空Neo4j中的现有数据...")
-            session.run("MATCH (n) DETACH DELETE n")
-            
-            # 导入节点
-            st.write("导入节点到Neo4j...")
-            node_count = 0
-            for node_id, node_data in G.nodes(data=True):
-                # 构建节点标签（使用node_type或默认为Entity）
-                label = node_data.get('node_type', 'Entity').replace('_', '')  # 移除下划线
-                
-                # 构建节点属性
-                properties = {}
-                for key, value in node_data.items():
-                    if key != 'node_type':
-                        # 确保属性值是字符串或数字
-                        if isinstance(value, (str, int, float, bool)):
-                            properties[key] = value
-                        else:
-                            properties[key] = str(value)
-                
-                # 添加节点ID作为属性
-                properties['id'] = str(node_id)
-                
-                # 创建Cypher查询
-                cypher_query = f"CREATE (n:{label} $props)"
-                session.run(cypher_query, props=properties)
-                node_count += 1
-                
-                if node_count % 10 == 0:  # 每10个节点显示一次进度
-                    st.write(f"已导入 {node_count} 个节点...")
-            
-            st.write(f"✅ 成功导入 {node_count} 个节点")
-            
-            # 导入边
-            st.write("导入关系到Neo4j...")
-            edge_count = 0
-            for source, target, edge_data in G.edges(data=True):
-                # 构建关系类型
-                rel_type = edge_data.get('edge_type', 'RELATED').upper().replace(' ', '_')
-                
-                # 构建关系属性
-                rel_properties = {}
-                for key, value in edge_data.items():
-                    if key != 'edge_type':
-                        if isinstance(value, (str, int, float, bool)):
-                            rel_properties[key] = value
-                        else:
-                            rel_properties[key] = str(value)
-                
-                # 创建关系的Cypher查询
-                if rel_properties:
-                    cypher_query = f"""
-                    MATCH (a {{id: $source_id}}), (b {{id: $target_id}})
-                    CREATE (a)-[r:{rel_type} $props]->(b)
-                    """
-                    session.run(cypher_query, 
-                               source_id=str(source), 
-                               target_id=str(target), 
-                               props=rel_properties)
-                else:
-                    cypher_query = f"""
-                    MATCH (a {{id: $source_id}}), (b {{id: $target_id}})
-                    CREATE (a)-[r:{rel_type}]->(b)
-                    """
-                    session.run(cypher_query, 
-                               source_id=str(source), 
-                               target_id=str(target))
-                
-                edge_count += 1
-                
-                if edge_count % 10 == 0:  # 每10条关系显示一次进度
-                    st.write(f"已导入 {edge_count} 条关系...")
-            
-            st.write(f"✅ 成功导入 {edge_count} 条关系")
-            
-            # 验证导入结果
-            st.write("验证导入结果...")
             result = session.run("MATCH (n) RETURN count(n) as node_count")
             neo4j_node_count = result.single()["node_count"]
             
             result = session.run("MATCH ()-[r]->() RETURN count(r) as edge_count")
             neo4j_edge_count = result.single()["edge_count"]
-            
-            st.success(f"✅ Neo4j导入完成！节点: {neo4j_node_count}, 关系: {neo4j_edge_count}")
-            
-        driver.close()
+        
+        st.success(f"✅ Neo4j导入完成！节点: {neo4j_node_count}, 关系: {neo4j_edge_count}")
         return True
         
     except Exception as e:
@@ -2069,7 +2074,7 @@ with st.sidebar:
     graph_config = get_graph_database_config()
     if os.path.exists(graph_config["graph_file"]):
         try:
-            G = nx.read_gexf(graph_config["graph_file"])
+            G = get_graph_store(graph_config["graph_file"]).graph
             st.info(f"📊 本地图数据：{len(G.nodes)} 个节点，{len(G.edges)} 条边")
         except:
             st.warning("本地图数据文件存在但无法读取")
@@ -2077,11 +2082,12 @@ with st.sidebar:
         st.warning("⚠️ 本地图数据文件不存在")
     
     # 导入到Neo4j按钮
+    full_sync = st.checkbox("清空后全量导入", value=False, help="默认只同步自上次同步以来变化的节点和关系")
     if st.button("🚀 导入图数据到Neo4j", 
                  help="将本地GEXF文件中的图数据导入到云端Neo4j数据库",
                  disabled=not os.path.exists(graph_config["graph_file"])):
         with st.spinner("正在导入图数据到Neo4j..."):
-            if import_graph_to_neo4j():
+            if import_graph_to_neo4j(full=full_sync):
                 st.success("✅ 图数据已成功导入到Neo4j！")
                 st.rerun()
             else:
@@ -2098,7 +2104,6 @@ with st.sidebar:
                 result = session.run("MATCH ()-[r]->() RETURN count(r) as edge_count")
                 neo4j_edge_count = result.single()["edge_count"]
                 st.success(f"☁️ Neo4j连接正常：{neo4j_node_count} 节点，{neo4j_edge_count} 关系")
-            driver.close()
         else:
             st.error("❌ Neo4j连接失败")
     except Exception as e:
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+本地向量索引的近似最近邻（ANN）检索
+IVF 倒排聚类 + 可选的残差乘积量化（PQ），纯 numpy 实现
+用法：python ann_index.py  —— 在本地向量库数据上对比 ANN 与精确检索的 recall@k 和延迟
+"""
+
+import os
+import time
+
+import numpy as np
+
+
+def kmeans(data, k, iterations=20, seed=0, chunk_size=65536):
+    """Lloyd k-means，返回 (k, d) 的聚类中心"""
+    rng = np.random.default_rng(seed)
+    n = data.shape[0]
+    if n < k:
+        raise ValueError(f"训练样本数 {n} 少于聚类数 {k}")
+    centroids = data[rng.choice(n, size=k, replace=False)].astype(np.float32)
+
+    for _ in range(iterations):
+        labels = assign_nearest(data, centroids, chunk_size)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        counts = np.bincount(labels, minlength=k).astype(np.float32)
+
+        # 空簇重新随机选取一个样本作为中心
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = data[rng.choice(n, size=int(empty.sum()), replace=False)]
+            counts[empty] = 1
+        centroids = sums / counts[:, None]
+    return centroids.astype(np.float32)
+
+
+def assign_nearest(data, centroids, chunk_size=65536):
+    """按 L2 距离把每个样本分配到最近的中心，分块计算以控制内存"""
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    labels = np.empty(data.shape[0], dtype=np.int32)
+    for start in range(0, data.shape[0], chunk_size):
+        block = data[start:start + chunk_size]
+        # ||x - c||^2 = ||x||^2 - 2x·c + ||c||^2，||x||^2 对 argmin 无影响
+        distances = centroid_norms[None, :] - 2.0 * (block @ centroids.T)
+        labels[start:start + chunk_size] = np.argmin(distances, axis=1)
+    return labels
+
+
+def _top_k_order(scores, top_k):
+    """用 argpartition 取最大的 top_k 个分数的下标，再只对这部分排序"""
+    if top_k >= scores.shape[0]:
+        return np.argsort(-scores, kind="stable")
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class IVFIndex:
+    """
+    IVF 索引，按行号与 LocalVectorIndex 的矩阵一一对应
+    每一行记录所属聚类（倒排表）和可选的 PQ 编码；支持增量插入、移动和截断
+    """
+    FILE = "ann_ivf.npz"
+
+    def __init__(self, dimension, nlist=256, nprobe=16, pq_m=0, rerank_factor=10):
+        if pq_m and dimension % pq_m != 0:
+            raise ValueError(f"向量维度 {dimension} 不能被 PQ 子空间数 {pq_m} 整除")
+        self.dimension = dimension
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.rerank_factor = rerank_factor
+
+        self.centroids = None
+        self.codebooks = None  # (pq_m, 256, dimension // pq_m)
+        self._assign = np.empty(0, dtype=np.int32)
+        self._codes = np.empty((0, pq_m), dtype=np.uint8)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    # ---------- 训练与编码 ----------
+
+    def train(self, vectors, seed=0):
+        """训练聚类中心和 PQ 码本（不写入任何行）"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        nlist = min(self.nlist, vectors.shape[0])
+        self.centroids = kmeans(vectors, nlist, seed=seed)
+
+        if self.pq_m:
+            residuals = vectors - self.centroids[assign_nearest(vectors, self.centroids)]
+            sub_dim = self.dimension // self.pq_m
+            ksub = min(256, vectors.shape[0])
+            self.codebooks = np.stack([
+                kmeans(residuals[:, j * sub_dim:(j + 1) * sub_dim], ksub, iterations=15, seed=seed + j)
+                for j in range(self.pq_m)
+            ])
+
+    def _encode(self, vectors, assign):
+        residuals = vectors - self.centroids[assign]
+        sub_dim = self.dimension // self.pq_m
+        codes = np.empty((vectors.shape[0], self.pq_m), dtype=np.uint8)
+        for j in range(self.pq_m):
+            codes[:, j] = assign_nearest(residuals[:, j * sub_dim:(j + 1) * sub_dim], self.codebooks[j])
+        return codes
+
+    def _ensure_capacity(self, needed):
+        capacity = self._assign.shape[0]
+        if capacity >= needed:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        assign = np.zeros(new_capacity, dtype=np.int32)
+        assign[:capacity] = self._assign
+        codes = np.zeros((new_capacity, self.pq_m), dtype=np.uint8)
+        codes[:capacity] = self._codes
+        self._assign, self._codes = assign, codes
+
+    # ---------- 行维护（与主矩阵保持同步） ----------
+
+    def set_rows(self, rows, vectors):
+        """写入或覆盖若干行：分配到最近的聚类并计算 PQ 编码，无需重建索引"""
+        rows = np.asarray(rows, dtype=np.int64)
+        if rows.size == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self._ensure_capacity(int(rows.max()) + 1)
+        assign = assign_nearest(vectors, self.centroids)
+        self._assign[rows] = assign
+        if self.pq_m:
+            self._codes[rows] = self._encode(vectors, assign)
+
+    def move_row(self, source, target):
+        """主矩阵把 source 行搬到 target 行时同步调用"""
+        self._assign[target] = self._assign[source]
+        if self.pq_m:
+            self._codes[target] = self._codes[source]
+
+    def reset(self):
+        self.centroids = None
+        self.codebooks = None
+        self._assign = np.empty(0, dtype=np.int32)
+        self._codes = np.empty((0, self.pq_m), dtype=np.uint8)
+
+    # ---------- 检索 ----------
+
+    def search(self, query, matrix, count, top_k, nprobe=None, candidate_mask=None):
+        """
+        近似检索：只扫描与查询最接近的 nprobe 个聚类
+        有 PQ 时先用码本近似打分，再对前 top_k * rerank_factor 个候选用原始向量精排
+        返回 (行号数组, 分数数组)
+        """
+        nprobe = min(nprobe or self.nprobe, self.centroids.shape[0])
+        coarse_scores = self.centroids @ query
+        probes = _top_k_order(coarse_scores, nprobe)
+
+        probe_mask = np.zeros(self.centroids.shape[0], dtype=bool)
+        probe_mask[probes] = True
+        selected = probe_mask[self._assign[:count]]
+        if candidate_mask is not None:
+            selected &= candidate_mask
+        candidates = np.flatnonzero(selected)
+        if candidates.size == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+
+        if self.pq_m:
+            sub_dim = self.dimension // self.pq_m
+            # 残差内积查找表 (pq_m, 256)
+            table = np.einsum("jkd,jd->jk", self.codebooks, query.reshape(self.pq_m, sub_dim))
+            approx = coarse_scores[self._assign[candidates]] + table[
+                np.arange(self.pq_m), self._codes[candidates]
+            ].sum(axis=1)
+            rerank = _top_k_order(approx, top_k * self.rerank_factor)
+            candidates = candidates[rerank]
+
+        scores = matrix[candidates] @ query
+        order = _top_k_order(scores, top_k)
+        return candidates[order], scores[order]
+
+    # ---------- 持久化 ----------
+
+    def save(self, path, count):
+        if not self.is_trained:
+            return
+        tmp = os.path.join(path, self.FILE + ".tmp.npz")
+        np.savez(
+            tmp,
+            centroids=self.centroids,
+            codebooks=self.codebooks if self.codebooks is not None else np.empty(0, dtype=np.float32),
+            assign=self._assign[:count],
+            codes=self._codes[:count]
+        )
+        os.replace(tmp, os.path.join(path, self.FILE))
+
+    def load(self, path, count):
+        """加载已保存的索引；行数与主矩阵不一致时放弃（需要重新训练）"""
+        file_path = os.path.join(path, self.FILE)
+        if not os.path.exists(file_path):
+            return False
+        data = np.load(file_path)
+        if data["assign"].shape[0] != count or data["codes"].shape[1] != self.pq_m:
+            return False
+        self.centroids = data["centroids"]
+        self.codebooks = data["codebooks"] if self.pq_m else None
+        self._assign = data["assign"].copy()
+        self._codes = data["codes"].copy()
+        return True
+
+
+def benchmark_recall(matrix, queries, top_k=10, nprobe_values=(1, 2, 4, 8, 16, 32),
+                     nlist=256, pq_m=0, rerank_factor=10):
+    """
+    在同一份数据上对比 ANN 与精确检索
+    返回每个 nprobe 下的 recall@k 和平均单次查询延迟（毫秒）
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    count = matrix.shape[0]
+
+    exact_results = []
+    start = time.perf_counter()
+    for query in queries:
+        exact_results.append(set(_top_k_order(matrix @ query, top_k).tolist()))
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    index = IVFIndex(matrix.shape[1], nlist=min(nlist, count), pq_m=pq_m, rerank_factor=rerank_factor)
+    start = time.perf_counter()
+    index.train(matrix[:min(count, nlist * 256)])
+    index.set_rows(np.arange(count), matrix)
+    build_seconds = time.perf_counter() - start
+
+    report = [{"mode": "exact", "nprobe": None, "recall": 1.0, "latency_ms": exact_ms}]
+    for nprobe in nprobe_values:
+        hits = 0
+        start = time.perf_counter()
+        for query, expected in zip(queries, exact_results):
+            rows, _ = index.search(query, matrix, count, top_k, nprobe=nprobe)
+            hits += len(expected.intersection(rows.tolist()))
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        report.append({
+            "mode": "ivf-pq" if pq_m else "ivf-flat",
+            "nprobe": nprobe,
+            "recall": hits / (len(queries) * min(top_k, count)),
+            "latency_ms": latency_ms
+        })
+    return {"build_seconds": build_seconds, "results": report}
+
+
+if __name__ == "__main__":
+    from config import get_pinecone_config
+    from local_vector_store import LocalVectorIndex
+
+    config = get_pinecone_config()
+    local_index = LocalVectorIndex(config["local_index_path"], config["dimension"], config["metric"])
+    stats = local_index.describe_index_stats()
+    if stats.total_vector_count > 0:
+        data = np.asarray(local_index._matrix[:stats.total_vector_count], dtype=np.float32)
+        print(f"使用本地向量库数据: {data.shape[0]} 条")
+    else:
+        # 本地库为空时使用合成的聚簇数据
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(200, config["dimension"]))
+        data = centers[rng.integers(0, 200, 50000)] + 0.3 * rng.normal(size=(50000, config["dimension"]))
+        data = (data / np.linalg.norm(data, axis=1, keepdims=True)).astype(np.float32)
+        print(f"本地向量库为空，使用合成数据: {data.shape[0]} 条")
+
+    rng = np.random.default_rng(1)
+    queries = data[rng.choice(data.shape[0], size=min(200, data.shape[0]), replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    ann_config = config.get("ann", {})
+    nlist = max(1, min(ann_config.get("nlist", 256), data.shape[0] // 39))
+    for pq_m in sorted({0, ann_config.get("pq_m", 0)}):
+        result = benchmark_recall(data, queries, top_k=10, nlist=nlist, pq_m=pq_m)
+        print(f"\nnlist={nlist} pq_m={pq_m} 构建耗时 {result['build_seconds']:.2f}s")
+        print(f"{'模式':<10}{'nprobe':>8}{'recall@10':>12}{'延迟(ms)':>12}")
+        for row in result["results"]:
+            nprobe = "-" if row["nprobe"] is None else row["nprobe"]
+            print(f"{row['mode']:<10}{nprobe:>8}{row['recall']:>12.3f}{row['latency_ms']:>12.3f}")
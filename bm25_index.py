@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+BM25 倒排索引
+词项来自与向量化相同的 jieba 分词；倒排表按文档号差值 + varint 压缩，
+存放在每个词项各自的 bytearray 中，持久化时拼成一整块字节并记录偏移
+"""
+
+import json
+import os
+import threading
+from array import array
+
+import numpy as np
+
+from config import get_system_config
+from embedding_engine import LEXICAL_VERSION, lexical_terms
+from tfidf_index import metadata_matches
+
+
+def encode_varint(value, out):
+    """把非负整数按 LEB128 varint 写入 bytearray"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varints(buffer):
+    """向量化解码一段 varint 字节，返回 uint64 数组"""
+    data = np.frombuffer(bytes(buffer), dtype=np.uint8)
+    if data.size == 0:
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # 每个字节在所属整数中的位置，决定左移位数
+    position = np.arange(data.size) - np.repeat(starts, ends - starts + 1)
+    values = (data & 0x7F).astype(np.uint64) << (7 * position).astype(np.uint64)
+    return np.add.reduceat(values, starts)
+
+
+class BM25Index:
+    """
+    增量 BM25 索引
+    文档号只增不减，新文档追加到倒排表末尾，差值编码无需重写已有数据
+    """
+    META_FILE = "bm25_meta.json"
+    POSTINGS_FILE = "bm25_postings.npz"
+
+    def __init__(self, path, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._terms = {}  # 词 -> 词项号
+        self._postings = []  # 词项号 -> bytearray，交替存放 (文档号差值, 词频)
+        self._last_doc = array("q")  # 词项号 -> 最后一个文档号
+        self._doc_freq = array("I")
+        self._doc_lengths = array("I")
+        self._total_length = 0
+        self._ids = []
+        self._id_to_doc = {}
+        self._metadata = []
+        self._load()
+
+    # ---------- 持久化 ----------
+
+    def _load(self):
+        meta_path = os.path.join(self.path, self.META_FILE)
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        data = np.load(os.path.join(self.path, self.POSTINGS_FILE))
+        blob = data["blob"].tobytes()
+        offsets = data["offsets"]
+
+        self._terms = {term: term_id for term_id, term in enumerate(meta["terms"])}
+        self._postings = [bytearray(blob[offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1)]
+        self._last_doc = array("q", data["last_doc"].tolist())
+        self._doc_freq = array("I", data["doc_freq"].tolist())
+        self._doc_lengths = array("I", data["doc_lengths"].tolist())
+        self._total_length = int(sum(self._doc_lengths))
+        self._ids = meta["ids"]
+        self._metadata = meta["metadata"]
+        self._id_to_doc = {doc_id: doc for doc, doc_id in enumerate(self._ids)}
+        if meta.get("tokenizer_version") != LEXICAL_VERSION:
+            # 分词方式变了，旧倒排表与查询的分词结果对不上：用保存的原文重建
+            self._rebuild(range(len(self._ids)))
+            self.save()
+
+    def save(self):
+        """原子写入：先写临时文件再替换"""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            offsets = np.zeros(len(self._postings) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(postings) for postings in self._postings])
+            blob = np.frombuffer(b"".join(self._postings), dtype=np.uint8)
+
+            tmp = os.path.join(self.path, self.POSTINGS_FILE + ".tmp.npz")
+            np.savez(
+                tmp,
+                blob=blob,
+                offsets=offsets,
+                last_doc=np.frombuffer(self._last_doc, dtype=np.int64),
+                doc_freq=np.frombuffer(self._doc_freq, dtype=np.uint32),
+                doc_lengths=np.frombuffer(self._doc_lengths, dtype=np.uint32)
+            )
+            os.replace(tmp, os.path.join(self.path, self.POSTINGS_FILE))
+
+            terms = [None] * len(self._terms)
+            for term, term_id in self._terms.items():
+                terms[term_id] = term
+            meta_tmp = os.path.join(self.path, self.META_FILE + ".tmp")
+            with open(meta_tmp, "w", encoding="utf-8") as f:
+                json.dump({"terms": terms, "ids": self._ids, "metadata": self._metadata,
+                           "tokenizer_version": LEXICAL_VERSION}, f, ensure_ascii=False)
+            os.replace(meta_tmp, os.path.join(self.path, self.META_FILE))
+
+    # ---------- 建索引 ----------
+
+    def add_documents(self, ids, texts, metadatas=None):
+        """增量加入文档，已存在的 ID 跳过；返回新加入的文档数"""
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock:
+            added = 0
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                if doc_id in self._id_to_doc:
+                    continue
+                doc = len(self._ids)
+                terms = lexical_terms(text)
+                counts = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+
+                for term, tf in counts.items():
+                    term_id = self._terms.get(term)
+                    if term_id is None:
+                        term_id = len(self._postings)
+                        self._terms[term] = term_id
+                        self._postings.append(bytearray())
+                        self._last_doc.append(-1)
+                        self._doc_freq.append(0)
+                    postings = self._postings[term_id]
+                    encode_varint(doc - self._last_doc[term_id] - 1, postings)
+                    encode_varint(tf, postings)
+                    self._last_doc[term_id] = doc
+                    self._doc_freq[term_id] += 1
+
+                self._doc_lengths.append(len(terms))
+                self._total_length += len(terms)
+                self._id_to_doc[doc_id] = doc
+                self._ids.append(doc_id)
+                self._metadata.append({**metadata, "text": text})
+                added += 1
+            return added
+
+    def _reset(self):
+        self._terms = {}
+        self._postings = []
+        self._last_doc = array("q")
+        self._doc_freq = array("I")
+        self._doc_lengths = array("I")
+        self._total_length = 0
+        self._ids = []
+        self._id_to_doc = {}
+        self._metadata = []
+
+    def _rebuild(self, docs):
+        """用 docs 指定的文档（保存在元数据中的原文）重新分词建索引（调用方持有锁）"""
+        documents = [(self._ids[doc], self._metadata[doc]) for doc in docs]
+        self._reset()
+        for doc_id, metadata in documents:
+            metadata = dict(metadata)
+            text = metadata.pop("text")
+            self.add_documents([doc_id], [text], [metadata])
+
+    def delete_documents(self, ids):
+        """删除文档，返回删除的文档数；倒排表只能追加，用剩余文档重建（文档号重新连续编号），不自动保存"""
+        with self._lock:
+            ids = set(ids).intersection(self._id_to_doc)
+            if ids:
+                self._rebuild([doc for doc, doc_id in enumerate(self._ids) if doc_id not in ids])
+            return len(ids)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self.save()
+
+    # ---------- 检索 ----------
+
+    def _decode_postings(self, term_id):
+        """返回 (文档号数组, 词频数组)"""
+        values = decode_varints(self._postings[term_id])
+        docs = np.cumsum(values[0::2] + 1).astype(np.int64) - 1
+        return docs, values[1::2].astype(np.float32)
+
+    def scores(self, text):
+        """对全部文档计算 BM25 分数"""
+        n_docs = len(self._ids)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        if n_docs == 0:
+            return scores
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32).astype(np.float32)
+        length_norm = self.k1 * (1.0 - self.b + self.b * doc_lengths / (self._total_length / n_docs))
+
+        for term in set(lexical_terms(text)):
+            term_id = self._terms.get(term)
+            if term_id is None:
+                continue
+            docs, tf = self._decode_postings(term_id)
+            df = self._doc_freq[term_id]
+            idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (self.k1 + 1.0) / (tf + length_norm[docs])
+        return scores
+
+    def query(self, text, top_k=10, include_metadata=True, filter=None):
+        """返回与 Pinecone 相同结构的结果：{'matches': [{'id', 'score', 'metadata'}]}"""
+        with self._lock:
+            if not self._ids:
+                return {"matches": []}
+            scores = self.scores(text)
+            if filter:
+                mask = np.array([metadata_matches(metadata, filter) for metadata in self._metadata])
+                scores = np.where(mask, scores, 0.0)
+
+            top_k = min(top_k, len(self._ids))
+            order = np.argpartition(-scores, top_k - 1)[:top_k]
+            order = order[np.argsort(-scores[order], kind="stable")]
+            matches = []
+            for doc in order:
+                if scores[doc] <= 0:
+                    break
+                match = {"id": self._ids[doc], "score": float(scores[doc])}
+                if include_metadata:
+                    match["metadata"] = dict(self._metadata[doc])
+                matches.append(match)
+            return {"matches": matches}
+
+    def get_stats(self):
+        with self._lock:
+            postings_bytes = sum(len(postings) for postings in self._postings)
+            postings_count = int(sum(self._doc_freq))
+        return {
+            "documents": len(self._ids),
+            "terms": len(self._terms),
+            "postings": postings_count,
+            "postings_bytes": postings_bytes,
+            # 未压缩时每条倒排记录为 (int32 文档号, int32 词频)
+            "compression_ratio": (postings_count * 8 / postings_bytes) if postings_bytes else 0.0
+        }
+
+
+_bm25_index = None
+_bm25_index_lock = threading.Lock()
+
+
+def get_bm25_index():
+    """进程内共享的 BM25 索引，与 TF-IDF 索引存放在同一目录"""
+    global _bm25_index
+    with _bm25_index_lock:
+        if _bm25_index is None:
+            _bm25_index = BM25Index(get_system_config().get("lexical_index_path", "./lexical_index"))
+        return _bm25_index
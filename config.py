@@ -5,7 +5,9 @@ Agentic RAG 系统配置文件
 ⚠️  敏感信息已移至.env文件，请确保.env文件不被提交到版本控制
 """
 
+import atexit
 import os
+import threading
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -17,9 +19,7 @@ OPENAI_CONFIG = {
     "base_url": os.getenv("OPENAI_BASE_URL", "https://openrouter.ai/api/v1"),
     "model": os.getenv("OPENAI_MODEL", "deepseek/deepseek-chat"),
     "timeout": 60,
-    "temperature": 0.1,
-    "max_requests_per_minute": int(os.getenv("MAX_REQUESTS_PER_MINUTE", "10")),
-    "request_interval": int(os.getenv("REQUEST_INTERVAL", "6"))
+    "temperature": 0.1
 }
 
 # 备用API配置（如果主API失败时使用）
@@ -37,7 +37,54 @@ PINECONE_CONFIG = {
     "environment": "gcp-starter",
     "index_name": "medical-records",
     "dimension": 384,  # all-MiniLM-L6-v2 的维度
-    "metric": "cosine"
+    "metric": "cosine",
+    "pool_threads": 4,  # Index 句柄的HTTP连接池线程数
+    "validate_ttl": 600,  # 索引存在性校验的有效期（秒）
+    "upsert_batch_size": 100,  # 每次 upsert 请求的向量数
+    "upsert_workers": 4,  # 并发上传的线程数
+    "upsert_max_retries": 3,  # 单个批次失败后的重试次数（指数退避）
+    # 向量库后端："pinecone" 使用云端索引，"local" 使用本地内存索引（可离线运行）
+    "backend": os.getenv("VECTOR_BACKEND", "pinecone"),
+    "local_index_path": "./vector_index",
+    # 本地后端的近似最近邻检索（IVF + 可选PQ），数据量达到 min_train_size 后自动训练
+    "ann": {
+        "enabled": False,
+        "nlist": 256,  # 聚类中心数量
+        "nprobe": 16,  # 每次查询扫描的聚类数，越大召回越高
+        "pq_m": 0,  # PQ 子空间数（0 表示不量化，需能整除向量维度，如 48）
+        "rerank_factor": 10,  # PQ 粗排后用原始向量精排 top_k * rerank_factor 个候选
+        "min_train_size": 10000
+    }
+}
+
+# OpenAI 客户端池：同一端点/密钥共用一个客户端和 HTTP 连接池
+LLM_CLIENT_POOL_CONFIG = {
+    "max_connections": 20,  # 每个端点的最大并发连接数
+    "max_keepalive_connections": 10,  # 空闲时保留的 keep-alive 连接数
+    "keepalive_expiry": 120,  # 空闲连接保留时间（秒）
+    "connect_timeout": 10,  # 建立连接（含 TLS 握手）的超时（秒）
+    "timeout": 60,  # 默认的读写超时（秒），端点配置中的 timeout 优先
+    "max_retries": 2  # SDK 内置的连接错误/5xx 重试次数
+}
+
+# LLM 请求限流：每个端点/密钥各有一个请求数令牌桶和 token 数令牌桶
+RATE_LIMIT_CONFIG = {
+    "requests_per_minute": int(os.getenv("MAX_REQUESTS_PER_MINUTE", "10")),
+    "tokens_per_minute": int(os.getenv("MAX_TOKENS_PER_MINUTE", "0")),  # 0 表示不限
+    "burst": int(os.getenv("REQUEST_BURST", "3")),  # 可连续发出而不等待的请求数，设为 1 即每 60/rpm 秒一个请求
+    "completion_tokens": 1024,  # 未指定 max_tokens 时为回答预约的 token 数，完成后按实际用量校正
+    "shared_state_path": os.getenv("RATE_LIMIT_STATE_PATH", ""),  # 设置后令牌桶保存在该 SQLite 文件中，多进程共享额度
+    "endpoints": {}  # 按 base_url 覆盖额度，如 {"https://openrouter.ai/api/v1": {"requests_per_minute": 20}}
+}
+
+# LLM 端点健康检查与熔断（主/备用端点）
+LLM_HEALTH_CONFIG = {
+    "enabled": True,
+    "background_probe": True,  # 后台线程定期探测端点（GET /models，不消耗对话请求配额）
+    "probe_interval": 60,  # 探测间隔（秒）
+    "probe_timeout": 10,  # 单次探测超时（秒）
+    "failure_threshold": 3,  # 连续失败多少次后熔断，请求直接走备用端点
+    "recovery_timeout": 30  # 熔断多久后放行一次试探请求（秒）
 }
 
 # MongoDB 配置
@@ -52,13 +99,48 @@ MONGODB_CONFIG = {
 SENTENCE_TRANSFORMER_CONFIG = {
     "model_name": "sentence-transformers/all-MiniLM-L6-v2",
     "cache_folder": "./models",
-    "device": "cpu"  # 可以改为 "cuda" 如果有GPU
+    "device": "cpu",  # 可以改为 "cuda" 如果有GPU
+    "warm_up_on_startup": True,  # 应用启动时预加载模型，避免首次查询等待
+    "batch_size": 32,  # 每批编码的文本数量
+    "embedding_dtype": "float32",  # 可选 float32 / float16 / int8
+    "normalize_embeddings": True,  # 输出单位向量，便于余弦检索
+    "stream_window_size": 256,  # 流式编码时每个窗口的文本数量
+    # 向量持久化缓存（按模型名+预处理版本+文本内容寻址）
+    "embedding_cache": {
+        "enabled": True,
+        "path": "./models/embedding_cache.sqlite3",
+        "max_entries": 200000,
+        "max_bytes": 512 * 1024 * 1024
+    }
+}
+
+# 中文分词配置
+TOKENIZER_CONFIG = {
+    "user_dict_path": "./medical_dict.txt",  # 医学词典，保证诊断、药名、检验指标不被切碎
+    "dict_cache_file": "./models/jieba.cache",  # jieba 词典缓存，避免每次启动重新构建前缀词典
+    "warm_up_on_startup": True,
+    "memo_size": 50000,  # 分词结果的 LRU 缓存条数
+    "parallel_workers": 0,  # 多进程分词的进程数，0 表示使用 CPU 核数
+    "parallel_min_chars": 200000  # 一批文本总字数超过该值时才使用多进程
+}
+
+# LLM 查询计划缓存（MongoDB 查询条件、图查询条件）
+QUERY_PLAN_CACHE_CONFIG = {
+    "enabled": True,
+    "path": "./models/query_plan_cache.sqlite3",
+    "ttl_seconds": 7 * 24 * 3600,  # 数据结构或提示词变化后，旧计划最多保留一周
+    "max_entries": 5000,  # 超出后按最近访问时间淘汰
+    "similarity_threshold": 0.95  # 归一化问题的向量相似度达到该值、且槽位以外的词项相同时才复用相近问题的计划
 }
 
 # 图数据库配置
 GRAPH_DATABASE_CONFIG = {
     "graph_file": "medical_graph.gexf",
     "temp_graph_file": "temp_graph.html",
+    "write_snapshot": True,  # 构建图时在 GEXF 旁写一份二进制快照（medical_graph.snapshot/），加载更快
+    "build_state_file": "graph_build_state.json",  # 增量构建时记录每个患者病历版本的状态文件
+    "query_max_bindings": 200000,  # 图查询中间结果上限，超过时报错提示增加过滤条件
+    "query_backend": os.getenv("GRAPH_QUERY_BACKEND", "local"),  # local：内存中的 networkx 图；neo4j：编译成 Cypher 在 Neo4j 上执行
     "node_types": [
         "patient",
         "basic_info", 
@@ -86,12 +168,30 @@ NEO4J_CONFIG = {
     "database": "neo4j",
     "aura_instance_id": "fe69c89f",
     "aura_instance_name": "Instance01",
+    "sync_batch_size": 1000,  # 每个 UNWIND 写事务的行数
+    "sync_workers": 4,  # 并行写入线程数
+    "sync_state_file": "neo4j_sync_state.json",  # 增量同步记录上次同步的节点/关系哈希和水位线
+    "max_connection_pool_size": 50,  # 共享 Driver 的连接池大小
+    "connection_acquisition_timeout": 30,  # 从连接池取连接的超时（秒）
+    "max_connection_lifetime": 3600,  # 连接最长存活时间（秒），避免云端断开空闲连接
 }
 
 # 系统配置
 SYSTEM_CONFIG = {
     "max_retries": 3,
-    "chunk_size": 100000,
+    "chunk_max_tokens": 200,  # 每个文本块的 token 上限（MiniLM 最大输入长度为 256）
+    "chunk_overlap_tokens": 40,  # 相邻文本块的重叠 token 数
+    "lexical_index_path": "./lexical_index",  # TF-IDF / BM25 词法索引的存储目录
+    # 检索模式："dense" 只用向量，"bm25" 只用词法，"hybrid" 两路用 RRF 融合（药名、检验指标等精确术语更准）
+    # BM25 索引只包含启用词法索引之后导入的文档，覆盖已有的向量库语料（重新导入）之前不要切换到 hybrid
+    "retrieval_mode": "dense",
+    "rrf_k": 60,  # RRF 平滑常数，越大越平均地看待两路排名
+    # 混合检索三路并发执行：每一路的超时（秒）和全部检索的总截止时间
+    "retrieval_timeouts": {"vector": 20, "structured": 30, "graph": 45},
+    "retrieval_deadline": 60,
+    "retrieval_workers": 8,
+    "stream_answer": True,  # 最终回答流式输出：逐段显示，并记录首字延迟
+    "answer_max_retries": 3,  # 回答生成中断后的最大尝试次数（带着已生成内容续写）
     "similarity_threshold": 0.3,
     "max_results": 5,
     "vector_top_k": 50
@@ -106,22 +206,24 @@ ENV_CONFIG = {
 
 # 获取OpenAI客户端的便捷函数
 def get_openai_client(use_backup=False):
-    """获取配置好的OpenAI客户端"""
-    from openai import OpenAI
+    """获取配置好的OpenAI客户端；主端点处于熔断状态时直接返回备用端点的客户端"""
     import os
     
     # 设置环境变量
     for key, value in ENV_CONFIG.items():
         os.environ[key] = value
     
+    if not use_backup:
+        from llm_health import get_llm_health_monitor
+        monitor = get_llm_health_monitor()
+        use_backup = monitor is not None and monitor.select_endpoint() == "backup"
+    
     config = BACKUP_OPENAI_CONFIG if use_backup else OPENAI_CONFIG
     
     try:
-        client = OpenAI(
-            api_key=config["api_key"],
-            base_url=config["base_url"],
-            timeout=config["timeout"]
-        )
+        # 从客户端池中取共用的客户端，复用已建立的 keep-alive 连接
+        from llm_client_pool import get_client_pool
+        client = get_client_pool().get(config["base_url"], config["api_key"], timeout=config["timeout"])
         return client, config["model"], config["temperature"]
     except Exception as e:
         if not use_backup:
@@ -131,81 +233,31 @@ def get_openai_client(use_backup=False):
             # 备用配置也失败，抛出异常
             raise e
 
-class APIRequestManager:
-    """API请求管理器，控制请求频率"""
-    def __init__(self):
-        self.last_request_time = 0
-        self.request_count = 0
-        self.start_time = 0
-        
-    def wait_if_needed(self):
-        """如果需要，等待一段时间再发送请求"""
-        import time
-        current_time = time.time()
-        
-        # 初始化开始时间
-        if self.start_time == 0:
-            self.start_time = current_time
-        
-        # 重置计数器（每分钟）
-        if current_time - self.start_time >= 60:
-            self.request_count = 0
-            self.start_time = current_time
-        
-        # 检查是否超过每分钟限制
-        if self.request_count >= OPENAI_CONFIG["max_requests_per_minute"]:
-            wait_time = 60 - (current_time - self.start_time)
-            if wait_time > 0:
-                import streamlit as st
-                st.warning(f"⏳ 达到API请求限制 ({OPENAI_CONFIG['max_requests_per_minute']}/分钟)，等待 {wait_time:.1f} 秒...")
-                time.sleep(wait_time)
-                self.request_count = 0
-                self.start_time = time.time()
-        
-        # 控制请求间隔
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < OPENAI_CONFIG["request_interval"]:
-            wait_time = OPENAI_CONFIG["request_interval"] - time_since_last
-            import streamlit as st
-            st.info(f"⏱️ API请求间隔控制，等待 {wait_time:.1f} 秒...")
-            time.sleep(wait_time)
-        
-        self.last_request_time = time.time()
-        self.request_count += 1
-        
-    def get_stats(self):
-        """获取API使用统计"""
-        import time
-        current_time = time.time()
-        
-        if self.start_time == 0:
-            return {
-                "requests_this_minute": 0,
-                "time_since_last_request": 0,
-                "max_requests_per_minute": OPENAI_CONFIG["max_requests_per_minute"],
-                "request_interval": OPENAI_CONFIG["request_interval"]
-            }
-        
-        # 如果超过一分钟，重置计数
-        if current_time - self.start_time >= 60:
-            requests_this_minute = 0
-        else:
-            requests_this_minute = self.request_count
-            
-        return {
-            "requests_this_minute": requests_this_minute,
-            "time_since_last_request": current_time - self.last_request_time if self.last_request_time > 0 else 0,
-            "max_requests_per_minute": OPENAI_CONFIG["max_requests_per_minute"],
-            "request_interval": OPENAI_CONFIG["request_interval"]
-        }
-
-# 全局请求管理器
-api_manager = APIRequestManager()
-
-def make_api_request(client, model, messages, temperature=0.1, max_tokens=None):
-    """安全的API请求函数，包含频率控制"""
-    api_manager.wait_if_needed()
+def get_async_openai_client(use_backup=False):
+    """
+    获取当前事件循环中共用的 AsyncOpenAI 客户端（须在协程内调用），配合 make_api_request_async 使用
+    端点选择与 get_openai_client 相同
+    """
+    if not use_backup:
+        from llm_health import get_llm_health_monitor
+        monitor = get_llm_health_monitor()
+        use_backup = monitor is not None and monitor.select_endpoint() == "backup"
     
+    config = BACKUP_OPENAI_CONFIG if use_backup else OPENAI_CONFIG
+    from llm_client_pool import get_client_pool
+    client = get_client_pool().get_async(config["base_url"], config["api_key"], timeout=config["timeout"])
+    return client, config["model"], config["temperature"]
+
+def _notify_rate_limit_wait(wait_time):
+    """在页面上提示限流等待（非 Streamlit 环境下忽略）"""
+    try:
+        import streamlit as st
+        st.info(f"⏱️ API请求频率控制，等待 {wait_time:.1f} 秒...")
+    except Exception:
+        pass
+
+def _request_params(model, messages, temperature, max_tokens):
+    """组装对话补全请求参数"""
     request_params = {
         "model": model,
         "messages": messages,
@@ -214,8 +266,152 @@ def make_api_request(client, model, messages, temperature=0.1, max_tokens=None):
     
     if max_tokens:
         request_params["max_tokens"] = max_tokens
+    return request_params
+
+def _send_request(client, model, messages, temperature, max_tokens):
+    """发送一次对话补全请求；先在该端点/密钥的令牌桶中预约额度，完成后按实际 token 用量校正"""
+    from rate_limiter import estimate_request_tokens, get_rate_limiter, response_total_tokens
+    limiter = get_rate_limiter(client.base_url, client.api_key)
+    reserved = estimate_request_tokens(messages, max_tokens, RATE_LIMIT_CONFIG["completion_tokens"])
+    limiter.acquire(reserved, on_wait=_notify_rate_limit_wait)
+    try:
+        response = client.chat.completions.create(**_request_params(model, messages, temperature, max_tokens))
+    except Exception:
+        limiter.settle(reserved, 0)
+        raise
+    limiter.settle(reserved, response_total_tokens(response))
+    return response
+
+def make_api_request(client, model, messages, temperature=0.1, max_tokens=None):
+    """
+    安全的API请求函数，包含频率控制（按端点/密钥的令牌桶）
+    请求结果回写到端点熔断器；端点故障（连接错误、超时、鉴权、限流、5xx）时切换到备用端点重试一次
+    """
+    from llm_health import get_llm_health_monitor, is_endpoint_failure
+    import time
+    monitor = get_llm_health_monitor()
+    endpoint = monitor.endpoint_of(client) if monitor is not None else None
+    if endpoint is None:
+        return _send_request(client, model, messages, temperature, max_tokens)
+    
+    while True:
+        start = time.perf_counter()
+        try:
+            response = _send_request(client, model, messages, temperature, max_tokens)
+        except Exception as e:
+            if not is_endpoint_failure(e):
+                raise
+            monitor.record_failure(endpoint, e)
+            fallback = monitor.fallback_for(endpoint)
+            if fallback is None:
+                raise
+            client, model, _ = get_openai_client(use_backup=(fallback == "backup"))
+            endpoint = fallback
+            continue
+        monitor.record_success(endpoint, time.perf_counter() - start)
+        return response
+
+def stream_api_request(client, model, messages, temperature=0.1, max_tokens=None):
+    """
+    流式API请求：逐段产出回答文本，频率控制和熔断记录与 make_api_request 相同
+    第一个片段到达前的端点故障会切换到备用端点；已经开始输出后的中断直接抛出，由调用方带着已生成内容续写
+    """
+    from llm_health import get_llm_health_monitor, is_endpoint_failure
+    from rate_limiter import estimate_request_tokens, estimate_tokens, get_rate_limiter
+    import time
+    monitor = get_llm_health_monitor()
+    endpoint = monitor.endpoint_of(client) if monitor is not None else None
+    completion_budget = max_tokens or RATE_LIMIT_CONFIG["completion_tokens"]
+    
+    while True:
+        limiter = get_rate_limiter(client.base_url, client.api_key)
+        reserved = estimate_request_tokens(messages, max_tokens, RATE_LIMIT_CONFIG["completion_tokens"])
+        limiter.acquire(reserved, on_wait=_notify_rate_limit_wait)
+        start = time.perf_counter()
+        emitted = []
+        stream = None
+        error = None
+        completed = False
+        try:
+            stream = client.chat.completions.create(
+                stream=True, **_request_params(model, messages, temperature, max_tokens)
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    emitted.append(delta)
+                    yield delta
+            completed = True
+        except Exception as e:
+            error = e
+        finally:
+            # 正常结束、出错、调用方提前关闭生成器（GeneratorExit）都在这里结算一次
+            if stream is not None and not completed:
+                try:
+                    stream.close()  # 释放连接，放回连接池
+                except Exception:
+                    pass
+            if error is not None and not emitted:
+                # 与 _send_request 相同：没有任何输出的失败请求退还全部预约
+                limiter.settle(reserved, 0)
+            else:
+                # 流式响应通常不带 usage，按提示词估算值 + 已输出内容估算实际用量
+                limiter.settle(reserved, reserved - completion_budget + estimate_tokens("".join(emitted)))
+            if endpoint is not None and error is None and (completed or emitted):
+                monitor.record_success(endpoint, time.perf_counter() - start)
         
-    return client.chat.completions.create(**request_params)
+        if error is None:
+            return
+        if endpoint is None or not is_endpoint_failure(error):
+            raise error
+        monitor.record_failure(endpoint, error)
+        fallback = None if emitted else monitor.fallback_for(endpoint)
+        if fallback is None:
+            raise error
+        client, model, _ = get_openai_client(use_backup=(fallback == "backup"))
+        endpoint = fallback
+
+async def _send_request_async(client, model, messages, temperature, max_tokens):
+    """_send_request 的异步版本：与同步调用共用令牌桶，限流等待期间不阻塞事件循环"""
+    from rate_limiter import estimate_request_tokens, get_rate_limiter, response_total_tokens
+    limiter = get_rate_limiter(client.base_url, client.api_key)
+    reserved = estimate_request_tokens(messages, max_tokens, RATE_LIMIT_CONFIG["completion_tokens"])
+    await limiter.acquire_async(reserved, on_wait=_notify_rate_limit_wait)
+    try:
+        response = await client.chat.completions.create(**_request_params(model, messages, temperature, max_tokens))
+    except Exception:
+        limiter.settle(reserved, 0)
+        raise
+    limiter.settle(reserved, response_total_tokens(response))
+    return response
+
+async def make_api_request_async(client, model, messages, temperature=0.1, max_tokens=None):
+    """make_api_request 的异步版本（AsyncOpenAI 客户端），熔断记录和备用端点切换与同步版本相同"""
+    from llm_health import get_llm_health_monitor, is_endpoint_failure
+    import time
+    monitor = get_llm_health_monitor()
+    endpoint = monitor.endpoint_of(client) if monitor is not None else None
+    if endpoint is None:
+        return await _send_request_async(client, model, messages, temperature, max_tokens)
+    
+    while True:
+        start = time.perf_counter()
+        try:
+            response = await _send_request_async(client, model, messages, temperature, max_tokens)
+        except Exception as e:
+            if not is_endpoint_failure(e):
+                raise
+            monitor.record_failure(endpoint, e)
+            fallback = monitor.fallback_for(endpoint)
+            if fallback is None:
+                raise
+            client, model, _ = get_async_openai_client(use_backup=(fallback == "backup"))
+            endpoint = fallback
+            continue
+        monitor.record_success(endpoint, time.perf_counter() - start)
+        return response
 
 def test_openai_client():
     """测试OpenAI客户端连接"""
@@ -240,6 +436,21 @@ def test_openai_client():
         except Exception as backup_e:
             return False, f"主API错误: {str(e)}, 备用API错误: {str(backup_e)}"
 
+# 获取客户端池配置的便捷函数
+def get_llm_client_pool_config():
+    """获取客户端池配置"""
+    return LLM_CLIENT_POOL_CONFIG
+
+# 获取限流配置的便捷函数
+def get_rate_limit_config():
+    """获取限流配置"""
+    return RATE_LIMIT_CONFIG
+
+# 获取LLM健康检查配置的便捷函数
+def get_llm_health_config():
+    """获取LLM健康检查配置"""
+    return LLM_HEALTH_CONFIG
+
 # 获取Pinecone配置的便捷函数
 def get_pinecone_config():
     """获取Pinecone配置"""
@@ -255,25 +466,65 @@ def get_sentence_transformer_config():
     """获取Sentence Transformer配置"""
     return SENTENCE_TRANSFORMER_CONFIG
 
+# 获取分词配置的便捷函数
+def get_tokenizer_config():
+    """获取分词配置"""
+    return TOKENIZER_CONFIG
+
+# 获取查询计划缓存配置的便捷函数
+def get_query_plan_cache_config():
+    """获取查询计划缓存配置"""
+    return QUERY_PLAN_CACHE_CONFIG
+
 # 获取图数据库配置的便捷函数
 def get_graph_database_config():
     """获取图数据库配置"""
     return GRAPH_DATABASE_CONFIG
 
+# 获取Neo4j配置的便捷函数
+def get_neo4j_config():
+    """获取Neo4j配置"""
+    return NEO4J_CONFIG
+
+# 进程内共享的 Neo4j Driver（自带连接池）
+_neo4j_driver = None
+_neo4j_driver_lock = threading.Lock()
+
 # 获取Neo4j驱动（需要 neo4j>=5）
 def get_neo4j_driver():
-    """创建并返回 Neo4j Driver（调用方负责在结束时关闭 driver.close()）"""
-    try:
-        from neo4j import GraphDatabase
-        cfg = NEO4J_CONFIG
-        driver = GraphDatabase.driver(
-            cfg["uri"],
-            auth=(cfg["username"], cfg["password"])
-        )
-        return driver
-    except Exception as e:
-        # 返回 None 由调用方决定回退到本地GEXF
-        return None
+    """
+    返回进程内共享的 Neo4j Driver，首次调用时创建，之后复用其连接池
+    调用方用 driver.session() 取会话即可，不要关闭 driver；进程退出时统一关闭
+    """
+    global _neo4j_driver
+    if _neo4j_driver is not None:
+        return _neo4j_driver
+    with _neo4j_driver_lock:
+        if _neo4j_driver is not None:
+            return _neo4j_driver
+        try:
+            from neo4j import GraphDatabase
+            cfg = NEO4J_CONFIG
+            _neo4j_driver = GraphDatabase.driver(
+                cfg["uri"],
+                auth=(cfg["username"], cfg["password"]),
+                max_connection_pool_size=cfg.get("max_connection_pool_size", 50),
+                connection_acquisition_timeout=cfg.get("connection_acquisition_timeout", 30),
+                max_connection_lifetime=cfg.get("max_connection_lifetime", 3600)
+            )
+            atexit.register(close_neo4j_driver)
+            return _neo4j_driver
+        except Exception as e:
+            # 返回 None 由调用方决定回退到本地GEXF
+            return None
+
+def close_neo4j_driver():
+    """关闭共享的 Neo4j Driver（进程退出或修改连接配置后调用）"""
+    global _neo4j_driver
+    with _neo4j_driver_lock:
+        if _neo4j_driver is not None:
+            _neo4j_driver.close()
+            _neo4j_driver = None
 
 # 获取系统配置的便捷函数
 def get_system_config():
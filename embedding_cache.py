@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+向量持久化缓存
+以 (模型名, 预处理版本, 文本) 的哈希为键，把向量保存在 SQLite 文件中，按最近访问时间淘汰
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from config import get_sentence_transformer_config
+
+
+class EmbeddingCache:
+    """基于 SQLite 的内容寻址向量缓存，带条目数和容量上限"""
+    def __init__(self, path, max_entries=200000, max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)")
+        self._conn.commit()
+
+        row = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings").fetchone()
+        self._entries, self._bytes = row[0], row[1]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.encode_seconds = 0.0
+        self.encoded_texts = 0
+
+    @staticmethod
+    def make_key(model_name, preprocess_version, text):
+        """计算缓存键"""
+        digest = hashlib.sha256()
+        for part in (model_name, preprocess_version, text):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get_many(self, keys):
+        """批量读取，返回 {键: 向量}，未命中的键不在结果中"""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            # SQLite 默认最多 999 个绑定参数，分段查询
+            for start in range(0, len(unique_keys), 500):
+                part = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    hit_placeholders = ",".join("?" * len(rows))
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_access = ? WHERE key IN ({hit_placeholders})",
+                        [time.time()] + [key for key, _ in rows]
+                    )
+            self._conn.commit()
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items, encode_seconds=0.0):
+        """批量写入 (键, 向量)，encode_seconds 为编码这些向量的耗时，用于估算节省的时间"""
+        if not items:
+            return
+        now = time.time()
+        rows = {}
+        for key, vector in items:
+            blob = np.ascontiguousarray(vector, dtype=np.float32).tobytes()
+            rows[key] = (key, len(vector), blob, len(blob), now)
+        rows = list(rows.values())
+
+        with self._lock:
+            keys = [row[0] for row in rows]
+            existing = {}
+            for start in range(0, len(keys), 500):
+                part = keys[start:start + 500]
+                placeholders = ",".join("?" * len(part))
+                existing.update(self._conn.execute(
+                    f"SELECT key, size FROM embeddings WHERE key IN ({placeholders})", part
+                ).fetchall())
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            for key, _, _, size, _ in rows:
+                if key in existing:
+                    self._bytes += size - existing[key]
+                else:
+                    self._entries += 1
+                    self._bytes += size
+
+            self.encode_seconds += encode_seconds
+            self.encoded_texts += len(rows)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """超出条目数或容量上限时，删除最久未访问的条目（调用方持有锁）"""
+        while self._entries > self.max_entries or self._bytes > self.max_bytes:
+            overflow = max(self._entries - self.max_entries, 1)
+            # 按容量超限时一次多删一些，避免频繁触发
+            batch = max(overflow, self._entries // 20, 1)
+            rows = self._conn.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_access LIMIT ?", (batch,)
+            ).fetchall()
+            if not rows:
+                self._entries, self._bytes = 0, 0
+                break
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", [(key,) for key, _ in rows])
+            self._entries -= len(rows)
+            self._bytes -= sum(size for _, size in rows)
+            self.evictions += len(rows)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._entries, self._bytes = 0, 0
+
+    def get_stats(self):
+        """获取命中率、容量和估算节省的编码时间"""
+        total = self.hits + self.misses
+        avg_encode = self.encode_seconds / self.encoded_texts if self.encoded_texts else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": self._entries,
+            "bytes": self._bytes,
+            "evictions": self.evictions,
+            "saved_seconds": self.hits * avg_encode
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """获取全局向量缓存，未启用时返回 None"""
+    global _cache
+    cache_config = get_sentence_transformer_config().get("embedding_cache", {})
+    if not cache_config.get("enabled", False):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    cache_config["path"],
+                    max_entries=cache_config.get("max_entries", 200000),
+                    max_bytes=cache_config.get("max_bytes", 512 * 1024 * 1024)
+                )
+    return _cache
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+批量向量化引擎
+按文本长度分桶、按批次编码，支持 float16/int8 输出和流式生成
+"""
+
+import time
+import unicodedata
+
+import numpy as np
+
+from config import get_sentence_transformer_config
+from embedding_cache import get_embedding_cache
+from model_registry import get_sentence_transformer
+from tokenizer_service import tokenizer_service
+
+# 预处理方式变化时需要修改版本号，缓存和索引据此区分新旧向量
+PREPROCESS_VERSION = "jieba-meddict-v2"
+# 词法检索分词方式（lexical_terms）变化时需要修改版本号，TF-IDF / BM25 索引加载时据此重建
+LEXICAL_VERSION = "jieba-search-meddict-v1"
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+
+def preprocess_text(text: str) -> str:
+    """中文分词后用空格连接，与模型训练时的输入形式保持一致"""
+    return " ".join(tokenizer_service.cut(text))
+
+
+def preprocess_texts(texts) -> list:
+    """批量预处理，大批量时由分词服务并行切分"""
+    return [" ".join(tokens) for tokens in tokenizer_service.cut_many(texts)]
+
+
+def lexical_terms(text: str) -> list:
+    """
+    词法检索用的词项：jieba 搜索引擎模式分词后去掉空白和纯标点，英文统一小写
+    医学词典中的长词（如"多发性脑梗死"）会同时产出其中的短词（"脑梗死"），兼顾精确匹配和召回
+    """
+    terms = []
+    for token in tokenizer_service.cut(text, for_search=True):
+        token = token.strip().lower()
+        if token and not all(unicodedata.category(ch)[0] in "PZS" for ch in token):
+            terms.append(token)
+    return terms
+
+
+def cast_embeddings(embeddings: np.ndarray, dtype: str) -> np.ndarray:
+    """把 float32 向量转换为目标精度；int8 按 [-1, 1] 线性量化到 [-127, 127]"""
+    if dtype == "float32":
+        return embeddings.astype(np.float32, copy=False)
+    if dtype == "float16":
+        return embeddings.astype(np.float16)
+    if dtype == "int8":
+        return np.clip(np.rint(embeddings * 127.0), -127, 127).astype(np.int8)
+    raise ValueError(f"不支持的向量精度: {dtype}，可选值: {SUPPORTED_DTYPES}")
+
+
+def _engine_options(batch_size=None, dtype=None, normalize=None):
+    st_config = get_sentence_transformer_config()
+    batch_size = batch_size or st_config.get("batch_size", 32)
+    dtype = dtype or st_config.get("embedding_dtype", "float32")
+    if normalize is None:
+        normalize = st_config.get("normalize_embeddings", True)
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"不支持的向量精度: {dtype}，可选值: {SUPPORTED_DTYPES}")
+    return batch_size, dtype, normalize
+
+
+def _encode_bucketed(model, processed_texts, batch_size, normalize):
+    """按长度排序后分批编码，结果写回原始顺序"""
+    dim = model.get_sentence_embedding_dimension()
+    output = np.empty((len(processed_texts), dim), dtype=np.float32)
+    if not processed_texts:
+        return output
+
+    # 长度相近的文本放在同一批，减少 padding 带来的无效计算
+    order = np.argsort([len(text) for text in processed_texts], kind="stable")
+    for start in range(0, len(order), batch_size):
+        bucket = order[start:start + batch_size]
+        batch = [processed_texts[i] for i in bucket]
+        output[bucket] = model.encode(
+            batch,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=normalize,
+            show_progress_bar=False
+        )
+    return output
+
+
+def _encode_with_cache(texts, batch_size, normalize, model=None):
+    """
+    先查向量缓存，只对未命中的文本编码；全部命中时不需要加载模型
+    显式传入 model 时无法确定模型身份，直接编码不走缓存
+    """
+    cache = get_embedding_cache()
+    if model is not None or cache is None or not texts:
+        model = model or get_sentence_transformer()
+        return _encode_bucketed(model, preprocess_texts(texts), batch_size, normalize)
+
+    model_name = get_sentence_transformer_config()["model_name"]
+    version = f"{PREPROCESS_VERSION}|normalize={int(bool(normalize))}"
+    keys = [cache.make_key(model_name, version, text) for text in texts]
+    cached = cache.get_many(keys)
+
+    # 同一批中的重复文本只编码一次
+    missing = {}
+    for i, key in enumerate(keys):
+        if key not in cached and key not in missing:
+            missing[key] = i
+
+    if missing:
+        start = time.perf_counter()
+        encoded = _encode_bucketed(
+            get_sentence_transformer(),
+            preprocess_texts([texts[i] for i in missing.values()]),
+            batch_size,
+            normalize
+        )
+        new_items = list(zip(missing.keys(), encoded))
+        cache.put_many(new_items, encode_seconds=time.perf_counter() - start)
+        cached.update(new_items)
+
+    output = np.empty((len(texts), len(cached[keys[0]])), dtype=np.float32)
+    for i, key in enumerate(keys):
+        output[i] = cached[key]
+    return output
+
+
+def encode_texts(texts, batch_size=None, dtype=None, normalize=None, model=None):
+    """批量编码文本，返回与输入顺序一致的向量矩阵"""
+    batch_size, dtype, normalize = _engine_options(batch_size, dtype, normalize)
+    embeddings = _encode_with_cache(list(texts), batch_size, normalize, model)
+    return cast_embeddings(embeddings, dtype)
+
+
+def iter_embeddings(texts, window_size=None, batch_size=None, dtype=None, normalize=None, model=None):
+    """
+    流式编码：逐个读取文本，每攒够一个窗口就分桶编码一次
+    产出 (窗口内文本列表, 向量矩阵)，内存占用只和窗口大小有关
+    """
+    batch_size, dtype, normalize = _engine_options(batch_size, dtype, normalize)
+    window_size = window_size or get_sentence_transformer_config().get("stream_window_size", 256)
+
+    window = []
+    for text in texts:
+        window.append(text)
+        if len(window) >= window_size:
+            yield window, cast_embeddings(_encode_with_cache(window, batch_size, normalize, model), dtype)
+            window = []
+
+    if window:
+        yield window, cast_embeddings(_encode_with_cache(window, batch_size, normalize, model), dtype)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+从 MongoDB 病历增量构建图数据库
+每个患者的版本由其全部病历的 (_id, metadata.last_updated) 组成，记录在状态文件中；
+再次构建时只对新增、修改、删除的患者增删子图，其余患者原样保留。
+MongoDB 游标按批流式读取，不会一次性把所有病历读进内存
+"""
+
+import json
+import os
+import time
+
+import networkx as nx
+
+from config import get_graph_database_config
+from graph_snapshot import file_version, save_graph
+from graph_store import get_graph_store
+
+UNKNOWN_PATIENT = "未知患者"
+
+BASIC_INFO_FIELDS = ['性别', '年龄', '民族', '职业', '婚姻状况']
+
+
+def patient_name_of(doc):
+    return doc.get('患者姓名') or UNKNOWN_PATIENT
+
+
+def add_patient_subgraph(G, doc, warn=print):
+    """把一份病历加入图中：患者节点及其基本信息、诊断、主诉、现病史、生化指标、治疗方案节点"""
+    patient_name = patient_name_of(doc)
+    G.add_node(patient_name, node_type="patient")
+
+    # 添加基本信息节点
+    try:
+        for field in BASIC_INFO_FIELDS:
+            if field in doc and doc[field]:
+                node_id = f"{field}_{doc[field]}_{patient_name}"
+                G.add_node(node_id,
+                           node_type="basic_info",
+                           field_name=field,
+                           field_value=str(doc[field]))
+                G.add_edge(patient_name, node_id, edge_type="has_basic_info")
+    except Exception as basic_error:
+        warn(f"处理患者 {patient_name} 的基本信息时出错: {str(basic_error)}")
+
+    # 添加诊断节点
+    try:
+        if '诊断' in doc and doc['诊断']:
+            diagnosis_node = f"诊断_{doc['诊断']}_{patient_name}"
+            G.add_node(diagnosis_node,
+                       node_type="diagnosis",
+                       content=str(doc['诊断']))
+            G.add_edge(patient_name, diagnosis_node, edge_type="has_diagnosis")
+    except Exception as diag_error:
+        warn(f"处理患者 {patient_name} 的诊断时出错: {str(diag_error)}")
+
+    # 主诉、现病史、治疗方案：每个患者一个文本节点
+    for field, node_type, edge_type in (
+        ('主诉', "chief_complaint", "has_complaint"),
+        ('现病史', "present_illness", "has_present_illness"),
+        ('治疗方案', "treatment", "has_treatment"),
+    ):
+        try:
+            if field in doc and doc[field]:
+                node_id = f"{field}_{patient_name}"
+                G.add_node(node_id, node_type=node_type, content=str(doc[field]))
+                G.add_edge(patient_name, node_id, edge_type=edge_type)
+        except Exception as field_error:
+            warn(f"处理患者 {patient_name} 的{field}时出错: {str(field_error)}")
+
+    # 添加生化指标节点
+    try:
+        if '生化指标' in doc and doc['生化指标']:
+            lab_data = doc['生化指标']
+            if isinstance(lab_data, dict):
+                for indicator, value in lab_data.items():
+                    if value:
+                        indicator_node = f"生化指标_{indicator}_{value}_{patient_name}"
+                        G.add_node(indicator_node,
+                                   node_type="lab_result",
+                                   indicator_name=str(indicator),
+                                   indicator_value=str(value))
+                        G.add_edge(patient_name, indicator_node, edge_type="has_lab_result")
+            elif isinstance(lab_data, list):
+                for i, item in enumerate(lab_data):
+                    if isinstance(item, dict):
+                        for indicator, value in item.items():
+                            if value:
+                                indicator_node = f"生化指标_{indicator}_{value}_{patient_name}_{i}"
+                                G.add_node(indicator_node,
+                                           node_type="lab_result",
+                                           indicator_name=str(indicator),
+                                           indicator_value=str(value))
+                                G.add_edge(patient_name, indicator_node, edge_type="has_lab_result")
+            else:
+                warn(f"患者 {patient_name} 的生化指标数据格式不支持: {type(lab_data)}")
+    except Exception as lab_error:
+        warn(f"处理患者 {patient_name} 的生化指标时出错: {str(lab_error)}")
+
+
+def remove_patient_subgraph(G, patient_name):
+    """删除患者节点以及只连接到该患者的节点"""
+    if patient_name not in G:
+        return
+    owned = [node for node in G.neighbors(patient_name) if G.degree(node) <= 1]
+    G.remove_nodes_from(owned)
+    G.remove_node(patient_name)
+
+
+def scan_patient_versions(collection, batch_size=200):
+    """只投影 _id、患者姓名和更新时间，流式统计每个患者的版本：{患者: [[_id, last_updated], ...]}"""
+    versions = {}
+    cursor = collection.find({}, {"_id": 1, "患者姓名": 1, "metadata.last_updated": 1}).batch_size(batch_size)
+    for doc in cursor:
+        last_updated = (doc.get("metadata") or {}).get("last_updated")
+        versions.setdefault(patient_name_of(doc), []).append([str(doc["_id"]), last_updated])
+    for name in versions:
+        versions[name].sort(key=lambda item: item[0])
+    return versions
+
+
+def iter_patient_docs(collection, patient_names, batch_size=200):
+    """按批取出指定患者的完整病历"""
+    names = list(patient_names)
+    for i in range(0, len(names), batch_size):
+        batch = names[i:i + batch_size]
+        if UNKNOWN_PATIENT in batch:
+            query = {"$or": [{"患者姓名": {"$in": batch}}, {"患者姓名": {"$in": [None, ""]}},
+                             {"患者姓名": {"$exists": False}}]}
+        else:
+            query = {"患者姓名": {"$in": batch}}
+        for doc in collection.find(query).batch_size(batch_size):
+            yield doc
+
+
+def load_build_state(state_file):
+    if not state_file or not os.path.exists(state_file):
+        return None
+    try:
+        with open(state_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_build_state(state_file, state):
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_file, state_file)
+
+
+def update_graph_from_mongodb(db, graph_file=None, state_file=None, batch_size=200, full=False,
+                              warn=print, write_snapshot=None):
+    """
+    增量更新图文件，返回统计信息
+    状态文件缺失、图文件在状态记录之后被其他程序改写、或 full=True 时，流式全量重建
+    """
+    start = time.perf_counter()
+    graph_config = get_graph_database_config()
+    graph_file = graph_file or graph_config["graph_file"]
+    state_file = state_file or graph_config.get("build_state_file", "graph_build_state.json")
+    if write_snapshot is None:
+        write_snapshot = graph_config.get("write_snapshot", True)
+    collection = db.patients
+
+    versions = scan_patient_versions(collection, batch_size)
+    state = load_build_state(state_file)
+    store = get_graph_store(graph_file)
+    current_version = file_version(graph_file) if os.path.exists(graph_file) else None
+    if current_version is not None:
+        current_version = list(current_version)
+
+    stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "full": False}
+    if full or state is None or state.get("graph_version") != current_version or store.graph is None:
+        stats["full"] = True
+        G = nx.Graph()
+        previous = {}
+        changed = list(versions)
+        stats["added"] = len(changed)
+    else:
+        G = store.graph.copy()
+        previous = state.get("patients", {})
+        changed = []
+        for name, version in versions.items():
+            if name not in previous:
+                changed.append(name)
+                stats["added"] += 1
+            elif previous[name] != version:
+                changed.append(name)
+                stats["updated"] += 1
+            else:
+                stats["unchanged"] += 1
+
+    removed = [name for name in previous if name not in versions]
+    stats["removed"] = len(removed)
+    for name in removed + changed:
+        remove_patient_subgraph(G, name)
+
+    if stats["full"]:
+        docs = collection.find().batch_size(batch_size)
+    else:
+        docs = iter_patient_docs(collection, changed, batch_size)
+    for doc in docs:
+        try:
+            add_patient_subgraph(G, doc, warn)
+        except Exception as patient_error:
+            warn(f"处理患者数据时出错: {str(patient_error)}")
+
+    if stats["full"] or changed or removed:
+        if write_snapshot:
+            save_graph(G, graph_file)
+        else:
+            nx.write_gexf(G, graph_file)
+        store.invalidate()
+        save_build_state(state_file, {
+            "graph_version": list(file_version(graph_file)),
+            "patients": versions
+        })
+
+    stats["nodes"] = G.number_of_nodes()
+    stats["edges"] = G.number_of_edges()
+    stats["seconds"] = time.perf_counter() - start
+    return stats
@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+图查询的 Neo4j 后端
+把 graph_query_engine 的查询格式编译成参数化 Cypher，通过共享的 Neo4j Driver 执行；
+标签和关系类型的命名与 neo4j_sync 写入时一致，查询结果与本地引擎的格式相同
+用法：python graph_cypher.py [--sizes 1000,100000,1000000] [--neo4j]  —— 对比本地 networkx 与 Neo4j 的查询延迟
+（--neo4j 会清空配置中的 Neo4j 库并写入合成图，只在测试库上使用）
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from config import get_graph_database_config, get_neo4j_config, get_neo4j_driver
+from graph_query_engine import GraphQueryResult, normalize_query, project_rows
+from neo4j_sync import node_label, number_property, relationship_type, strip_numbers
+
+CYPHER_COMPARATORS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def quote(name):
+    """Cypher 标识符（变量、属性名）统一加反引号"""
+    return "`" + str(name).replace("`", "``") + "`"
+
+
+def label_to_node_type():
+    """Neo4j 标签 -> node_type（同步时 node_type 去掉了下划线作为标签）"""
+    return {node_label({"node_type": node_type}): node_type
+            for node_type in get_graph_database_config().get("node_types", [])}
+
+
+class CypherCompiler:
+    """把一个查询编译成 (cypher, params)；params 按出现顺序命名为 p0, p1, ..."""
+    def __init__(self):
+        self.params = {}
+
+    def param(self, value):
+        key = f"p{len(self.params)}"
+        self.params[key] = value
+        return f"${key}"
+
+    def _property(self, var, attr, is_node=True):
+        if is_node and attr in ("name", "id"):
+            return f"{quote(var)}.id"
+        return f"{quote(var)}.{quote(attr)}"
+
+    def _number(self, var, attr, is_node=True):
+        """同步时由 graph_query_engine.to_number 解析出的数值属性"""
+        if is_node and attr in ("name", "id"):
+            attr = "id"
+        return f"{quote(var)}.{quote(number_property(attr))}"
+
+    def predicate(self, expression, predicate, number=None):
+        """单个属性的谓词，语义与 graph_query_engine.match_predicate 一致；number 为数值比较用的属性"""
+        if not isinstance(predicate, dict):
+            predicate = {"$eq": predicate}
+        conditions = []
+        text = f"toString({expression})"
+        for op, expected in predicate.items():
+            if op == "$eq":
+                conditions.append(f"{text} = {self.param(str(expected))}")
+            elif op == "$ne":
+                conditions.append(f"({expression} IS NULL OR {text} <> {self.param(str(expected))})")
+            elif op == "$in":
+                conditions.append(f"{text} IN {self.param([str(item) for item in expected])}")
+            elif op == "$contains":
+                conditions.append(f"{text} CONTAINS {self.param(str(expected))}")
+            elif op == "$regex":
+                # Cypher 的 =~ 要求整串匹配，包一层 .* 以对应 re.search
+                conditions.append(f"{text} =~ {self.param('(?s).*(?:' + expected + ').*')}")
+            elif op == "$exists":
+                conditions.append(f"{expression} IS {'NOT ' if expected else ''}NULL")
+            elif op in CYPHER_COMPARATORS:
+                conditions.append(f"{number} {CYPHER_COMPARATORS[op]} {self.param(float(expected))}")
+            else:
+                raise ValueError(f"不支持的谓词: {op}")
+        return " AND ".join(conditions)
+
+    def where(self, var, where, is_node=True):
+        conditions = []
+        for key, predicate in (where or {}).items():
+            if key == "$or":
+                clauses = [self.where(var, clause, is_node) or "true" for clause in predicate]
+                conditions.append("(" + " OR ".join(f"({clause})" for clause in clauses) + ")")
+            else:
+                conditions.append(self.predicate(self._property(var, key, is_node), predicate,
+                                                 self._number(var, key, is_node)))
+        return " AND ".join(conditions)
+
+    def compile(self, query_obj, with_bindings=False):
+        """
+        返回 (cypher, params, 输出说明)
+        with_bindings=False 时由 Neo4j 直接按返回列去重并 LIMIT；
+        为 True 时返回每个变量的节点ID/属性，供旧格式按节点属性拼接结果
+        """
+        patterns, columns, limit = normalize_query(query_obj)
+        clauses = []
+        conditions = []
+        node_vars, edge_vars = [], []
+        for i, path in enumerate(patterns):
+            parts = []
+            for j, step in enumerate(path):
+                if j % 2 == 0:
+                    var = step["var"]
+                    if var not in node_vars:
+                        node_vars.append(var)
+                    label = f":{quote(node_label({'node_type': step['type']}))}" if step.get("type") else ""
+                    parts.append(f"({quote(var)}{label})")
+                    if step.get("name"):
+                        conditions.append(f"{quote(var)}.id IN {self.param([str(name) for name in step['name']])}")
+                    if step.get("where"):
+                        conditions.append(self.where(var, step["where"]))
+                else:
+                    var = step.get("var") or (f"_r{i}_{j}" if step.get("where") else None)
+                    if var and var not in edge_vars:
+                        edge_vars.append(var)
+                    rel_type = f":{quote(relationship_type({'edge_type': step['type']}))}" if step.get("type") else ""
+                    # 本地图是无向图，同步到 Neo4j 时方向取决于边的存储顺序，因此匹配时不限定方向
+                    parts.append(f"-[{quote(var) if var else ''}{rel_type}]-")
+                    if step.get("where"):
+                        conditions.append(self.where(var, step["where"], is_node=False))
+            clauses.append("MATCH " + "".join(parts))
+
+        cypher = "\n".join(clauses)
+        if conditions:
+            cypher += "\nWHERE " + " AND ".join(f"({condition})" for condition in conditions)
+
+        if with_bindings:
+            returns = []
+            for var in node_vars:
+                returns += [f"{quote(var)}.id AS {quote(var)}", f"properties({quote(var)}) AS {quote(var + '__props')}",
+                            f"labels({quote(var)}) AS {quote(var + '__labels')}"]
+            for var in edge_vars:
+                returns += [f"type({quote(var)}) AS {quote(var + '__type')}",
+                            f"properties({quote(var)}) AS {quote(var + '__props')}"]
+            cypher += "\nRETURN " + ", ".join(returns)
+            output = {"node_vars": node_vars, "edge_vars": edge_vars, "columns": columns, "limit": limit}
+        else:
+            returns = []
+            kinds = []
+            for k, column in enumerate(columns):
+                var, _, attr = column.partition(".")
+                if var in edge_vars:
+                    if not attr or attr in ("edge_type", "type"):
+                        returns.append(f"type({quote(var)}) AS c{k}")
+                        kinds.append("edge_type")
+                    else:
+                        returns.append(f"{self._property(var, attr, is_node=False)} AS c{k}")
+                        kinds.append("value")
+                elif attr == "node_type":
+                    returns.append(f"labels({quote(var)})[0] AS c{k}")
+                    kinds.append("node_type")
+                else:
+                    returns.append(f"{self._property(var, attr or 'id')} AS c{k}")
+                    kinds.append("value")
+            cypher += "\nRETURN DISTINCT " + ", ".join(returns)
+            output = {"columns": columns, "kinds": kinds, "limit": limit}
+        if limit:
+            cypher += f"\nLIMIT {self.param(int(limit))}"
+        return cypher, self.params, output
+
+
+def compile_query(query_obj, with_bindings=False):
+    return CypherCompiler().compile(query_obj, with_bindings)
+
+
+class Neo4jGraphQueryEngine:
+    """在 Neo4j 上执行查询；接口和返回值与 GraphQueryEngine 相同"""
+    def __init__(self, driver=None, database=None):
+        self.driver = driver or get_neo4j_driver()
+        if self.driver is None:
+            raise ValueError("Neo4j 不可用，请检查配置")
+        self.database = database or get_neo4j_config().get("database")
+
+    def _session(self):
+        return self.driver.session(database=self.database) if self.database else self.driver.session()
+
+    def execute(self, query_obj):
+        start = time.perf_counter()
+        # 旧格式需要终点节点的全部属性来拼接结果，新格式直接在数据库中去重取列
+        with_bindings = "match" not in query_obj
+        cypher, params, output = compile_query(query_obj, with_bindings)
+
+        def work(tx):
+            result = tx.run(cypher, **params)
+            records = result.data()
+            return records, result.consume()
+
+        with self._session() as session:
+            records, summary = session.execute_read(work)
+
+        type_names = label_to_node_type()
+        if with_bindings:
+            nodes = {}
+            bindings = []
+            for record in records:
+                binding = {}
+                for var in output["node_vars"]:
+                    node_id = record[var]
+                    binding[var] = node_id
+                    if node_id not in nodes:
+                        data = strip_numbers(record[var + "__props"])
+                        data.pop("id", None)
+                        labels = record[var + "__labels"]
+                        if labels:
+                            data["node_type"] = type_names.get(labels[0], labels[0])
+                        nodes[node_id] = data
+                for var in output["edge_vars"]:
+                    data = strip_numbers(record[var + "__props"])
+                    data["edge_type"] = record[var + "__type"].lower()
+                    binding[var] = data
+                bindings.append(binding)
+            rows = project_rows(bindings, output["columns"], output["limit"], nodes.get)
+            node_lookup = nodes.get
+        else:
+            bindings = []
+            rows = []
+            for record in records:
+                row = {}
+                for k, (column, kind) in enumerate(zip(output["columns"], output["kinds"])):
+                    value = record[f"c{k}"]
+                    if value is None:
+                        value = ""
+                    elif kind == "edge_type":
+                        value = value.lower()
+                    elif kind == "node_type":
+                        value = type_names.get(value, value)
+                    row[column] = str(value)
+                rows.append(row)
+            node_lookup = None
+
+        server_ms = (getattr(summary, "result_available_after", None) or 0) + \
+            (getattr(summary, "result_consumed_after", None) or 0)
+        report = {
+            "backend": "neo4j",
+            "cypher": cypher,
+            "rows": len(rows),
+            "bindings": len(bindings),
+            "server_ms": float(server_ms),
+            "seconds": time.perf_counter() - start
+        }
+        return GraphQueryResult(output["columns"], rows, bindings, report, node_lookup)
+
+
+# ---------- 基准测试 ----------
+
+def benchmark_queries(G):
+    """两类查询：某患者的全部生化指标（旧的单跳格式）；男性且某指标偏高的患者（双模式连接）"""
+    patient = next(node for node, data in G.nodes(data=True) if data.get("node_type") == "patient")
+    return {
+        "single_hop": {
+            "start_node": {"type": "patient", "name": patient},
+            "relationship": "has_lab_result",
+            "end_node": {"type": "lab_result"},
+            "return": ["end_node.indicator_name", "end_node.indicator_value"]
+        },
+        "two_pattern_join": {
+            "match": [
+                {"path": [{"var": "p", "type": "patient"}, "has_basic_info",
+                          {"var": "b", "type": "basic_info", "where": {"field_name": "性别", "field_value": "男"}}]},
+                {"path": [{"var": "p"}, "has_lab_result",
+                          {"var": "l", "type": "lab_result",
+                           "where": {"indicator_name": "指标3", "indicator_value": {"$gt": 450}}}]}
+            ],
+            "return": ["p.name", "l.indicator_value"],
+            "limit": 20
+        }
+    }
+
+
+def _latencies(engine, query, repeat):
+    engine.execute(query)  # 预热
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine.execute(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.median(latencies)), float(np.percentile(latencies, 95))
+
+
+def benchmark(sizes, repeat=20, use_neo4j=False):
+    """每个规模生成合成图，分别在本地引擎和 Neo4j（use_neo4j 且可连接时）上执行同样的查询，返回延迟（毫秒）"""
+    from graph_query_engine import GraphQueryEngine
+    from graph_snapshot import synthetic_graph
+    from graph_store import GraphStore
+    from neo4j_sync import bulk_import_graph
+
+    driver = get_neo4j_driver() if use_neo4j else None
+    try:
+        if driver is not None:
+            driver.verify_connectivity()
+    except Exception as e:
+        print(f"Neo4j 不可用，只测本地引擎: {e}")
+        driver = None
+
+    report = []
+    for size in sizes:
+        G = synthetic_graph(max(1, size // 36))  # 合成图每个患者 36 个节点
+        queries = benchmark_queries(G)
+        engines = {"local": GraphQueryEngine(GraphStore.from_graph(G))}
+        if driver is not None:
+            bulk_import_graph(G, driver)
+            engines["neo4j"] = Neo4jGraphQueryEngine(driver)
+        for backend, engine in engines.items():
+            for name, query in queries.items():
+                p50, p95 = _latencies(engine, query, repeat)
+                report.append({"nodes": G.number_of_nodes(), "backend": backend, "query": name,
+                               "p50_ms": p50, "p95_ms": p95})
+    return report
+
+
+if __name__ == "__main__":
+    sizes = [1000, 100000, 1000000]
+    if "--sizes" in sys.argv:
+        sizes = [int(size) for size in sys.argv[sys.argv.index("--sizes") + 1].split(",")]
+    print(f"{'节点数':>10}{'后端':>8}{'查询':>20}{'p50(ms)':>10}{'p95(ms)':>10}")
+    for row in benchmark(sizes, use_neo4j="--neo4j" in sys.argv):
+        print(f"{row['nodes']:>10}{row['backend']:>8}{row['query']:>20}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}")
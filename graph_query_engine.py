@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+"""
+图查询引擎
+在 GraphStore 的类型索引和 (起点, 关系类型) 邻接索引上执行多跳、多模式的路径查询，
+一次求值返回全部结果，并附带每个模式的代价与耗时报告。
+
+查询格式（旧的单跳格式 start_node / relationship / end_node 仍然支持）：
+{
+    "match": [
+        {"path": [
+            {"var": "p", "type": "patient"},
+            {"type": "has_diagnosis"},
+            {"var": "d", "type": "diagnosis", "where": {"content": {"$contains": "脑梗死"}}}
+        ]},
+        {"path": [
+            {"var": "p"},
+            {"type": "has_lab_result"},
+            {"var": "l", "type": "lab_result",
+             "where": {"indicator_name": "肌酐", "indicator_value": {"$gt": 133}}}
+        ]}
+    ],
+    "return": ["p.name", "d.content", "l.indicator_value"],
+    "limit": 20
+}
+path 中节点与关系交替出现；节点可用 name 指定一个或多个起点，where 为属性谓词，
+同名变量在各模式之间做等值连接。
+"""
+
+import operator
+import re
+import time
+
+from config import get_graph_database_config
+from graph_store import edge_type_of, get_graph_store, node_type_of
+
+NUMBER_PATTERN = re.compile(r"[-+]?\d+(?:\.\d+)?")
+
+COMPARATORS = {
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le
+}
+
+# 没有 where 条件时按类型索引大小估算，有 where 条件时假设只保留一小部分
+WHERE_SELECTIVITY = 0.1
+
+
+def to_number(value):
+    """从 "329.5"、"329.5 μmol/L↑" 这类字符串中取出数值，取不到时返回 None"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if value is None:
+        return None
+    match = NUMBER_PATTERN.search(str(value))
+    return float(match.group()) if match else None
+
+
+def match_predicate(value, predicate):
+    """
+    单个属性的谓词；非字典按字符串相等比较
+    支持 $eq $ne $in $contains $regex $exists 以及数值比较 $gt $gte $lt $lte
+    """
+    if not isinstance(predicate, dict):
+        return value is not None and str(value) == str(predicate)
+    for op, expected in predicate.items():
+        if op == "$eq":
+            ok = value is not None and str(value) == str(expected)
+        elif op == "$ne":
+            ok = value is None or str(value) != str(expected)
+        elif op == "$in":
+            ok = value is not None and str(value) in {str(item) for item in expected}
+        elif op == "$contains":
+            ok = value is not None and str(expected) in str(value)
+        elif op == "$regex":
+            ok = value is not None and re.search(expected, str(value)) is not None
+        elif op == "$exists":
+            ok = (value is not None) == bool(expected)
+        elif op in COMPARATORS:
+            number = to_number(value)
+            ok = number is not None and COMPARATORS[op](number, float(expected))
+        else:
+            raise ValueError(f"不支持的谓词: {op}")
+        if not ok:
+            return False
+    return True
+
+
+def match_where(node_id, data, where):
+    """where 中各属性之间为且关系，$or 为若干 where 的或；name / id 指节点 ID"""
+    for key, predicate in (where or {}).items():
+        if key == "$or":
+            if not any(match_where(node_id, data, clause) for clause in predicate):
+                return False
+            continue
+        value = node_id if key in ("name", "id") and key not in data else data.get(key)
+        if not match_predicate(value, predicate):
+            return False
+    return True
+
+
+def from_legacy(query_obj):
+    """把旧的单跳查询转换成路径查询，变量名沿用 start_node / relationship / end_node"""
+    start = query_obj.get("start_node", {})
+    end = query_obj.get("end_node", {})
+    start_spec = {"var": "start_node", "type": start.get("type")}
+    if start.get("name"):
+        start_spec["name"] = start["name"]
+    end_spec = {"var": "end_node", "type": end.get("type")}
+    if end.get("where"):
+        end_spec["where"] = end["where"]
+    return {
+        "match": [{"path": [start_spec, {"var": "relationship", "type": query_obj.get("relationship")}, end_spec]}],
+        "return": query_obj.get("return", []),
+        "limit": query_obj.get("limit")
+    }
+
+
+def normalize_query(query_obj):
+    """校验查询并补全变量名，返回 (模式列表, 返回列, limit)"""
+    if "match" not in query_obj:
+        if "start_node" not in query_obj:
+            raise ValueError("查询缺少 match 或 start_node")
+        query_obj = from_legacy(query_obj)
+
+    patterns = []
+    for i, pattern in enumerate(query_obj["match"]):
+        path = pattern.get("path") if isinstance(pattern, dict) else pattern
+        if not path or len(path) % 2 == 0:
+            raise ValueError(f"第 {i + 1} 个模式的路径应为 节点-关系-节点… 交替的奇数长度列表")
+        steps = []
+        for j, step in enumerate(path):
+            if j % 2 == 1 and not isinstance(step, dict):
+                step = {"type": step}  # 关系可以直接写关系类型
+            step = dict(step)
+            if j % 2 == 0:
+                step.setdefault("var", f"_n{i}_{j}")
+                if isinstance(step.get("name"), str):
+                    step["name"] = [step["name"]]
+            steps.append(step)
+        patterns.append(steps)
+    check_connected(patterns)
+    return patterns, list(query_obj.get("return", [])), query_obj.get("limit")
+
+
+def check_connected(patterns):
+    """
+    所有模式必须通过共享的节点变量连成一体；互不相连的模式之间只能做笛卡尔积，
+    中间结果按乘积膨胀，直接拒绝而不是等到超过 query_max_bindings 才报错
+    """
+    connected = {step["var"] for step in patterns[0][::2]} if patterns else set()
+    pending = list(range(1, len(patterns)))
+    while pending:
+        linked = [i for i in pending if connected & {step["var"] for step in patterns[i][::2]}]
+        if not linked:
+            raise ValueError(f"第 {pending[0] + 1} 个模式与其他模式没有共享的节点变量，会产生笛卡尔积；请用同一个变量把模式连起来")
+        for i in linked:
+            connected.update(step["var"] for step in patterns[i][::2])
+            pending.remove(i)
+
+
+class GraphQueryResult:
+    """
+    查询结果：rows 为按 return 取值并去重后的行，bindings 为变量绑定，report 为代价报告
+    node(节点ID) 返回节点属性，本地引擎查 GraphStore，Neo4j 引擎查随结果一起返回的属性
+    """
+    def __init__(self, columns, rows, bindings, report, node_lookup=None):
+        self.columns = columns
+        self.rows = rows
+        self.bindings = bindings
+        self.report = report
+        self._node_lookup = node_lookup
+
+    def node(self, node_id):
+        return self._node_lookup(node_id) if self._node_lookup else None
+
+
+class GraphQueryEngine:
+    def __init__(self, store=None):
+        self.store = store or get_graph_store()
+        self.max_bindings = get_graph_database_config().get("query_max_bindings", 200000)
+
+    # ---------- 节点与邻接 ----------
+
+    def _node_matches(self, node_id, spec):
+        data = self.store.node(node_id)
+        if data is None:
+            return False
+        if spec.get("type") and node_type_of(data) != spec["type"]:
+            return False
+        if spec.get("name") and node_id not in spec["name"]:
+            return False
+        return match_where(node_id, data, spec.get("where"))
+
+    def _neighbors(self, node_id, edge_type):
+        if edge_type:
+            return self.store.neighbors(node_id, edge_type)
+        return list(self.store.graph.adj[node_id].items())
+
+    def _estimate(self, spec, bound):
+        """某个节点作为起点时的候选数估计；已被其他模式绑定的变量用实际取值个数"""
+        if spec["var"] in bound:
+            return len(bound[spec["var"]])
+        if spec.get("name"):
+            return len(spec["name"])
+        if spec.get("type"):
+            size = len(self.store.nodes_by_type(spec["type"]))
+        else:
+            size = self.store.graph.number_of_nodes()
+        return size * WHERE_SELECTIVITY if spec.get("where") else size
+
+    def _plan(self, path, bound):
+        """选候选最少的节点作为起点，返回 (下标, 估计值)"""
+        estimates = [(self._estimate(path[j], bound), j) for j in range(0, len(path), 2)]
+        estimate, anchor = min(estimates)
+        return anchor, estimate
+
+    # ---------- 求值 ----------
+
+    def _candidates(self, spec, bound):
+        restrict = bound.get(spec["var"])
+        if spec.get("name"):
+            nodes = spec["name"]
+        elif restrict is not None:
+            nodes = restrict
+        elif spec.get("type"):
+            nodes = self.store.nodes_by_type(spec["type"])
+        else:
+            nodes = list(self.store.graph.nodes)
+        if restrict is not None:
+            nodes = [node for node in nodes if node in restrict]
+        return [node for node in nodes if self._node_matches(node, spec)]
+
+    def _expand(self, bindings, from_var, edge_spec, to_spec, bound, stats):
+        to_var = to_spec["var"]
+        edge_var = edge_spec.get("var")
+        restrict = bound.get(to_var)
+        expanded = []
+        checked = {}
+        for binding in bindings:
+            for neighbor, edge_data in self._neighbors(binding[from_var], edge_spec.get("type")):
+                stats["expansions"] += 1
+                if to_var in binding:
+                    if binding[to_var] != neighbor:
+                        continue
+                elif restrict is not None and neighbor not in restrict:
+                    continue
+                ok = checked.get(neighbor)
+                if ok is None:
+                    ok = checked[neighbor] = self._node_matches(neighbor, to_spec)
+                if not ok or not match_where(None, edge_data, edge_spec.get("where")):
+                    continue
+                new_binding = dict(binding)
+                new_binding[to_var] = neighbor
+                if edge_var:
+                    new_binding[edge_var] = edge_data
+                expanded.append(new_binding)
+            if len(expanded) > self.max_bindings:
+                raise ValueError(f"中间结果超过 {self.max_bindings} 条，请增加过滤条件")
+        return expanded
+
+    def _evaluate_path(self, path, anchor, bound, stats):
+        candidates = self._candidates(path[anchor], bound)
+        stats["candidates"] = len(candidates)
+        bindings = [{path[anchor]["var"]: node} for node in candidates]
+        # 从起点先向右再向左展开；图是无向图，两个方向都走同一份邻接索引
+        for j in range(anchor, len(path) - 1, 2):
+            if not bindings:
+                break
+            bindings = self._expand(bindings, path[j]["var"], path[j + 1], path[j + 2], bound, stats)
+        for j in range(anchor, 0, -2):
+            if not bindings:
+                break
+            bindings = self._expand(bindings, path[j]["var"], path[j - 1], path[j - 2], bound, stats)
+        return bindings
+
+    @staticmethod
+    def _join(left, right, shared):
+        """按共享变量做哈希连接；执行顺序保证每个模式都与已连接的模式共享变量"""
+        if not shared:
+            raise ValueError("模式之间没有共享变量，拒绝执行笛卡尔积")
+        table = {}
+        for binding in right:
+            table.setdefault(tuple(binding[var] for var in shared), []).append(binding)
+        joined = []
+        for binding in left:
+            for match in table.get(tuple(binding[var] for var in shared), []):
+                joined.append(dict(binding, **match))
+        return joined
+
+    def execute(self, query_obj):
+        start = time.perf_counter()
+        patterns, columns, limit = normalize_query(query_obj)
+        report = {"patterns": [], "join_order": [], "skipped": 0}
+        if self.store.graph is None:
+            raise ValueError("图数据库文件不存在")
+
+        node_vars = {step["var"] for path in patterns for step in path[::2]}
+        bindings = None
+        bound = {}  # 变量 -> 已绑定的节点集合，后续模式只在这些节点中展开（半连接）
+        remaining = list(range(len(patterns)))
+        while remaining:
+            # 第一个模式之后只从与已绑定变量相连的模式中选，避免中途出现不相连的连接
+            candidates = [i for i in remaining if bindings is None or
+                          {step["var"] for step in patterns[i][::2]} & set(bound)]
+            plans = {i: self._plan(patterns[i], bound) for i in candidates}
+            index = min(candidates, key=lambda i: plans[i][1])
+            remaining.remove(index)
+            anchor, estimate = plans[index]
+            path = patterns[index]
+
+            pattern_start = time.perf_counter()
+            stats = {"pattern": index, "anchor": path[anchor]["var"], "estimate": estimate,
+                     "candidates": 0, "expansions": 0}
+            pattern_bindings = self._evaluate_path(path, anchor, bound, stats)
+            path_vars = {step["var"] for step in path[::2]}
+            if bindings is None:
+                bindings = pattern_bindings
+            else:
+                shared = sorted(path_vars & set(bound))
+                bindings = self._join(bindings, pattern_bindings, shared)
+            stats["bindings"] = len(pattern_bindings)
+            stats["joined"] = len(bindings)
+            stats["seconds"] = time.perf_counter() - pattern_start
+            report["patterns"].append(stats)
+            report["join_order"].append(index)
+
+            if not bindings:
+                report["skipped"] = len(remaining)
+                break
+            for var in node_vars & set(bindings[0]):
+                bound[var] = {binding[var] for binding in bindings}
+
+        bindings = bindings or []
+        rows = project_rows(bindings, columns, limit, self.store.node)
+        report["bindings"] = len(bindings)
+        report["rows"] = len(rows)
+        report["seconds"] = time.perf_counter() - start
+        report["backend"] = "local"
+        return GraphQueryResult(columns, rows, bindings, report, self.store.node)
+
+
+def binding_value(binding, column, node_lookup):
+    """按 "变量.属性" 取值；节点变量不带属性或属性为 name / id 时返回节点ID，关系变量绑定的是边属性"""
+    var, _, attr = column.partition(".")
+    value = binding.get(var)
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        if not attr or attr in ("edge_type", "type"):
+            return edge_type_of(value) or ""
+        return value.get(attr, "")
+    if not attr or attr in ("name", "id"):
+        return value
+    return (node_lookup(value) or {}).get(attr, "")
+
+
+def project_rows(bindings, columns, limit, node_lookup):
+    """按返回列取值并去重，最多 limit 行"""
+    rows = []
+    seen = set()
+    for binding in bindings:
+        row = tuple(str(binding_value(binding, column, node_lookup)) for column in columns)
+        if row in seen:
+            continue
+        seen.add(row)
+        rows.append(dict(zip(columns, row)))
+        if limit and len(rows) >= limit:
+            break
+    return rows
+
+
+def format_rows(result):
+    """把结果行格式化成 "列: 值 | 列: 值" 文本，供生成回答时作为上下文"""
+    return [" | ".join(f"{column}: {row[column]}" for column in result.columns) for row in result.rows]
+
+
+def format_report(report):
+    """一行代价报告：各模式的起点变量、候选数、展开次数、绑定数和耗时；Neo4j 后端为服务端与总耗时"""
+    if report.get("backend") == "neo4j":
+        return (f"Neo4j[服务端 {report['server_ms']:.1f}ms]；"
+                f"共 {report['rows']} 行，{report['seconds'] * 1000:.1f}ms")
+    parts = [
+        f"模式{stats['pattern'] + 1}[起点 {stats['anchor']}，候选 {stats['candidates']}，"
+        f"展开 {stats['expansions']}，绑定 {stats['bindings']}，{stats['seconds'] * 1000:.1f}ms]"
+        for stats in report["patterns"]
+    ]
+    return f"{' → '.join(parts)}；共 {report['rows']} 行，{report['seconds'] * 1000:.1f}ms"
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""
+图数据的紧凑二进制快照
+邻接关系按 CSR 存成 numpy 数组，节点 ID、类型、属性名和属性值全部驻留到一张字符串表中，
+属性值另存类型码，还原时恢复 int / float / bool；所有文件都可以内存映射加载；GEXF 仍然保留，用于 Gephi 等工具
+用法：python graph_snapshot.py [--patients N]  —— 对比 GEXF 与快照的加载耗时和内存占用
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import networkx as nx
+import numpy as np
+
+SNAPSHOT_VERSION = 2
+
+ARRAY_FILES = (
+    "string_offsets", "string_order",
+    "node_name", "node_order", "node_type", "node_attr_ptr", "node_attr_key", "node_attr_val", "node_attr_kind",
+    "edge_src", "edge_dst", "edge_attr_ptr", "edge_attr_key", "edge_attr_val", "edge_attr_kind",
+    "indptr", "indices", "adj_edge"
+)
+
+# 属性值的类型码：值本身以字符串形式存在字符串表中，加载时按类型码转换回来
+KIND_STR, KIND_INT, KIND_FLOAT, KIND_BOOL = 0, 1, 2, 3
+_DECODERS = {
+    KIND_STR: str,
+    KIND_INT: int,
+    KIND_FLOAT: float,
+    KIND_BOOL: lambda value: value == "True"
+}
+
+
+def value_kind(value):
+    """属性值的类型码，bool 要先于 int 判断；其他类型按字符串保存"""
+    if isinstance(value, (bool, np.bool_)):
+        return KIND_BOOL
+    if isinstance(value, (int, np.integer)):
+        return KIND_INT
+    if isinstance(value, (float, np.floating)):
+        return KIND_FLOAT
+    return KIND_STR
+
+
+def decode_value(value, kind):
+    return _DECODERS[kind](value)
+
+
+class StringTable:
+    """建快照时使用的字符串驻留表：相同字符串只存一份"""
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def intern(self, value):
+        value = "" if value is None else str(value)
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[value] = string_id
+            self.strings.append(value)
+        return string_id
+
+
+def _attr_csr(items, strings):
+    """把每个元素的属性字典编码为 CSR：ptr / key / val 都是字符串表下标，kind 为值的类型码"""
+    ptr = [0]
+    keys = []
+    values = []
+    kinds = []
+    for data in items:
+        for key, value in data.items():
+            keys.append(strings.intern(key))
+            kind = value_kind(value)
+            values.append(strings.intern(bool(value) if kind == KIND_BOOL else value))
+            kinds.append(kind)
+        ptr.append(len(keys))
+    return (np.asarray(ptr, dtype=np.int64), np.asarray(keys, dtype=np.int32),
+            np.asarray(values, dtype=np.int32), np.asarray(kinds, dtype=np.int8))
+
+
+def write_snapshot(G, path, source_version=None, gexf_labels=False):
+    """
+    把 nx 图写成快照目录（先写临时目录，再用两次 rename 换下旧目录）
+    source_version 记录对应 GEXF 文件的 (mtime_ns, size)，加载方据此判断快照是否过期
+    gexf_labels 为 True 时像 nx.read_gexf 一样给没有 label 的节点补上 label=节点 ID，
+    使快照还原的图与解析 GEXF 得到的图一致
+    """
+    strings = StringTable()
+    nodes = list(G.nodes(data=True))
+    node_index = {node: i for i, (node, _) in enumerate(nodes)}
+
+    node_name = np.asarray([strings.intern(node) for node, _ in nodes], dtype=np.int32)
+    node_type = np.asarray([strings.intern(data.get("node_type", data.get("type"))) for _, data in nodes],
+                           dtype=np.int32)
+    node_attr_ptr, node_attr_key, node_attr_val, node_attr_kind = _attr_csr(
+        (data if not gexf_labels or "label" in data else {**data, "label": str(node)} for node, data in nodes),
+        strings
+    )
+
+    edges = list(G.edges(data=True))
+    edge_src = np.asarray([node_index[u] for u, _, _ in edges], dtype=np.int32)
+    edge_dst = np.asarray([node_index[v] for _, v, _ in edges], dtype=np.int32)
+    edge_attr_ptr, edge_attr_key, edge_attr_val, edge_attr_kind = _attr_csr((data for _, _, data in edges), strings)
+
+    # CSR 邻接：无向图两个方向各存一条，adj_edge 指回边编号以取边属性
+    directed = G.is_directed()
+    edge_ids = np.arange(len(edges), dtype=np.int32)
+    if directed:
+        sources, targets, adj_edge = edge_src, edge_dst, edge_ids
+    else:
+        sources = np.concatenate([edge_src, edge_dst])
+        targets = np.concatenate([edge_dst, edge_src])
+        adj_edge = np.concatenate([edge_ids, edge_ids])
+    order = np.argsort(sources, kind="stable")
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=len(nodes)), out=indptr[1:])
+
+    encoded = [s.encode("utf-8") for s in strings.strings]
+    string_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=string_offsets[1:])
+    # 按字节序排序的下标，加载后可二分查找字符串和节点，无需构建字典
+    string_order = np.asarray(sorted(range(len(encoded)), key=encoded.__getitem__), dtype=np.int32)
+    node_order = np.asarray(sorted(range(len(nodes)), key=lambda i: encoded[node_name[i]]), dtype=np.int32)
+
+    arrays = {
+        "string_offsets": string_offsets, "string_order": string_order,
+        "node_name": node_name, "node_order": node_order, "node_type": node_type,
+        "node_attr_ptr": node_attr_ptr, "node_attr_key": node_attr_key, "node_attr_val": node_attr_val,
+        "node_attr_kind": node_attr_kind,
+        "edge_src": edge_src, "edge_dst": edge_dst,
+        "edge_attr_ptr": edge_attr_ptr, "edge_attr_key": edge_attr_key, "edge_attr_val": edge_attr_val,
+        "edge_attr_kind": edge_attr_kind,
+        "indptr": indptr, "indices": targets[order].astype(np.int32), "adj_edge": adj_edge[order].astype(np.int32)
+    }
+
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".snapshot-")
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), array)
+        with open(os.path.join(tmp, "strings.bin"), "wb") as f:
+            f.write(b"".join(encoded))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": SNAPSHOT_VERSION,
+                "directed": directed,
+                "nodes": len(nodes),
+                "edges": len(edges),
+                "strings": len(encoded),
+                "source_version": list(source_version) if source_version else None
+            }, f)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    _swap_directory(tmp, path)
+
+
+def _swap_directory(new, path):
+    """
+    用新目录替换旧目录：旧目录先改名移开，新目录再改名到位，最后删除旧目录
+    任何时刻 path 要么是完整的旧快照、要么是完整的新快照（或短暂不存在，加载方退回解析 GEXF），
+    不会出现删到一半的目录；已经内存映射旧文件的读者不受删除影响
+    """
+    retired = None
+    if os.path.exists(path):
+        retired = new + ".old"
+        os.rename(path, retired)
+    try:
+        os.rename(new, path)
+    except Exception:
+        if retired is not None:
+            os.rename(retired, path)
+        shutil.rmtree(new, ignore_errors=True)
+        raise
+    if retired is not None:
+        shutil.rmtree(retired, ignore_errors=True)
+
+
+class GraphSnapshot:
+    """
+    内存映射加载的只读图
+    加载时只读 meta.json 并映射数组，字符串按需解码；节点查找为字符串表上的二分查找
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"不支持的快照版本: {self.meta.get('version')}")
+        for name in ARRAY_FILES:
+            setattr(self, f"_{name}", np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        strings_path = os.path.join(path, "strings.bin")
+        self._strings = (np.memmap(strings_path, dtype=np.uint8, mode="r")
+                         if os.path.getsize(strings_path) else np.empty(0, dtype=np.uint8))
+
+    @property
+    def source_version(self):
+        version = self.meta.get("source_version")
+        return tuple(version) if version else None
+
+    def string(self, string_id):
+        start, end = self._string_offsets[string_id], self._string_offsets[string_id + 1]
+        return self._strings[start:end].tobytes().decode("utf-8")
+
+    def _bisect(self, order, key_of, target):
+        encoded = target.encode("utf-8")
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key_of(int(order[mid])) < encoded:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and key_of(int(order[lo])) == encoded:
+            return int(order[lo])
+        return None
+
+    def _string_bytes(self, string_id):
+        start, end = self._string_offsets[string_id], self._string_offsets[string_id + 1]
+        return self._strings[start:end].tobytes()
+
+    def string_id(self, value):
+        """字符串在表中的下标，不存在时返回 None"""
+        return self._bisect(self._string_order, self._string_bytes, value)
+
+    def node_index(self, name):
+        return self._bisect(self._node_order, lambda i: self._string_bytes(self._node_name[i]), name)
+
+    def _attrs(self, ptr, keys, values, kinds, i):
+        start, end = ptr[i], ptr[i + 1]
+        return {self.string(keys[j]): decode_value(self.string(values[j]), int(kinds[j])) for j in range(start, end)}
+
+    def node_attrs(self, name):
+        i = self.node_index(name)
+        if i is None:
+            return None
+        return self._attrs(self._node_attr_ptr, self._node_attr_key, self._node_attr_val, self._node_attr_kind, i)
+
+    def nodes_by_type(self, node_type):
+        type_id = self.string_id(node_type)
+        if type_id is None:
+            return []
+        return [self.string(self._node_name[i]) for i in np.flatnonzero(self._node_type == type_id)]
+
+    def neighbors(self, name, edge_type=None):
+        """返回 [(邻居, 边属性)]，edge_type 不为空时只保留该关系类型"""
+        i = self.node_index(name)
+        if i is None:
+            return []
+        result = []
+        for k in range(self._indptr[i], self._indptr[i + 1]):
+            edge = self._adj_edge[k]
+            data = self._attrs(self._edge_attr_ptr, self._edge_attr_key, self._edge_attr_val, self._edge_attr_kind, edge)
+            if edge_type is None or data.get("edge_type", data.get("relationship", data.get("type"))) == edge_type:
+                result.append((self.string(self._node_name[self._indices[k]]), data))
+        return result
+
+    def to_networkx(self):
+        """还原为 nx.Graph（属性值恢复原类型）；一次性解码整张字符串表，避免逐个切片"""
+        blob = self._strings.tobytes()
+        offsets = self._string_offsets.tolist()
+        strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+        def attr_dicts(ptr, keys, values, kinds):
+            ptr, keys, values, kinds = ptr.tolist(), keys.tolist(), values.tolist(), kinds.tolist()
+            return [
+                {
+                    strings[keys[j]]: strings[values[j]] if kinds[j] == KIND_STR else decode_value(strings[values[j]], kinds[j])
+                    for j in range(ptr[i], ptr[i + 1])
+                }
+                for i in range(len(ptr) - 1)
+            ]
+
+        G = nx.DiGraph() if self.meta.get("directed") else nx.Graph()
+        names = [strings[s] for s in self._node_name.tolist()]
+        node_attrs = attr_dicts(self._node_attr_ptr, self._node_attr_key, self._node_attr_val, self._node_attr_kind)
+        G.add_nodes_from(zip(names, node_attrs))
+        edge_attrs = attr_dicts(self._edge_attr_ptr, self._edge_attr_key, self._edge_attr_val, self._edge_attr_kind)
+        G.add_edges_from(
+            (names[u], names[v], data)
+            for u, v, data in zip(self._edge_src.tolist(), self._edge_dst.tolist(), edge_attrs)
+        )
+        return G
+
+
+def snapshot_path_for(graph_file):
+    """GEXF 文件对应的快照目录"""
+    return os.path.splitext(graph_file)[0] + ".snapshot"
+
+
+def file_version(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def save_graph(G, graph_file):
+    """写 GEXF（供 Gephi 使用）并同时写快照"""
+    nx.write_gexf(G, graph_file)
+    write_snapshot(G, snapshot_path_for(graph_file), source_version=file_version(graph_file), gexf_labels=True)
+
+
+# ---------- 基准测试 ----------
+
+def synthetic_graph(patients, seed=0):
+    """按 build_graph_from_mongodb 的结构生成合成图：每个患者约 40 个节点"""
+    rng = np.random.default_rng(seed)
+    indicators = [f"指标{i}" for i in range(30)]
+    G = nx.Graph()
+    for p in range(patients):
+        patient = f"患者{p:06d}"
+        G.add_node(patient, node_type="patient")
+        for field, value in (("性别", "男" if p % 2 else "女"), ("年龄", str(40 + p % 50)), ("民族", "汉族")):
+            node = f"{field}_{value}_{patient}"
+            G.add_node(node, node_type="basic_info", field_name=field, field_value=value)
+            G.add_edge(patient, node, edge_type="has_basic_info")
+        for kind, edge_type in (("主诉", "has_complaint"), ("现病史", "has_present_illness")):
+            node = f"{kind}_{patient}"
+            G.add_node(node, node_type="chief_complaint" if kind == "主诉" else "present_illness",
+                       content=f"{kind}内容{rng.integers(1000)}")
+            G.add_edge(patient, node, edge_type=edge_type)
+        for indicator in rng.choice(indicators, size=30, replace=False):
+            value = f"{rng.uniform(0, 500):.1f}"
+            node = f"生化指标_{indicator}_{value}_{patient}"
+            G.add_node(node, node_type="lab_result", indicator_name=str(indicator), indicator_value=value)
+            G.add_edge(patient, node, edge_type="has_lab_result")
+    return G
+
+
+def _measure(kind, path):
+    """在独立进程中调用：加载一次并输出耗时和常驻内存增量"""
+    from model_registry import _current_rss_bytes
+
+    rss_before = _current_rss_bytes()
+    start = time.perf_counter()
+    if kind == "gexf":
+        G = nx.read_gexf(path)
+        nodes = G.number_of_nodes()
+    elif kind == "snapshot":
+        snapshot = GraphSnapshot(path)
+        nodes = snapshot.meta["nodes"]
+        snapshot.neighbors(snapshot.string(snapshot._node_name[0]))
+    else:
+        G = GraphSnapshot(path).to_networkx()
+        nodes = G.number_of_nodes()
+    seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "rss_delta_bytes": _current_rss_bytes() - rss_before, "nodes": nodes}))
+
+
+def _disk_bytes(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def benchmark(gexf_path, snapshot_path):
+    """分别在子进程中加载 GEXF、快照（内存映射）和快照转 nx.Graph，返回耗时、内存和文件大小"""
+    report = []
+    for kind, path in (("gexf", gexf_path), ("snapshot", snapshot_path), ("snapshot->networkx", snapshot_path)):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--measure", kind, path],
+            capture_output=True, text=True, check=True
+        ).stdout
+        row = json.loads(output.strip().splitlines()[-1])
+        row.update({"format": kind, "disk_bytes": _disk_bytes(path)})
+        report.append(row)
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--measure":
+        _measure(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    patients = int(sys.argv[sys.argv.index("--patients") + 1]) if "--patients" in sys.argv else 2000
+    workdir = tempfile.mkdtemp()
+    try:
+        cases = []
+        from config import get_graph_database_config
+        graph_file = get_graph_database_config()["graph_file"]
+        if os.path.exists(graph_file):
+            snapshot = os.path.join(workdir, "current.snapshot")
+            write_snapshot(nx.read_gexf(graph_file), snapshot)
+            cases.append((f"当前图 {graph_file}", graph_file, snapshot))
+
+        G = synthetic_graph(patients)
+        gexf = os.path.join(workdir, "synthetic.gexf")
+        nx.write_gexf(G, gexf)
+        snapshot = os.path.join(workdir, "synthetic.snapshot")
+        write_snapshot(G, snapshot)
+        cases.append((f"合成图 {patients} 个患者", gexf, snapshot))
+
+        for title, gexf_path, snapshot_path in cases:
+            print(f"\n{title}")
+            print(f"{'格式':<22}{'节点':>10}{'加载(ms)':>12}{'内存增量(MB)':>16}{'磁盘(MB)':>12}")
+            for row in benchmark(gexf_path, snapshot_path):
+                print(f"{row['format']:<22}{row['nodes']:>10}{row['seconds'] * 1000:>12.1f}"
+                      f"{row['rss_delta_bytes'] / 1024 / 1024:>16.1f}{row['disk_bytes'] / 1024 / 1024:>12.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+图数据内存存储
+GEXF 文件只在首次访问或文件被改写（修改时间/大小变化）后解析一次，
+并建立按节点类型、节点 ID、(起点, 关系类型) 的哈希索引，查询时直接查字典
+"""
+
+import os
+import threading
+import time
+
+import networkx as nx
+
+from config import get_graph_database_config
+from graph_snapshot import GraphSnapshot, snapshot_path_for
+
+
+def node_type_of(data):
+    """节点类型：新版图用 node_type，早期的图用 type"""
+    return data.get("node_type", data.get("type"))
+
+
+def edge_type_of(data):
+    """关系类型：新版图用 edge_type，早期的图用 relationship / type"""
+    return data.get("edge_type", data.get("relationship", data.get("type")))
+
+
+class GraphStore:
+    """
+    单个图文件的缓存与索引
+    返回的 nx.Graph 和属性字典是共享的，调用方只读不改
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._version = None
+        self._graph = None
+        self._nodes_by_type = {}
+        self._adjacency = {}  # (起点, 关系类型) -> [(邻居, 边属性)]
+        self._schema = None
+        self.source = None  # 最近一次从 "snapshot" 还是 "gexf" 加载
+        self.loads = 0
+        self.hits = 0
+        self.load_seconds = 0.0
+
+    @classmethod
+    def from_graph(cls, graph):
+        """直接包装内存中的图（不对应文件），用于基准测试和测试"""
+        store = cls(None)
+        store._build_indexes(graph)
+        store._graph = graph
+        store._version = store._file_version()
+        store.source = "memory"
+        return store
+
+    def _file_version(self):
+        if self.path is None:
+            return "memory"
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def exists(self):
+        return self._graph is not None if self.path is None else os.path.exists(self.path)
+
+    def _ensure_loaded(self):
+        """文件变化时重新解析并重建索引；文件不存在时返回 False"""
+        version = self._file_version()
+        with self._lock:
+            if version is None:
+                self._version = None
+                self._graph = None
+                return False
+            if version == self._version and self._graph is not None:
+                self.hits += 1
+                return True
+
+            start = time.perf_counter()
+            graph = self._load_snapshot(version)
+            if graph is None:
+                graph = nx.read_gexf(self.path)
+                self.source = "gexf"
+            self._build_indexes(graph)
+            self._graph = graph
+            self._version = version
+            self.loads += 1
+            self.load_seconds = time.perf_counter() - start
+            return True
+
+    def _load_snapshot(self, version):
+        """GEXF 旁边有对应版本的二进制快照时直接从快照还原，跳过 XML 解析"""
+        snapshot_path = snapshot_path_for(self.path)
+        if not os.path.isdir(snapshot_path):
+            return None
+        try:
+            snapshot = GraphSnapshot(snapshot_path)
+            if snapshot.source_version != version:
+                return None
+            graph = snapshot.to_networkx()
+        except Exception:
+            return None
+        self.source = "snapshot"
+        return graph
+
+    def _build_indexes(self, graph):
+        nodes_by_type = {}
+        for node, data in graph.nodes(data=True):
+            nodes_by_type.setdefault(node_type_of(data), []).append(node)
+
+        adjacency = {}
+        directed = graph.is_directed()
+        for u, v, data in graph.edges(data=True):
+            edge_type = edge_type_of(data)
+            adjacency.setdefault((u, edge_type), []).append((v, data))
+            if not directed:
+                adjacency.setdefault((v, edge_type), []).append((u, data))
+
+        self._nodes_by_type = nodes_by_type
+        self._adjacency = adjacency
+        self._schema = None
+
+    def invalidate(self):
+        """写入图文件后可主动调用，下一次访问时重新加载"""
+        with self._lock:
+            self._version = None
+            self._graph = None
+
+    # ---------- 查询 ----------
+
+    def _state(self):
+        """
+        在锁内取出同一版本的 (图, 按类型的节点表, 邻接索引)，文件不存在时返回 None
+        一次查询只用这一份引用，期间图被重新加载也不会混用新旧两个版本
+        """
+        with self._lock:
+            if not self._ensure_loaded():
+                return None
+            return self._graph, self._nodes_by_type, self._adjacency
+
+    @property
+    def graph(self):
+        """完整的 nx.Graph；文件不存在时为 None"""
+        state = self._state()
+        return state[0] if state is not None else None
+
+    def node(self, node_id):
+        """节点属性，不存在时返回 None"""
+        state = self._state()
+        if state is None:
+            return None
+        graph = state[0]
+        return graph.nodes[node_id] if node_id in graph else None
+
+    def nodes_by_type(self, node_type):
+        state = self._state()
+        return state[1].get(node_type, []) if state is not None else []
+
+    def neighbors(self, source, edge_type):
+        """按 (起点, 关系类型) 取邻居，返回 [(邻居, 边属性)]"""
+        state = self._state()
+        return state[2].get((source, edge_type), []) if state is not None else []
+
+    def match(self, start_type, start_name, edge_type, end_type):
+        """
+        患者 -> 关系 -> 节点类型 的单跳查询
+        返回 [(邻居, 邻居属性, 边属性)]，全部通过索引完成，不扫描全图
+        """
+        state = self._state()
+        if state is None:
+            return []
+        graph, _, adjacency = state
+        if start_name not in graph or node_type_of(graph.nodes[start_name]) != start_type:
+            return []
+        matches = []
+        for neighbor, edge_data in adjacency.get((start_name, edge_type), []):
+            neighbor_data = graph.nodes[neighbor]
+            if node_type_of(neighbor_data) == end_type:
+                matches.append((neighbor, neighbor_data, edge_data))
+        return matches
+
+    def schema(self, sample_size=5):
+        """节点类型、关系类型和少量示例，供生成查询条件的提示词使用"""
+        if not self._ensure_loaded():
+            return None
+        with self._lock:
+            if self._schema is None:
+                graph = self._graph
+                self._schema = {
+                    "node_types": [t for t in self._nodes_by_type if t is not None],
+                    "relationships": sorted({t for _, t in self._adjacency if t is not None}),
+                    "nodes_sample": {
+                        node: data for node, data in list(graph.nodes(data=True))[:sample_size]
+                    },
+                    "edges_sample": {
+                        f"{u}->{v}": data for u, v, data in list(graph.edges(data=True))[:sample_size]
+                    }
+                }
+            return self._schema
+
+    def get_stats(self):
+        graph = self._graph
+        return {
+            "loaded": graph is not None,
+            "nodes": graph.number_of_nodes() if graph is not None else 0,
+            "edges": graph.number_of_edges() if graph is not None else 0,
+            "node_types": len(self._nodes_by_type),
+            "source": self.source,
+            "loads": self.loads,
+            "hits": self.hits,
+            "load_seconds": self.load_seconds
+        }
+
+
+_graph_stores = {}
+_graph_stores_lock = threading.Lock()
+
+
+def get_graph_store(path=None):
+    """按文件路径复用同一个 GraphStore（默认使用配置中的图文件）"""
+    path = os.path.abspath(path or get_graph_database_config()["graph_file"])
+    with _graph_stores_lock:
+        store = _graph_stores.get(path)
+        if store is None:
+            store = GraphStore(path)
+            _graph_stores[path] = store
+        return store
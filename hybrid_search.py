@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+稠密向量与 BM25 的混合检索
+用倒数排名融合（RRF）合并两路结果，不依赖两路分数的量纲
+用法：python hybrid_search.py  —— 在已导入的文档块上对比 dense / bm25 / hybrid 的 recall@k 和延迟
+"""
+
+import time
+
+import numpy as np
+
+RETRIEVAL_MODES = ("dense", "bm25", "hybrid")
+
+# 各检索模式返回的分数含义不同，展示时用对应的名称（只有 dense 的余弦分数是相似度）
+SCORE_LABELS = {"dense": "相似度", "bm25": "BM25分数", "hybrid": "RRF融合分"}
+
+
+def filter_by_score(results, min_score):
+    """只保留分数不低于 min_score 的结果；min_score 为 None 时原样返回"""
+    if min_score is None:
+        return results
+    return {"matches": [match for match in results.get("matches", []) if match["score"] >= min_score]}
+
+
+def reciprocal_rank_fusion(result_lists, k=60, top_k=10):
+    """
+    RRF：score(d) = Σ 1 / (k + rank_i(d))
+    分数只反映排名，不是相似度，不能与余弦相似度阈值比较；需要阈值时在融合前对各路结果分别过滤
+    """
+    fused = {}
+    metadata = {}
+    for results in result_lists:
+        for rank, match in enumerate(results.get("matches", []), start=1):
+            fused[match["id"]] = fused.get(match["id"], 0.0) + 1.0 / (k + rank)
+            if match.get("metadata") is not None:
+                metadata.setdefault(match["id"], match["metadata"])
+
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return {"matches": [
+        {"id": doc_id, "score": score, "metadata": metadata.get(doc_id, {})}
+        for doc_id, score in ranked
+    ]}
+
+
+def hybrid_query(dense_search, lexical_search, query, top_k=10, filter=None, mode="hybrid",
+                 rrf_k=60, candidate_factor=4, min_score=None):
+    """
+    按检索模式查询；dense_search / lexical_search 签名为 (query, top_k, filter) -> {'matches': [...]}
+    min_score 是稠密向量的余弦相似度阈值，混合模式下在融合前作用于向量一路；
+    BM25 一路只保留至少命中一个查询词的文档，不受该阈值影响
+    混合模式下每一路取 top_k * candidate_factor 个候选再融合
+    """
+    if mode == "dense":
+        return filter_by_score(dense_search(query, top_k, filter), min_score)
+    if mode == "bm25":
+        return lexical_search(query, top_k, filter)
+    if mode != "hybrid":
+        raise ValueError(f"不支持的检索模式: {mode}，可选值: {RETRIEVAL_MODES}")
+
+    candidates = top_k * candidate_factor
+    return reciprocal_rank_fusion(
+        [filter_by_score(dense_search(query, candidates, filter), min_score),
+         lexical_search(query, candidates, filter)],
+        k=rrf_k,
+        top_k=top_k
+    )
+
+
+def evaluate_modes(searchers, labeled_queries, top_k=10):
+    """
+    searchers 为 {模式名: search(query, top_k) -> {'matches': [...]}}
+    labeled_queries 为 [(查询, 相关文档ID集合)]，返回每种模式的 recall@k 和平均延迟（毫秒）
+    """
+    report = []
+    for mode, search in searchers.items():
+        hits = 0
+        relevant_total = 0
+        latencies = []
+        for query, relevant in labeled_queries:
+            start = time.perf_counter()
+            results = search(query, top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += len(relevant.intersection(match["id"] for match in results["matches"]))
+            relevant_total += len(relevant)
+        report.append({
+            "mode": mode,
+            "recall": hits / relevant_total if relevant_total else 0.0,
+            "latency_ms": float(np.mean(latencies)) if latencies else 0.0,
+            "p95_ms": float(np.percentile(latencies, 95)) if latencies else 0.0
+        })
+    return report
+
+
+def sample_term_queries(ids, texts, count=100, terms_per_query=3, seed=0):
+    """
+    从文档块中抽取评测查询：每个查询由某一块中的几个低频词组成，该块即为相关文档
+    模拟按药名、检验指标等精确术语提问的场景
+    """
+    from embedding_engine import lexical_terms
+
+    rng = np.random.default_rng(seed)
+    term_docs = {}
+    doc_terms = []
+    for text in texts:
+        terms = set(lexical_terms(text))
+        doc_terms.append(terms)
+        for term in terms:
+            term_docs[term] = term_docs.get(term, 0) + 1
+
+    queries = []
+    for i in rng.permutation(len(ids))[:count]:
+        rare = sorted(doc_terms[i], key=lambda term: (term_docs[term], term))[:terms_per_query]
+        if rare:
+            queries.append((" ".join(rare), {ids[i]}))
+    return queries
+
+
+if __name__ == "__main__":
+    from bm25_index import get_bm25_index
+    from config import get_pinecone_config, get_system_config
+    from embedding_engine import encode_texts
+    from local_vector_store import get_local_index
+
+    bm25 = get_bm25_index()
+    print(f"BM25 索引: {bm25.get_stats()}")
+    if not bm25._ids:
+        raise SystemExit("词法索引为空，请先导入病历")
+
+    texts = [metadata["text"] for metadata in bm25._metadata]
+    labeled = sample_term_queries(bm25._ids, texts)
+    system_config = get_system_config()
+
+    def lexical_search(query, top_k, filter=None):
+        return bm25.query(query, top_k=top_k, filter=filter)
+
+    searchers = {"bm25": lambda query, top_k: lexical_search(query, top_k)}
+
+    config = get_pinecone_config()
+    if config.get("backend") == "local":
+        index = get_local_index(config["local_index_path"], config["dimension"], config["metric"], config.get("ann"))
+    else:
+        from pinecone_connection import pinecone_manager
+        index, _ = pinecone_manager.get_index()
+
+    def dense_search(query, top_k, filter=None):
+        vector = encode_texts([query], dtype="float32")[0]
+        return index.query(vector=vector.tolist(), top_k=top_k, include_metadata=True, filter=filter)
+
+    try:
+        dense_search("预热", 1)
+        searchers["dense"] = lambda query, top_k: dense_search(query, top_k)
+        searchers["hybrid"] = lambda query, top_k: hybrid_query(
+            dense_search, lexical_search, query, top_k, rrf_k=system_config.get("rrf_k", 60)
+        )
+    except Exception as e:
+        print(f"向量模型或向量库不可用，只评测 BM25: {e}")
+
+    print(f"评测查询: {len(labeled)} 条")
+    print(f"{'模式':<8}{'recall@10':>12}{'平均延迟(ms)':>16}{'p95(ms)':>10}")
+    for row in evaluate_modes(searchers, labeled, top_k=10):
+        print(f"{row['mode']:<8}{row['recall']:>12.3f}{row['latency_ms']:>16.2f}{row['p95_ms']:>10.2f}")
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+OpenAI 客户端池
+按 (base_url, api_key) 复用 OpenAI / AsyncOpenAI 客户端，同一个端点的所有调用共用一个 httpx 连接池，
+keep-alive 连接跨请求、跨会话复用，避免每次调用都重新建立 TCP + TLS 连接。
+异步客户端的连接绑定在事件循环上，因此按事件循环分别缓存。
+直接运行本文件可以对比每次新建客户端与复用客户端的单次调用耗时：
+    python llm_client_pool.py [--repeat 20] [--remote]
+默认请求本地模拟服务（只体现客户端构造和 TCP 建连开销）；--remote 对配置中的主端点发送 GET /models（包含 TLS 握手）
+"""
+
+import sys
+import threading
+import time
+import weakref
+
+from config import get_llm_client_pool_config
+
+
+def _http_limits(config):
+    import httpx
+    limits = httpx.Limits(
+        max_connections=config.get("max_connections", 20),
+        max_keepalive_connections=config.get("max_keepalive_connections", 10),
+        keepalive_expiry=config.get("keepalive_expiry", 120)
+    )
+    return limits
+
+
+def _http_timeout(config, timeout):
+    import httpx
+    return httpx.Timeout(timeout, connect=config.get("connect_timeout", 10))
+
+
+def create_sync_client(base_url, api_key, timeout, config):
+    """新建一个带独立连接池的同步客户端"""
+    import httpx
+    from openai import OpenAI
+    http_client = httpx.Client(limits=_http_limits(config), timeout=_http_timeout(config, timeout))
+    return OpenAI(api_key=api_key, base_url=base_url, timeout=timeout,
+                  max_retries=config.get("max_retries", 2), http_client=http_client)
+
+
+def create_async_client(base_url, api_key, timeout, config):
+    """新建一个带独立连接池的异步客户端"""
+    import httpx
+    from openai import AsyncOpenAI
+    http_client = httpx.AsyncClient(limits=_http_limits(config), timeout=_http_timeout(config, timeout))
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=timeout,
+                       max_retries=config.get("max_retries", 2), http_client=http_client)
+
+
+class OpenAIClientPool:
+    """线程安全的客户端池；client_factory / async_client_factory 可替换（测试时不依赖 openai 包）"""
+    def __init__(self, config=None, client_factory=create_sync_client, async_client_factory=create_async_client):
+        self.config = dict(config or {})
+        self.client_factory = client_factory
+        self.async_client_factory = async_client_factory
+        self.lock = threading.Lock()
+        self.clients = {}
+        self.async_clients = weakref.WeakKeyDictionary()  # 事件循环 -> {key: AsyncOpenAI}
+        self.created = 0
+        self.hits = 0
+
+    @staticmethod
+    def _key(base_url, api_key):
+        return str(base_url).rstrip("/"), api_key
+
+    def get(self, base_url, api_key, timeout=None):
+        """返回该端点/密钥共用的同步客户端，首次调用时创建"""
+        key = self._key(base_url, api_key)
+        with self.lock:
+            client = self.clients.get(key)
+            if client is None:
+                client = self.client_factory(base_url, api_key, timeout or self.config.get("timeout", 60), self.config)
+                self.clients[key] = client
+                self.created += 1
+            else:
+                self.hits += 1
+            return client
+
+    def get_async(self, base_url, api_key, timeout=None):
+        """返回当前事件循环中该端点/密钥共用的异步客户端（须在协程内调用）"""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        key = self._key(base_url, api_key)
+        with self.lock:
+            clients = self.async_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                client = self.async_client_factory(base_url, api_key, timeout or self.config.get("timeout", 60),
+                                                   self.config)
+                clients[key] = client
+                self.created += 1
+            else:
+                self.hits += 1
+            return client
+
+    def close(self):
+        """关闭所有同步客户端的连接池（异步客户端随事件循环一起释放）"""
+        with self.lock:
+            clients = list(self.clients.values())
+            self.clients.clear()
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "clients": len(self.clients),
+                "async_loops": len(self.async_clients),
+                "created": self.created,
+                "hits": self.hits
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_client_pool():
+    """获取进程内共享的客户端池，进程退出时关闭连接"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                import atexit
+                _pool = OpenAIClientPool(get_llm_client_pool_config())
+                atexit.register(_pool.close)
+    return _pool
+
+
+def _serve_stub():
+    """本地模拟的 OpenAI 兼容服务（HTTP/1.1 keep-alive），返回 (base_url, server)"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # 响应头和响应体分两次写出；不关闭 Nagle 时，keep-alive 连接上会叠加客户端的延迟确认，每次请求多等约 40ms
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            body = b'{"object": "list", "data": []}'
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1", server
+
+
+def benchmark(repeat=20, remote=False):
+    """对比每次新建客户端与复用池中客户端的单次 GET /models 耗时（毫秒），返回 {模式: (p50, p95)}"""
+    from config import OPENAI_CONFIG
+    config = get_llm_client_pool_config()
+    server = None
+    if remote:
+        base_url, api_key = OPENAI_CONFIG["base_url"], OPENAI_CONFIG["api_key"]
+    else:
+        (base_url, server), api_key = _serve_stub(), "sk-local"
+
+    def measure(get_client, close):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            client = get_client()
+            client.models.list()
+            samples.append((time.perf_counter() - start) * 1000)
+            if close:
+                client.close()
+        samples.sort()
+        return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    pool = OpenAIClientPool(config)
+    pool.get(base_url, api_key).models.list()  # 预先建立连接
+    try:
+        return {
+            "new_client": measure(lambda: create_sync_client(base_url, api_key, 60, config), close=True),
+            "pooled": measure(lambda: pool.get(base_url, api_key), close=False)
+        }
+    finally:
+        pool.close()
+        if server is not None:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[sys.argv.index("--repeat") + 1]) if "--repeat" in sys.argv else 20
+    print(f"{'模式':>12}{'p50(ms)':>10}{'p95(ms)':>10}")
+    for mode, (p50, p95) in benchmark(repeat, remote="--remote" in sys.argv).items():
+        print(f"{mode:>12}{p50:>10.2f}{p95:>10.2f}")
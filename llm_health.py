@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 端点健康检查与熔断
+后台线程定期探测主/备用端点（GET /models，不消耗对话请求配额），在内存中缓存每个端点的状态；
+真实请求的成功和失败也回写到同一个熔断器。连续失败达到阈值后熔断（open），冷却时间过后放行一次
+试探请求（half_open），成功即恢复。查询路径只读取缓存的状态来选择端点，不再在每次查询前发送测试请求
+"""
+
+import threading
+import time
+
+from config import BACKUP_OPENAI_CONFIG, OPENAI_CONFIG, get_llm_health_config
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 没有 HTTP 状态码、但属于端点故障的异常（openai SDK 的连接错误和超时）
+CONNECTION_ERROR_NAMES = ("APIConnectionError", "APITimeoutError")
+
+
+def is_endpoint_failure(error):
+    """连接错误、超时、鉴权失败、限流和 5xx 视为端点故障；请求本身有误（400、404 等）不计入熔断"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        return type(error).__name__ in CONNECTION_ERROR_NAMES or isinstance(error, (OSError, TimeoutError))
+    return status in (401, 403, 408, 429) or status >= 500
+
+
+def probe_endpoint(config, timeout=10):
+    """探测一个端点：列出模型列表，只验证连通性和密钥，不产生对话补全"""
+    if not config.get("api_key"):
+        raise ValueError("未配置API密钥")
+    from llm_client_pool import get_client_pool
+    # 复用池中的客户端：探测的同时保持 keep-alive 连接处于活跃状态
+    client = get_client_pool().get(config["base_url"], config["api_key"], timeout=config.get("timeout"))
+    client.with_options(timeout=timeout, max_retries=0).models.list()
+
+
+class CircuitBreaker:
+    """单个端点的熔断状态（线程安全）"""
+    def __init__(self, failure_threshold=3, recovery_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_started = None
+        self.last_error = None
+        self.last_latency = None
+        self.last_checked = None
+
+    def available(self):
+        """只查看状态、不占用试探名额：未熔断，或熔断冷却时间已过"""
+        with self.lock:
+            if self.state == OPEN:
+                return self.clock() - self.opened_at >= self.recovery_timeout
+            return True
+
+    def allow_request(self):
+        """是否放行一次请求；半开状态同一时间只放行一个试探请求"""
+        with self.lock:
+            now = self.clock()
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if now - self.opened_at < self.recovery_timeout:
+                    return False
+                self.state = HALF_OPEN
+                self.trial_started = None
+            # 试探请求迟迟没有回报结果（调用方未发出请求）时，冷却时间过后再放行一个
+            if self.trial_started is None or now - self.trial_started >= self.recovery_timeout:
+                self.trial_started = now
+                return True
+            return False
+
+    def record_success(self, latency=None):
+        with self.lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.trial_started = None
+            self.last_error = None
+            self.last_latency = latency
+            self.last_checked = time.time()
+
+    def record_failure(self, error):
+        with self.lock:
+            self.failures += 1
+            self.last_error = str(error)
+            self.last_checked = time.time()
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = self.clock()
+                self.trial_started = None
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "last_error": self.last_error,
+                "last_latency": self.last_latency,
+                "last_checked": self.last_checked
+            }
+
+
+class LLMHealthMonitor:
+    """按优先级排列的一组端点（{名称: 配置}），每个端点一个熔断器，可选后台探测线程"""
+    def __init__(self, endpoints, probe=None, probe_interval=60, probe_timeout=10,
+                 failure_threshold=3, recovery_timeout=30, clock=time.monotonic):
+        self.endpoints = dict(endpoints)
+        self.probe = probe or probe_endpoint
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.breakers = {
+            name: CircuitBreaker(failure_threshold, recovery_timeout, clock)
+            for name in self.endpoints
+        }
+        self.probe_rounds = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动后台探测线程（守护线程，进程退出时自动结束）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="llm-health-probe", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.probe_timeout + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe_all()
+            self._stop.wait(self.probe_interval)
+
+    def probe_all(self):
+        """探测所有端点并更新熔断器，返回 {名称: 是否可用}"""
+        results = {}
+        for name, config in self.endpoints.items():
+            start = time.perf_counter()
+            try:
+                self.probe(config, timeout=self.probe_timeout)
+            except Exception as e:
+                self.record_failure(name, e)
+                results[name] = False
+            else:
+                self.record_success(name, time.perf_counter() - start)
+                results[name] = True
+        self.probe_rounds += 1
+        return results
+
+    def record_success(self, name, latency=None):
+        if name in self.breakers:
+            self.breakers[name].record_success(latency)
+
+    def record_failure(self, name, error):
+        if name in self.breakers:
+            self.breakers[name].record_failure(error)
+
+    def any_available(self):
+        return any(breaker.available() for breaker in self.breakers.values())
+
+    def select_endpoint(self):
+        """按优先级返回第一个放行请求的端点；全部熔断时仍返回首选端点，由真实请求决定成败"""
+        for name, breaker in self.breakers.items():
+            if breaker.allow_request():
+                return name
+        return next(iter(self.endpoints))
+
+    def fallback_for(self, name):
+        """请求在 name 上失败后可以切换的下一个端点，没有则返回 None"""
+        names = list(self.endpoints)
+        for candidate in names[names.index(name) + 1:] if name in names else names:
+            if self.breakers[candidate].allow_request():
+                return candidate
+        return None
+
+    def endpoint_of(self, client):
+        """根据客户端的 base_url 和 api_key 找到对应的端点名称"""
+        base_url = str(getattr(client, "base_url", "")).rstrip("/")
+        api_key = getattr(client, "api_key", None)
+        for name, config in self.endpoints.items():
+            if config["base_url"].rstrip("/") == base_url and config["api_key"] == api_key:
+                return name
+        return None
+
+    def get_stats(self):
+        return {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_llm_health_monitor():
+    """获取全局健康检查器（首次调用时启动后台探测），未启用时返回 None"""
+    global _monitor
+    config = get_llm_health_config()
+    if not config.get("enabled", False):
+        return None
+    if _monitor is None:
+        with _monitor_lock:
+            if _monitor is None:
+                endpoints = {"primary": OPENAI_CONFIG}
+                if BACKUP_OPENAI_CONFIG.get("api_key"):
+                    endpoints["backup"] = BACKUP_OPENAI_CONFIG
+                monitor = LLMHealthMonitor(
+                    endpoints,
+                    probe_interval=config.get("probe_interval", 60),
+                    probe_timeout=config.get("probe_timeout", 10),
+                    failure_threshold=config.get("failure_threshold", 3),
+                    recovery_timeout=config.get("recovery_timeout", 30)
+                )
+                if config.get("background_probe", True):
+                    monitor.start()
+                _monitor = monitor
+    return _monitor
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+流式生成回答
+每到达一个片段就把已生成的完整文本交给回调（页面占位符实时刷新），并记录首字延迟（TTFT）和总耗时；
+输出中途断开时带着已生成的内容重试，请模型从断点继续，已经显示的文字不会被清空或重复生成
+"""
+
+import time
+
+CONTINUE_PROMPT = "上面的回答因连接中断被截断了。请从截断处直接继续输出剩余内容，不要重复已输出的部分，也不要添加任何说明。"
+
+
+class AnswerStreamError(Exception):
+    """重试用尽仍未生成完整回答；partial_answer 为已生成的部分，原始异常在 __cause__ 中"""
+    def __init__(self, message, partial_answer="", attempts=0):
+        super().__init__(message)
+        self.partial_answer = partial_answer
+        self.attempts = attempts
+
+
+def continuation_messages(messages, partial_answer):
+    """续写用的消息：原始对话 + 已生成的部分（assistant）+ 继续输出的指令"""
+    if not partial_answer:
+        return list(messages)
+    return list(messages) + [
+        {"role": "assistant", "content": partial_answer},
+        {"role": "user", "content": CONTINUE_PROMPT}
+    ]
+
+
+def stream_answer(request_stream, messages, on_text=None, on_retry=None, max_retries=3, retry_delay=2,
+                  clock=time.perf_counter, sleep=time.sleep):
+    """
+    request_stream(messages) 返回文本片段的可迭代对象；on_text(已生成的完整文本) 在每个片段后调用，
+    on_retry(第几次失败, 异常) 在重试前调用。返回 (完整回答, 统计)
+    """
+    answer = ""
+    start = clock()
+    first_token_at = None
+    chunks = 0
+    attempts = 0
+    resumed = 0
+    while True:
+        attempts += 1
+        if answer:
+            resumed += 1
+        try:
+            for delta in request_stream(continuation_messages(messages, answer)):
+                if not delta:
+                    continue
+                if first_token_at is None:
+                    first_token_at = clock()
+                answer += delta
+                chunks += 1
+                if on_text is not None:
+                    on_text(answer)
+            break
+        except Exception as e:
+            if attempts >= max_retries:
+                raise AnswerStreamError(f"{type(e).__name__}: {e}", answer, attempts) from e
+            if on_retry is not None:
+                on_retry(attempts, e)
+            sleep(retry_delay)
+    return answer, {
+        "ttft_seconds": first_token_at - start if first_token_at is not None else None,
+        "total_seconds": clock() - start,
+        "chunks": chunks,
+        "attempts": attempts,
+        "resumed": resumed
+    }
@@ -0,0 +1,460 @@
+# -*- coding: utf-8 -*-
+"""
+本地向量索引后端
+向量保存在连续的 float32 矩阵中，元数据按列存储，持久化为可内存映射的 .npy 文件
+接口与 Pinecone Index 保持一致（upsert / query / delete / describe_index_stats）
+单次写入只把变更追加到更新日志，日志累积到一定规模后再合并回主文件，写入开销与批次大小成正比
+"""
+
+import base64
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+
+import numpy as np
+
+from ann_index import IVFIndex, _top_k_order
+
+
+class VectorIndexBackend(ABC):
+    """向量索引后端接口，方法签名与 Pinecone Index 保持一致"""
+    @abstractmethod
+    def upsert(self, vectors):
+        """插入或更新向量"""
+
+    @abstractmethod
+    def query(self, vector, top_k=10, include_metadata=False, filter=None):
+        """检索最相似的 top_k 个向量"""
+
+    @abstractmethod
+    def delete(self, ids=None, delete_all=False):
+        """删除指定向量或全部向量"""
+
+    @abstractmethod
+    def list(self, prefix=None, limit=100):
+        """按 ID 前缀分页列出向量 ID，每页是一个 ID 列表"""
+
+    @abstractmethod
+    def describe_index_stats(self):
+        """索引统计信息"""
+
+
+class LocalVectorIndex(VectorIndexBackend):
+    """
+    进程内向量索引，暴力检索使用矩阵乘法 + argpartition 取 top-k
+    启用 ann_config 且数据量达到 min_train_size 后，查询改走 IVF 近似检索
+    INDEXED_COLUMNS 中的元数据列维护倒排表，带 filter 的查询只对候选行打分
+    """
+    VECTORS_FILE = "vectors.npy"
+    META_FILE = "metadata.json"
+    LOG_FILE = "updates.log"
+    INDEXED_COLUMNS = ("original_file_name", "patient_name", "record_date")
+
+    def __init__(self, path, dimension, metric="cosine", ann_config=None, compact_min_rows=10000):
+        if metric not in ("cosine", "dotproduct"):
+            raise ValueError(f"本地向量索引不支持的度量方式: {metric}")
+        self.path = path
+        self.dimension = dimension
+        self.metric = metric
+        self._lock = threading.RLock()
+
+        self._matrix = np.empty((0, dimension), dtype=np.float32)
+        self._count = 0
+        self._ids = []
+        self._id_to_row = {}
+        self._columns = {}
+        self._postings = {column: {} for column in self.INDEXED_COLUMNS}
+        # 更新日志中的记录数超过 max(compact_min_rows, 向量数 / 2) 时合并回主文件
+        self.compact_min_rows = compact_min_rows
+        self._log_rows = 0
+
+        ann_config = ann_config or {}
+        self._ann = None
+        self._ann_min_train_size = ann_config.get("min_train_size", 10000)
+        if ann_config.get("enabled", False):
+            self._ann = IVFIndex(
+                dimension,
+                nlist=ann_config.get("nlist", 256),
+                nprobe=ann_config.get("nprobe", 16),
+                pq_m=ann_config.get("pq_m", 0),
+                rerank_factor=ann_config.get("rerank_factor", 10)
+            )
+        self._load()
+
+    # ---------- 持久化 ----------
+
+    def _load(self):
+        vectors_path = os.path.join(self.path, self.VECTORS_FILE)
+        meta_path = os.path.join(self.path, self.META_FILE)
+        if os.path.exists(vectors_path) and os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("dimension") != self.dimension:
+                raise ValueError(f"本地索引维度 {meta.get('dimension')} 与配置维度 {self.dimension} 不一致")
+
+            # 只读内存映射加载，首次写入时再复制为可写矩阵
+            self._matrix = np.load(vectors_path, mmap_mode="r")
+            self._ids = meta["ids"]
+            self._count = len(self._ids)
+            self._id_to_row = {vector_id: row for row, vector_id in enumerate(self._ids)}
+            self._columns = meta["columns"]
+            for row in range(self._count):
+                self._index_row(row)
+
+            if self._ann is not None and not self._ann.load(self.path, self._count):
+                self._maybe_train_ann()
+        self._replay_log()
+
+    def _replay_log(self):
+        """重放上次合并之后追加的更新；进程中途退出留下的不完整末行直接忽略"""
+        log_path = os.path.join(self.path, self.LOG_FILE)
+        if not os.path.exists(log_path):
+            return
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if "delete" in record:
+                    self._delete_rows(record["delete"])
+                else:
+                    values = np.frombuffer(base64.b64decode(record["values"]), dtype=np.float32)
+                    self._write_rows([{"id": record["id"], "values": values, "metadata": record["metadata"]}])
+                self._log_rows += 1
+
+    def _append_log(self, records):
+        """把本次变更追加到更新日志，日志过大时合并回主文件（调用方持有锁）"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, self.LOG_FILE), "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._log_rows += len(records)
+        if self._log_rows >= max(self.compact_min_rows, self._count // 2):
+            self.save()
+
+    def _maybe_train_ann(self):
+        """数据量达到阈值后训练 ANN 索引，并把现有所有行加入倒排表"""
+        if self._ann is None or self._ann.is_trained or self._count < self._ann_min_train_size:
+            return
+        data = np.asarray(self._matrix[:self._count], dtype=np.float32)
+        sample_size = min(self._count, self._ann.nlist * 256)
+        sample = data[np.random.default_rng(0).choice(self._count, size=sample_size, replace=False)]
+        self._ann.train(sample)
+        self._ann.set_rows(np.arange(self._count), data)
+
+    def save(self):
+        """原子写入完整的向量矩阵和元数据，并清空更新日志"""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            vectors_path = os.path.join(self.path, self.VECTORS_FILE)
+            meta_path = os.path.join(self.path, self.META_FILE)
+
+            tmp_vectors = vectors_path + ".tmp"
+            out = np.lib.format.open_memmap(
+                tmp_vectors, mode="w+", dtype=np.float32, shape=(self._count, self.dimension)
+            )
+            out[:] = self._matrix[:self._count]
+            out.flush()
+            del out
+
+            tmp_meta = meta_path + ".tmp"
+            with open(tmp_meta, "w", encoding="utf-8") as f:
+                json.dump({
+                    "dimension": self.dimension,
+                    "metric": self.metric,
+                    "ids": self._ids,
+                    "columns": self._columns
+                }, f, ensure_ascii=False)
+
+            # 替换前释放旧的内存映射，避免在部分平台上文件被占用
+            if isinstance(self._matrix, np.memmap):
+                self._matrix = np.array(self._matrix[:self._count], dtype=np.float32)
+            os.replace(tmp_vectors, vectors_path)
+            os.replace(tmp_meta, meta_path)
+            if self._ann is not None:
+                self._ann.save(self.path, self._count)
+            # 主文件已包含日志中的全部变更；即使删除前中断，重放日志也是幂等的
+            log_path = os.path.join(self.path, self.LOG_FILE)
+            if os.path.exists(log_path):
+                os.remove(log_path)
+            self._log_rows = 0
+
+    # ---------- 写入 ----------
+
+    def _ensure_capacity(self, needed):
+        """保证矩阵可写且容量足够，容量按倍数增长"""
+        capacity = self._matrix.shape[0]
+        writable = isinstance(self._matrix, np.ndarray) and not isinstance(self._matrix, np.memmap)
+        if writable and capacity >= needed:
+            return
+        new_capacity = max(needed, capacity * 2, 64)
+        matrix = np.empty((new_capacity, self.dimension), dtype=np.float32)
+        matrix[:self._count] = self._matrix[:self._count]
+        self._matrix = matrix
+
+    def _prepare(self, values):
+        vector = np.asarray(values, dtype=np.float32).reshape(-1)
+        if vector.shape[0] != self.dimension:
+            raise ValueError(f"向量维度 {vector.shape[0]} 与索引维度 {self.dimension} 不一致")
+        if self.metric == "cosine":
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector = vector / norm
+        return vector
+
+    # ---------- 元数据倒排表 ----------
+
+    @staticmethod
+    def _posting_values(value):
+        if value is None:
+            return []
+        return value if isinstance(value, list) else [value]
+
+    def _index_row(self, row):
+        for column, postings in self._postings.items():
+            values = self._columns.get(column)
+            if values is None:
+                continue
+            for value in self._posting_values(values[row]):
+                postings.setdefault(value, set()).add(row)
+
+    def _unindex_row(self, row):
+        for column, postings in self._postings.items():
+            values = self._columns.get(column)
+            if values is None:
+                continue
+            for value in self._posting_values(values[row]):
+                rows = postings.get(value)
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del postings[value]
+
+    def _field_rows(self, field, condition):
+        """单个字段条件匹配的行集合，支持 Pinecone 的 $eq / $in 写法"""
+        if isinstance(condition, dict):
+            if "$eq" in condition:
+                wanted = [condition["$eq"]]
+            elif "$in" in condition:
+                wanted = list(condition["$in"])
+            else:
+                raise ValueError(f"本地向量索引不支持的过滤条件: {condition}")
+        else:
+            wanted = [condition]
+
+        if field in self._postings:
+            rows = set()
+            for value in wanted:
+                rows |= self._postings[field].get(value, set())
+            return rows
+
+        # 未建倒排表的字段退化为逐行比较
+        values = self._columns.get(field, [])
+        wanted = set(wanted)
+        return {
+            row for row, value in enumerate(values[:self._count])
+            if wanted.intersection(self._posting_values(value))
+        }
+
+    def _filter_rows(self, filter):
+        """计算过滤条件匹配的行集合，多个字段之间为 AND 关系"""
+        rows = None
+        for field, condition in filter.items():
+            if field == "$and":
+                for sub_filter in condition:
+                    sub_rows = self._filter_rows(sub_filter)
+                    rows = sub_rows if rows is None else rows & sub_rows
+            else:
+                field_rows = self._field_rows(field, condition)
+                rows = field_rows if rows is None else rows & field_rows
+        return rows if rows is not None else set(range(self._count))
+
+    def _set_metadata(self, row, metadata):
+        for column, values in self._columns.items():
+            values[row] = metadata.get(column)
+        for column, value in metadata.items():
+            if column not in self._columns:
+                self._columns[column] = [None] * self._count
+                self._columns[column][row] = value
+
+    def _write_rows(self, vectors):
+        """写入内存中的矩阵和元数据，返回写入的行号（调用方持有锁）"""
+        self._ensure_capacity(self._count + len(vectors))
+        written_rows = []
+        for item in vectors:
+            vector_id = item["id"]
+            vector = self._prepare(item["values"])
+            metadata = item.get("metadata") or {}
+
+            row = self._id_to_row.get(vector_id)
+            if row is not None:
+                self._unindex_row(row)
+            else:
+                row = self._count
+                self._count += 1
+                self._ids.append(vector_id)
+                self._id_to_row[vector_id] = row
+                for values in self._columns.values():
+                    values.append(None)
+            self._matrix[row] = vector
+            self._set_metadata(row, metadata)
+            self._index_row(row)
+            written_rows.append(row)
+
+        # ANN 增量插入：新行直接分配到最近的聚类，不重建索引
+        if self._ann is not None:
+            if self._ann.is_trained:
+                self._ann.set_rows(written_rows, self._matrix[written_rows])
+            else:
+                self._maybe_train_ann()
+        return written_rows
+
+    def upsert(self, vectors, persist=True):
+        """
+        插入或更新向量，vectors 为 [{'id', 'values', 'metadata'}]
+        persist=True 时把这一批追加到更新日志；persist=False 时只改内存，由调用方最后统一 save()
+        """
+        with self._lock:
+            written_rows = self._write_rows(vectors)
+            if persist:
+                self._append_log([
+                    {
+                        "id": self._ids[row],
+                        "values": base64.b64encode(self._matrix[row].tobytes()).decode("ascii"),
+                        "metadata": self._row_metadata(row)
+                    }
+                    for row in written_rows
+                ])
+            return {"upserted_count": len(vectors)}
+
+    def _delete_rows(self, ids):
+        """删除指定向量；用最后一行填补空位，保持矩阵连续（调用方持有锁）"""
+        self._ensure_capacity(self._count)
+        for vector_id in ids or []:
+            row = self._id_to_row.pop(vector_id, None)
+            if row is None:
+                continue
+            last = self._count - 1
+            self._unindex_row(row)
+            if row != last:
+                self._unindex_row(last)
+                moved_id = self._ids[last]
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved_id
+                self._id_to_row[moved_id] = row
+                if self._ann is not None and self._ann.is_trained:
+                    self._ann.move_row(last, row)
+                for values in self._columns.values():
+                    values[row] = values[last]
+                self._index_row(row)
+            self._ids.pop()
+            for values in self._columns.values():
+                values.pop()
+            self._count -= 1
+
+    def delete(self, ids=None, delete_all=False, persist=True):
+        """删除指定向量或全部向量"""
+        with self._lock:
+            if delete_all:
+                self._matrix = np.empty((0, self.dimension), dtype=np.float32)
+                self._count = 0
+                self._ids = []
+                self._id_to_row = {}
+                self._columns = {}
+                self._postings = {column: {} for column in self.INDEXED_COLUMNS}
+                if self._ann is not None:
+                    self._ann.reset()
+                if persist:
+                    self.save()
+            else:
+                ids = list(ids or [])
+                self._delete_rows(ids)
+                if persist and ids:
+                    self._append_log([{"delete": ids}])
+            return {}
+
+    # ---------- 查询 ----------
+
+    def _row_metadata(self, row):
+        return {
+            column: values[row]
+            for column, values in self._columns.items()
+            if values[row] is not None
+        }
+
+    def query(self, vector, top_k=10, include_metadata=False, filter=None, nprobe=None, exact=False):
+        """
+        检索最相似的 top_k 个向量，返回格式与 Pinecone 一致
+        ANN 已训练时默认走近似检索，nprobe 越大召回越高、延迟越大；exact=True 强制精确检索
+        filter 与 Pinecone 写法一致，例如 {"patient_name": {"$eq": "周某某"}}
+        """
+        with self._lock:
+            if self._count == 0 or top_k <= 0:
+                return {"matches": []}
+            query_vector = self._prepare(vector)
+
+            if filter:
+                # 先用倒排表取出候选行，只对这些行精确打分
+                candidates = np.fromiter(sorted(self._filter_rows(filter)), dtype=np.int64)
+                if candidates.size == 0:
+                    return {"matches": []}
+                candidate_scores = self._matrix[candidates] @ query_vector
+                order = _top_k_order(candidate_scores, top_k)
+                rows, scores = candidates[order], candidate_scores[order]
+            elif self._ann is not None and self._ann.is_trained and not exact:
+                rows, scores = self._ann.search(query_vector, self._matrix, self._count, top_k, nprobe=nprobe)
+            else:
+                # 暴力检索：一次矩阵乘法，argpartition 取 top-k 后只对这部分排序
+                all_scores = self._matrix[:self._count] @ query_vector
+                rows = _top_k_order(all_scores, top_k)
+                scores = all_scores[rows]
+
+            matches = []
+            for row, score in zip(rows, scores):
+                match = {"id": self._ids[row], "score": float(score)}
+                if include_metadata:
+                    match["metadata"] = self._row_metadata(row)
+                matches.append(match)
+            return {"matches": matches}
+
+    def fetch(self, ids):
+        """按ID读取向量和元数据"""
+        with self._lock:
+            vectors = {}
+            for vector_id in ids:
+                row = self._id_to_row.get(vector_id)
+                if row is not None:
+                    vectors[vector_id] = {
+                        "id": vector_id,
+                        "values": self._matrix[row].tolist(),
+                        "metadata": self._row_metadata(row)
+                    }
+            return SimpleNamespace(vectors=vectors)
+
+    def list(self, prefix=None, limit=100):
+        """按 ID 前缀分页列出向量 ID（与 Pinecone serverless 的 list 相同，逐页产出 ID 列表）"""
+        with self._lock:
+            ids = sorted(vector_id for vector_id in self._ids if not prefix or vector_id.startswith(prefix))
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def describe_index_stats(self):
+        """索引统计信息"""
+        return SimpleNamespace(total_vector_count=self._count, dimension=self.dimension)
+
+
+_local_indexes = {}
+_local_indexes_lock = threading.Lock()
+
+
+def get_local_index(path, dimension, metric="cosine", ann_config=None):
+    """获取进程内共享的本地索引实例（同一路径只加载一次）"""
+    with _local_indexes_lock:
+        index = _local_indexes.get(path)
+        if index is None:
+            index = LocalVectorIndex(path, dimension, metric, ann_config)
+            _local_indexes[path] = index
+        return index
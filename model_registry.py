@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Sentence Transformer 模型注册表
+进程内只加载一次模型，Streamlit 重跑脚本和多个会话之间共享同一份权重
+"""
+
+import os
+import threading
+import time
+
+from config import ENV_CONFIG, get_sentence_transformer_config
+
+
+def _current_rss_bytes():
+    """读取当前进程的常驻内存（仅Linux可用，其他平台返回0）"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError, IndexError):
+        return 0
+
+
+def _model_param_bytes(model):
+    """统计模型参数和缓冲区占用的字节数"""
+    try:
+        total = 0
+        for tensor in list(model.parameters()) + list(model.buffers()):
+            total += tensor.numel() * tensor.element_size()
+        return total
+    except Exception:
+        return 0
+
+
+class ModelRegistry:
+    """进程级、线程安全的模型注册表"""
+    def __init__(self):
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._warm_up_result = None
+
+    def _resolve(self, model_name=None, cache_folder=None, device=None):
+        st_config = get_sentence_transformer_config()
+        return (
+            model_name or st_config["model_name"],
+            cache_folder or st_config["cache_folder"],
+            device or st_config["device"]
+        )
+
+    def get_model(self, model_name=None, cache_folder=None, device=None):
+        """获取模型，首次调用时加载，之后直接返回已加载的实例"""
+        model_name, cache_folder, device = self._resolve(model_name, cache_folder, device)
+        key = (model_name, device)
+
+        model = self._models.get(key)
+        if model is not None:
+            self._record_hit(key)
+            return model
+
+        # 每个模型一把加载锁，避免并发会话重复加载同一个模型
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self._load(key, cache_folder)
+            else:
+                self._record_hit(key)
+        return model
+
+    def _record_hit(self, key):
+        """命中计数在锁内更新，避免并发会话丢失计数"""
+        with self._lock:
+            self._stats[key]["hits"] += 1
+
+    def _load(self, key, cache_folder):
+        model_name, device = key
+        for env_key, value in ENV_CONFIG.items():
+            os.environ[env_key] = value
+
+        rss_before = _current_rss_bytes()
+        start = time.perf_counter()
+        try:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name, cache_folder=cache_folder, device=device)
+        except Exception as e:
+            with self._lock:
+                stats = self._stats.setdefault(key, self._empty_stats(model_name, device))
+                stats["load_failures"] += 1
+                stats["last_error"] = str(e)
+            raise
+
+        load_seconds = time.perf_counter() - start
+        rss_after = _current_rss_bytes()
+
+        with self._lock:
+            stats = self._stats.setdefault(key, self._empty_stats(model_name, device))
+            stats.update({
+                "loaded": True,
+                "load_seconds": load_seconds,
+                "param_bytes": _model_param_bytes(model),
+                "rss_delta_bytes": max(rss_after - rss_before, 0),
+                "loaded_at": time.time(),
+                "last_error": None
+            })
+            self._models[key] = model
+        return model
+
+    @staticmethod
+    def _empty_stats(model_name, device):
+        return {
+            "model_name": model_name,
+            "device": device,
+            "loaded": False,
+            "load_seconds": 0.0,
+            "param_bytes": 0,
+            "rss_delta_bytes": 0,
+            "loaded_at": None,
+            "hits": 0,
+            "load_failures": 0,
+            "last_error": None
+        }
+
+    def warm_up(self, force=False):
+        """预加载配置中的模型，返回 (是否成功, 信息)；每个进程默认只尝试一次"""
+        if self._warm_up_result is not None and not force:
+            return self._warm_up_result
+        try:
+            self.get_model()
+            self._warm_up_result = (True, "模型已就绪")
+        except Exception as e:
+            self._warm_up_result = (False, str(e))
+        return self._warm_up_result
+
+    def is_loaded(self, model_name=None, device=None):
+        """模型是否已经加载"""
+        model_name, _, device = self._resolve(model_name, None, device)
+        return (model_name, device) in self._models
+
+    def unload(self, model_name=None, device=None):
+        """从注册表中移除模型（下次使用时重新加载）"""
+        model_name, _, device = self._resolve(model_name, None, device)
+        with self._lock:
+            self._models.pop((model_name, device), None)
+            if (model_name, device) in self._stats:
+                self._stats[(model_name, device)]["loaded"] = False
+
+    def get_stats(self):
+        """获取所有模型的加载耗时、内存占用和命中次数"""
+        with self._lock:
+            return [dict(stats) for stats in self._stats.values()]
+
+
+# 全局模型注册表
+model_registry = ModelRegistry()
+
+
+def get_sentence_transformer(model_name=None, cache_folder=None, device=None):
+    """获取已缓存的 SentenceTransformer 模型"""
+    return model_registry.get_model(model_name, cache_folder, device)
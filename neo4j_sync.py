@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+"""
+本地图数据批量同步到 Neo4j
+每个标签先建 id 唯一约束，节点和关系按 (标签, 关系类型) 分组后用 UNWIND $rows 批量写入，
+每批一个显式写事务；批次分给多个线程并行执行，进度按 行/秒 汇报。
+增量同步时按节点和关系的内容哈希与上次同步的状态做差异，只执行变化部分的 MERGE / DELETE
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+from config import get_neo4j_config
+from graph_query_engine import to_number
+
+IDENTIFIER_PATTERN = re.compile(r"[^0-9A-Za-z_]")
+
+# 能取出数值的属性另存一份 "<属性>__number"（如 "329.5μmol/L" -> 329.5），
+# Cypher 没有正则提取，数值比较直接用这份属性，与本地引擎的 to_number 语义一致
+NUMBER_SUFFIX = "__number"
+
+# 写入 Neo4j 的属性格式版本，变化后即使图文件未变也要重新同步
+SYNC_FORMAT = 2
+
+
+def node_label(data):
+    """节点标签：node_type 去掉下划线，缺省为 Entity（与原有导入保持一致）"""
+    label = IDENTIFIER_PATTERN.sub("", str(data.get("node_type") or "Entity").replace("_", ""))
+    return label or "Entity"
+
+
+def relationship_type(data):
+    """关系类型：edge_type 转大写，缺省为 RELATED"""
+    rel_type = IDENTIFIER_PATTERN.sub("", str(data.get("edge_type") or "RELATED").upper().replace(" ", "_"))
+    return rel_type or "RELATED"
+
+
+def _property_value(value):
+    return value if isinstance(value, (str, int, float, bool)) else str(value)
+
+
+def number_property(name):
+    """属性对应的数值属性名"""
+    return name + NUMBER_SUFFIX
+
+
+def _with_numbers(properties):
+    numbers = {}
+    for key, value in properties.items():
+        number = to_number(value)
+        if number is not None:
+            numbers[number_property(key)] = number
+    properties.update(numbers)
+    return properties
+
+
+def strip_numbers(properties):
+    """去掉同步时附加的数值属性，还原本地图中的属性"""
+    return {key: value for key, value in properties.items() if not key.endswith(NUMBER_SUFFIX)}
+
+
+def node_properties(node_id, data):
+    properties = {key: _property_value(value) for key, value in data.items() if key != "node_type"}
+    properties["id"] = str(node_id)
+    return _with_numbers(properties)
+
+
+def edge_properties(data):
+    return _with_numbers({key: _property_value(value) for key, value in data.items() if key != "edge_type"})
+
+
+def _batches(rows, batch_size):
+    for i in range(0, len(rows), batch_size):
+        yield rows[i:i + batch_size]
+
+
+def group_nodes(G):
+    """{标签: [{"id":..., "props": {...}}]}"""
+    groups = {}
+    for node_id, data in G.nodes(data=True):
+        groups.setdefault(node_label(data), []).append({"id": str(node_id), "props": node_properties(node_id, data)})
+    return groups
+
+
+def group_edges(G):
+    """{(起点标签, 关系类型, 终点标签): [{"source":..., "target":..., "props": {...}}]}"""
+    labels = {node: node_label(data) for node, data in G.nodes(data=True)}
+    groups = {}
+    for source, target, data in G.edges(data=True):
+        key = (labels[source], relationship_type(data), labels[target])
+        groups.setdefault(key, []).append({"source": str(source), "target": str(target), "props": edge_properties(data)})
+    return groups
+
+
+def node_create_query(label):
+    return f"UNWIND $rows AS row CREATE (n:`{label}`) SET n = row.props"
+
+
+def edge_create_query(source_label, rel_type, target_label):
+    # 两端都带标签，MATCH 走 id 唯一约束的索引而不是全库扫描
+    return (
+        f"UNWIND $rows AS row "
+        f"MATCH (a:`{source_label}` {{id: row.source}}) "
+        f"MATCH (b:`{target_label}` {{id: row.target}}) "
+        f"CREATE (a)-[r:`{rel_type}`]->(b) SET r = row.props"
+    )
+
+
+class SyncProgress:
+    """
+    进度统计：工作线程只累加计数，回调 callback(阶段, 已完成, 总数, 行/秒) 只在调用线程中触发，
+    因此回调里可以直接使用 st.progress / st.empty 等 Streamlit 组件
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._lock = threading.Lock()
+        self.phase = None
+        self.done = 0
+        self.total = 0
+        self.rows = 0
+        self.seconds = 0.0
+        self._phase_start = 0.0
+
+    def start(self, phase, total):
+        with self._lock:
+            self.phase = phase
+            self.done = 0
+            self.total = total
+            self._phase_start = time.perf_counter()
+        self.report()
+
+    def advance(self, rows):
+        with self._lock:
+            self.done += rows
+            self.rows += rows
+
+    def finish(self):
+        with self._lock:
+            self.seconds += time.perf_counter() - self._phase_start
+        self.report()
+
+    @property
+    def rows_per_second(self):
+        elapsed = time.perf_counter() - self._phase_start
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        if self.callback is not None:
+            self.callback(self.phase, self.done, self.total, self.rows_per_second)
+
+
+class Neo4jBulkWriter:
+    """
+    批量写入器；driver 使用 config.get_neo4j_driver() 返回的共享 Driver
+    每个线程使用自己的 session（session 不是线程安全的），写事务用 execute_write，遇到死锁等瞬时错误自动重试
+    """
+    def __init__(self, driver, database=None, batch_size=None, workers=None, progress=None):
+        config = get_neo4j_config()
+        self.driver = driver
+        self.database = database or config.get("database")
+        self.batch_size = batch_size or config.get("sync_batch_size", 1000)
+        self.workers = workers or config.get("sync_workers", 4)
+        self.progress = progress or SyncProgress()
+        self.report_interval = 0.5
+        self.transactions = 0
+
+    def _session(self):
+        return self.driver.session(database=self.database) if self.database else self.driver.session()
+
+    def run(self, query, **params):
+        """自动提交的单条语句（建约束、统计等）"""
+        with self._session() as session:
+            return session.run(query, **params).data()
+
+    def ensure_constraints(self, labels):
+        for label in sorted(labels):
+            self.run(f"CREATE CONSTRAINT `{label}_id_unique` IF NOT EXISTS FOR (n:`{label}`) REQUIRE n.id IS UNIQUE")
+
+    def clear(self):
+        """分批删除全部节点，避免单个事务过大"""
+        while True:
+            deleted = self.run(
+                "MATCH (n) WITH n LIMIT $limit DETACH DELETE n RETURN count(*) AS deleted",
+                limit=self.batch_size * 10
+            )[0]["deleted"]
+            if not deleted:
+                return
+
+    def write(self, phase, jobs):
+        """
+        jobs 为 [(分区键, cypher, rows)]；rows 切成批后按分区键分给各线程，
+        同一分区的批次在同一线程中顺序执行，减少并发事务对同一节点加锁的冲突
+        """
+        partitions = [[] for _ in range(self.workers)]
+        total = 0
+        for partition_key, query, rows in jobs:
+            for batch in _batches(rows, self.batch_size):
+                partitions[hash(partition_key) % self.workers].append((query, batch))
+                total += len(batch)
+        self.progress.start(phase, total)
+
+        def write_partition(batches):
+            with self._session() as session:
+                for query, batch in batches:
+                    session.execute_write(lambda tx, query=query, batch=batch: tx.run(query, rows=batch).consume())
+                    self.progress.advance(len(batch))
+
+        partitions = [batches for batches in partitions if batches]
+        self.transactions += sum(len(batches) for batches in partitions)
+        with ThreadPoolExecutor(max_workers=max(1, len(partitions)), thread_name_prefix="neo4j-sync") as pool:
+            pending = {pool.submit(write_partition, batches) for batches in partitions}
+            while pending:
+                done, pending = wait(pending, timeout=self.report_interval)
+                for future in done:
+                    future.result()  # 把工作线程中的异常抛回调用方
+                self.progress.report()
+        self.progress.finish()
+        return total
+
+
+def _edge_jobs(groups, query_for=None):
+    """关系按起点分区：同一起点（通常是患者节点）的关系落在同一线程"""
+    query_for = query_for or edge_create_query
+    jobs = []
+    for (source_label, rel_type, target_label), rows in groups.items():
+        query = query_for(source_label, rel_type, target_label)
+        by_source = {}
+        for row in rows:
+            by_source.setdefault(hash(row["source"]) % 64, []).append(row)
+        for bucket, bucket_rows in by_source.items():
+            jobs.append((bucket, query, bucket_rows))
+    return jobs
+
+
+def bulk_import_graph(G, driver, progress_callback=None, batch_size=None, workers=None):
+    """
+    清空 Neo4j 后全量导入本地图，返回统计信息
+    节点全部写完后才开始写关系，保证关系两端的节点都已存在
+    """
+    start = time.perf_counter()
+    progress = SyncProgress(progress_callback)
+    writer = Neo4jBulkWriter(driver, batch_size=batch_size, workers=workers, progress=progress)
+
+    node_groups = group_nodes(G)
+    writer.ensure_constraints(node_groups)
+    writer.clear()
+
+    node_jobs = [
+        ((label, i), node_create_query(label), batch)
+        for label, rows in node_groups.items()
+        for i, batch in enumerate(_batches(rows, writer.batch_size))
+    ]
+    nodes = writer.write("nodes", node_jobs)
+    relationships = writer.write("relationships", _edge_jobs(group_edges(G)))
+
+    return {
+        "nodes": nodes,
+        "relationships": relationships,
+        "labels": len(node_groups),
+        "transactions": writer.transactions,
+        "seconds": time.perf_counter() - start,
+        "rows_per_second": progress.rows / progress.seconds if progress.seconds else 0.0
+    }
+
+
+# ---------- 增量同步 ----------
+
+def content_hash(*parts):
+    return hashlib.sha1(json.dumps(parts, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def edge_key(source, rel_type, target):
+    # 无向图的边按 G.edges 给出的方向写入 Neo4j，方向不同视为不同的关系
+    return f"{source}\x1f{rel_type}\x1f{target}"
+
+
+def graph_state(G):
+    """
+    本地图的同步状态：
+    nodes 为 {id: [标签, 哈希]}，edges 为 {键: [起点标签, 关系类型, 终点标签, 起点, 终点, 哈希]}
+    """
+    nodes = {}
+    for node_id, data in G.nodes(data=True):
+        label = node_label(data)
+        properties = node_properties(node_id, data)
+        nodes[properties["id"]] = [label, content_hash(label, properties)]
+    edges = {}
+    for source, target, data in G.edges(data=True):
+        rel_type = relationship_type(data)
+        source, target = str(source), str(target)
+        properties = edge_properties(data)
+        edges[edge_key(source, rel_type, target)] = [
+            nodes[source][0], rel_type, nodes[target][0], source, target, content_hash(rel_type, properties)
+        ]
+    return {"nodes": nodes, "edges": edges}
+
+
+def diff_states(previous, current):
+    """返回 (需要写入的节点ID, 需要删除的节点, 需要写入的关系键, 需要删除的关系)"""
+    old_nodes, new_nodes = previous["nodes"], current["nodes"]
+    old_edges, new_edges = previous["edges"], current["edges"]
+
+    upsert_nodes = [node_id for node_id, entry in new_nodes.items() if old_nodes.get(node_id) != entry]
+    # 标签变化的节点先按旧标签删除再按新标签写入
+    delete_nodes = [
+        (node_id, entry[0]) for node_id, entry in old_nodes.items()
+        if node_id not in new_nodes or new_nodes[node_id][0] != entry[0]
+    ]
+    deleted_ids = {node_id for node_id, _ in delete_nodes}
+
+    upsert_edges = [
+        key for key, entry in new_edges.items()
+        if old_edges.get(key) != entry or entry[3] in deleted_ids or entry[4] in deleted_ids
+    ]
+    # 端点被删除的关系会随 DETACH DELETE 一起删除，不需要单独处理
+    delete_edges = [
+        entry for key, entry in old_edges.items()
+        if key not in new_edges and entry[3] not in deleted_ids and entry[4] not in deleted_ids
+    ]
+    return upsert_nodes, delete_nodes, upsert_edges, delete_edges
+
+
+def node_merge_query(label):
+    return f"UNWIND $rows AS row MERGE (n:`{label}` {{id: row.id}}) SET n = row.props"
+
+
+def node_delete_query(label):
+    return f"UNWIND $rows AS row MATCH (n:`{label}` {{id: row.id}}) DETACH DELETE n"
+
+
+def edge_merge_query(source_label, rel_type, target_label):
+    return (
+        f"UNWIND $rows AS row "
+        f"MATCH (a:`{source_label}` {{id: row.source}}) "
+        f"MATCH (b:`{target_label}` {{id: row.target}}) "
+        f"MERGE (a)-[r:`{rel_type}`]->(b) SET r = row.props"
+    )
+
+
+def edge_delete_query(source_label, rel_type, target_label):
+    return (
+        f"UNWIND $rows AS row "
+        f"MATCH (a:`{source_label}` {{id: row.source}})-[r:`{rel_type}`]->(b:`{target_label}` {{id: row.target}}) "
+        f"DELETE r"
+    )
+
+
+def load_sync_state(state_file):
+    if not state_file or not os.path.exists(state_file):
+        return None
+    try:
+        with open(state_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_sync_state(state_file, state):
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_file, state_file)
+
+
+def _sync_target():
+    config = get_neo4j_config()
+    return f"{config.get('uri')}/{config.get('database')}"
+
+
+def sync_graph(G, driver, graph_version=None, state_file=None, full=False, progress_callback=None,
+               batch_size=None, workers=None):
+    """
+    把本地图同步到 Neo4j，返回统计信息
+    - 水位线（图文件版本 + 目标库 + 属性格式版本）与上次同步一致时直接返回，不做任何写入
+    - 没有同步状态、状态标记为 dirty、目标库变化或 full=True 时走全量导入
+    - 否则按内容哈希做差异，只写入变化的节点和关系；写入全部成功后才更新状态文件
+    - 全量导入会先清空目标库，开始前先把状态标记为 dirty：导入中途失败时，
+      下次同步不会误判为"未变化"，也不会对着已清空的库做差异，而是重新全量导入
+    """
+    start = time.perf_counter()
+    state_file = state_file or get_neo4j_config().get("sync_state_file", "neo4j_sync_state.json")
+    previous = load_sync_state(state_file)
+    watermark = {"graph_version": list(graph_version) if graph_version else None, "target": _sync_target(),
+                 "format": SYNC_FORMAT}
+
+    dirty = previous is not None and previous.get("dirty", False)
+    if (not full and previous is not None and not dirty and graph_version is not None
+            and previous.get("watermark", {}).get("graph_version") == watermark["graph_version"]
+            and previous["watermark"].get("format") == SYNC_FORMAT
+            and previous["watermark"].get("target") == watermark["target"]):
+        return {"mode": "unchanged", "nodes_upserted": 0, "nodes_deleted": 0, "relationships_upserted": 0,
+                "relationships_deleted": 0, "transactions": 0, "seconds": time.perf_counter() - start}
+
+    current = graph_state(G)
+    if full or previous is None or dirty or previous.get("watermark", {}).get("target") != watermark["target"]:
+        save_sync_state(state_file, {"dirty": True, "watermark": {"target": watermark["target"]}})
+        stats = bulk_import_graph(G, driver, progress_callback, batch_size, workers)
+        stats = {"mode": "full", "nodes_upserted": stats["nodes"], "nodes_deleted": 0,
+                 "relationships_upserted": stats["relationships"], "relationships_deleted": 0,
+                 "transactions": stats["transactions"]}
+    else:
+        stats = _apply_diff(G, driver, previous, current, progress_callback, batch_size, workers)
+
+    watermark["synced_at"] = datetime.now().isoformat()
+    current["watermark"] = watermark
+    save_sync_state(state_file, current)
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def _apply_diff(G, driver, previous, current, progress_callback, batch_size, workers):
+    """按 删关系 → 删节点 → 写节点 → 写关系 的顺序应用差异"""
+    writer = Neo4jBulkWriter(driver, batch_size=batch_size, workers=workers, progress=SyncProgress(progress_callback))
+    upsert_nodes, delete_nodes, upsert_edges, delete_edges = diff_states(previous, current)
+
+    groups = {}
+    for source_label, rel_type, target_label, source, target, _ in delete_edges:
+        groups.setdefault((source_label, rel_type, target_label), []).append({"source": source, "target": target})
+    if groups:
+        writer.write("delete_relationships", _edge_jobs(groups, edge_delete_query))
+
+    groups = {}
+    for node_id, label in delete_nodes:
+        groups.setdefault(label, []).append({"id": node_id})
+    if groups:
+        writer.write("delete_nodes", [(label, node_delete_query(label), rows) for label, rows in groups.items()])
+
+    node_data = {str(node_id): (node_id, data) for node_id, data in G.nodes(data=True)}
+    groups = {}
+    for node_id in upsert_nodes:
+        original_id, data = node_data[node_id]
+        groups.setdefault(current["nodes"][node_id][0], []).append(
+            {"id": node_id, "props": node_properties(original_id, data)}
+        )
+    if groups:
+        writer.ensure_constraints(groups)
+        writer.write("nodes", [
+            ((label, i), node_merge_query(label), batch)
+            for label, rows in groups.items()
+            for i, batch in enumerate(_batches(rows, writer.batch_size))
+        ])
+
+    groups = {}
+    for key in upsert_edges:
+        source_label, rel_type, target_label, source, target, _ = current["edges"][key]
+        data = G.edges[node_data[source][0], node_data[target][0]]
+        groups.setdefault((source_label, rel_type, target_label), []).append(
+            {"source": source, "target": target, "props": edge_properties(data)}
+        )
+    if groups:
+        writer.write("relationships", _edge_jobs(groups, edge_merge_query))
+
+    return {
+        "mode": "incremental",
+        "nodes_upserted": len(upsert_nodes),
+        "nodes_deleted": len(delete_nodes),
+        "relationships_upserted": len(upsert_edges),
+        "relationships_deleted": len(delete_edges),
+        "transactions": writer.transactions
+    }
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Pinecone 连接管理
+每个进程只创建一次客户端和 Index 句柄（复用 HTTP 连接池），
+索引是否存在按 TTL 惰性校验，连接类错误时自动重连并重试一次
+"""
+
+import threading
+import time
+
+from config import get_pinecone_config
+
+
+# 视为连接/传输层故障的异常（按类名匹配整个继承链，避免直接依赖 urllib3 / pinecone 的异常类型）
+TRANSPORT_ERROR_NAMES = (
+    "MaxRetryError", "ProtocolError", "NewConnectionError", "ConnectTimeoutError",
+    "ReadTimeoutError", "SSLError", "ServiceException"
+)
+
+
+def is_transport_error(error):
+    """连接断开、超时、TLS 错误和服务端 5xx 可以重连重试；参数错误、维度不符等调用方错误不重试"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in TRANSPORT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class ReconnectingIndex:
+    """
+    Index 句柄代理：只转发 Pinecone Index 的数据面方法，属性在调用时才解析（不会因为 hasattr 建立连接）
+    方法调用遇到连接/传输层错误时让管理器重建连接后重试一次
+    """
+    PROXIED_METHODS = (
+        "upsert", "query", "delete", "fetch", "update", "describe_index_stats",
+        "list", "list_paginated", "upsert_from_dataframe"
+    )
+
+    def __init__(self, manager):
+        self._manager = manager
+
+    def __getattr__(self, name):
+        if name not in self.PROXIED_METHODS:
+            raise AttributeError(name)
+
+        def call(*args, **kwargs):
+            try:
+                return getattr(self._manager.current_index(), name)(*args, **kwargs)
+            except Exception as e:
+                if not is_transport_error(e):
+                    raise
+                self._manager.reset()
+                self._manager.get_index()
+                return getattr(self._manager.current_index(), name)(*args, **kwargs)
+        call.__name__ = name
+        return call
+
+
+class PineconeConnectionManager:
+    """进程级 Pinecone 客户端与 Index 句柄缓存"""
+    def __init__(self):
+        self._client = None
+        self._index = None
+        self._validated_at = 0.0
+        self._lock = threading.Lock()
+        self._proxy = ReconnectingIndex(self)
+        self.connects = 0
+        self.validations = 0
+
+    def _ensure_index_exists(self, client, config):
+        """检查索引是否存在，不存在时创建；返回 "validated" 或 "created" """
+        from pinecone import ServerlessSpec
+
+        index_name = config["index_name"]
+        index_names = [index.name for index in client.list_indexes()]
+        self.validations += 1
+        if index_name in index_names:
+            return "validated"
+
+        client.create_index(
+            name=index_name,
+            dimension=config["dimension"],
+            metric=config["metric"],
+            spec=ServerlessSpec(
+                cloud="aws",
+                region="us-east-1"
+            )
+        )
+        return "created"
+
+    def get_index(self):
+        """
+        返回 (Index 句柄, 状态)
+        状态："cached" 直接复用；"validated" 本次校验了索引存在；"created" 本次新建了索引
+        """
+        config = get_pinecone_config()
+        ttl = config.get("validate_ttl", 600)
+        with self._lock:
+            if self._index is not None and time.time() - self._validated_at < ttl:
+                return self._proxy, "cached"
+
+            if self._client is None:
+                from pinecone import Pinecone
+                self._client = Pinecone(api_key=config["api_key"])
+                self.connects += 1
+
+            status = self._ensure_index_exists(self._client, config)
+            if self._index is None:
+                self._index = self._client.Index(
+                    config["index_name"],
+                    pool_threads=config.get("pool_threads", 4)
+                )
+            self._validated_at = time.time()
+            return self._proxy, status
+
+    def current_index(self):
+        """当前的原始 Index 句柄（必要时先建立连接）"""
+        if self._index is None:
+            self.get_index()
+        return self._index
+
+    def reset(self):
+        """丢弃客户端和句柄，下次调用时重新连接"""
+        with self._lock:
+            self._client = None
+            self._index = None
+            self._validated_at = 0.0
+
+    def get_stats(self):
+        return {
+            "connects": self.connects,
+            "validations": self.validations,
+            "seconds_since_validation": time.time() - self._validated_at if self._validated_at else None
+        }
+
+
+# 全局连接管理器
+pinecone_manager = PineconeConnectionManager()
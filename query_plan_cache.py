@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 查询计划缓存
+问题中的患者姓名和数值先替换成槽位（{患者0}、{数值0}），按 (计划类型, 归一化问题) 精确查找，
+查不到时再按归一化问题的向量找最相近的已缓存问题，且槽位以外的词项必须完全相同（向量相近不代表含义相同，
+"高于" 和 "低于" 的问法相似度也很高）；命中后把当前问题的槽位值代回计划中。
+计划保存在 SQLite 文件中，带过期时间和按最近访问时间的淘汰，并统计命中率
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from config import get_query_plan_cache_config
+from embedding_engine import lexical_terms
+from vector_store import COMMON_SURNAMES
+
+# 病历中的患者姓名都是 "X某某" 的脱敏形式，姓氏表与检索时识别患者姓名共用
+PATIENT_PATTERN = re.compile(f"[{COMMON_SURNAMES}]某某")
+NUMBER_PATTERN = re.compile(r"(?<![\d.])\d+(?:\.\d+)?(?![\d.])")
+SLOT_VALUE_PATTERN = re.compile(f"(?P<patient>{PATIENT_PATTERN.pattern})|(?P<number>{NUMBER_PATTERN.pattern})")
+SLOT_PATTERN = re.compile(r"\{\{slot:([^{}]+)\}\}")
+QUESTION_SLOT_PATTERN = re.compile(r"\{[^{}]+\}")
+TRAILING_PUNCTUATION = "？?。.!！ "
+# 客套词和语气词不改变问题含义，比较词项时忽略
+FILLER_TERMS = frozenset({"请问", "请", "麻烦", "帮忙", "帮我", "一下", "呢", "吗", "啊", "呀", "吧"})
+
+
+def normalize_question(question):
+    """返回 (归一化问题, {槽位名: 值})；同一个值多次出现时共用一个槽位"""
+    slots = {}
+    values = {}
+
+    def slot_for(prefix, value):
+        if value not in values:
+            name = f"{prefix}{sum(1 for slot in slots if slot.startswith(prefix))}"
+            values[value] = name
+            slots[name] = value
+        return "{" + values[value] + "}"
+
+    text = re.sub(r"\s+", "", question).rstrip(TRAILING_PUNCTUATION).lower()
+    # 姓名和数值一次替换完，避免槽位名里的数字再被当作数值
+    text = SLOT_VALUE_PATTERN.sub(
+        lambda m: slot_for("患者", m.group(0)) if m.lastgroup == "patient" else slot_for("数值", m.group(0)),
+        text
+    )
+    return text, slots
+
+
+def content_terms(normalized):
+    """归一化问题中槽位以外的词项集合，相近问题只有这部分完全相同时才复用计划"""
+    terms = lexical_terms(QUESTION_SLOT_PATTERN.sub(" ", normalized))
+    return frozenset(term for term in terms if term not in FILLER_TERMS)
+
+
+def _slot_marker(name):
+    return "{{slot:" + name + "}}"
+
+
+def make_template(plan, slots):
+    """
+    把计划中出现的槽位值替换成占位符：字符串中的姓名和数值替换成 {{slot:名称}}，
+    与数值槽位相等的数字替换成 {"$slot": 名称}；返回 (模板, 实际用到的槽位)
+    """
+    used = set()
+    patients = [(name, value) for name, value in slots.items() if name.startswith("患者")]
+    numbers = [(name, value) for name, value in slots.items() if name.startswith("数值")]
+
+    def replace_text(text):
+        for name, value in patients:
+            if value in text:
+                text = text.replace(value, _slot_marker(name))
+                used.add(name)
+        for name, value in numbers:
+            pattern = re.compile(r"(?<![\d.])" + re.escape(value) + r"(?![\d.])")
+            if pattern.search(text):
+                text = pattern.sub(_slot_marker(name), text)
+                used.add(name)
+        return text
+
+    def walk(node):
+        if isinstance(node, dict):
+            return {replace_text(key): walk(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [walk(item) for item in node]
+        if isinstance(node, str):
+            return replace_text(node)
+        # 0 / 1 多为投影或开关（如 "_id": 0），不当作问题中的数值
+        if isinstance(node, (int, float)) and not isinstance(node, bool) and node not in (0, 1):
+            for name, value in numbers:
+                if float(value) == float(node):
+                    used.add(name)
+                    return {"$slot": name}
+        return node
+
+    return walk(plan), used
+
+
+def bind_template(template, slots):
+    """把槽位值代回模板；缺少槽位时抛出 KeyError"""
+    def number(value):
+        return float(value) if "." in value else int(value)
+
+    def walk(node):
+        if isinstance(node, dict):
+            if set(node) == {"$slot"}:
+                return number(slots[node["$slot"]])
+            return {walk(key): walk(value) for key, value in node.items()}
+        if isinstance(node, list):
+            return [walk(item) for item in node]
+        if isinstance(node, str):
+            return SLOT_PATTERN.sub(lambda m: slots[m.group(1)], node)
+        return node
+
+    return walk(template)
+
+
+class QueryPlanCache:
+    """SQLite 持久化的查询计划缓存，线程安全"""
+    def __init__(self, path, ttl_seconds=7 * 24 * 3600, max_entries=5000, similarity_threshold=0.95,
+                 embed=None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._embed = embed  # texts -> 单位向量矩阵；为 None 时使用句向量模型
+        self._embedding_failed = False
+        self._lock = threading.Lock()
+        self._vectors = {}  # 计划类型 -> (归一化问题列表, 向量矩阵)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS plans (
+                kind TEXT NOT NULL,
+                question TEXT NOT NULL,
+                template TEXT NOT NULL,
+                slots TEXT NOT NULL,
+                vector BLOB,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                generate_seconds REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (kind, question)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_plans_last_access ON plans(last_access)")
+        self._conn.commit()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    # ---------- 向量 ----------
+
+    def _encode(self, text):
+        if self._embedding_failed:
+            return None
+        try:
+            if self._embed is None:
+                from embedding_engine import encode_texts
+                vector = encode_texts([text], dtype="float32")[0]
+            else:
+                vector = self._embed([text])[0]
+        except Exception:
+            # 模型不可用时只做精确匹配
+            self._embedding_failed = True
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _vector_index(self, kind):
+        """按计划类型加载全部向量（调用方持有锁）"""
+        if kind not in self._vectors:
+            rows = self._conn.execute(
+                "SELECT question, vector FROM plans WHERE kind = ? AND vector IS NOT NULL", (kind,)
+            ).fetchall()
+            questions = [question for question, _ in rows]
+            matrix = np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows]) if rows else None
+            self._vectors[kind] = (questions, matrix)
+        return self._vectors[kind]
+
+    # ---------- 查找与写入 ----------
+
+    def _row_valid(self, created, now):
+        return not self.ttl_seconds or now - created <= self.ttl_seconds
+
+    def lookup(self, kind, question):
+        """命中时返回 (计划, "exact"/"semantic", 相似度)，未命中返回 None"""
+        normalized, slots = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT template, slots, created, generate_seconds FROM plans WHERE kind = ? AND question = ?",
+                (kind, normalized)
+            ).fetchone()
+            match, similarity = (normalized, 1.0) if row else (None, 0.0)
+            if row and not self._row_valid(row[2], now):
+                self._delete(kind, normalized)
+                row, match = None, None
+
+        if row is None:
+            vector = self._encode(normalized)
+            if vector is not None:
+                with self._lock:
+                    questions, matrix = self._vector_index(kind)
+                    if matrix is not None:
+                        terms = content_terms(normalized)
+                        scores = matrix @ vector
+                        # 从最相似的开始，跳过槽位对不上或已过期的
+                        for i in np.argsort(-scores)[:5]:
+                            if scores[i] < self.similarity_threshold:
+                                break
+                            candidate = self._conn.execute(
+                                "SELECT template, slots, created, generate_seconds FROM plans "
+                                "WHERE kind = ? AND question = ?", (kind, questions[i])
+                            ).fetchone()
+                            if candidate is None:
+                                continue
+                            if not self._row_valid(candidate[2], now):
+                                self._delete(kind, questions[i])
+                                break  # 索引已变化，剩余候选下次再查
+                            if set(json.loads(candidate[1])) <= set(slots) and content_terms(questions[i]) == terms:
+                                row, match, similarity = candidate, questions[i], float(scores[i])
+                                break
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            try:
+                plan = bind_template(json.loads(row[0]), slots)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE plans SET last_access = ?, hits = hits + 1 WHERE kind = ? AND question = ?",
+                (now, kind, match)
+            )
+            self._conn.commit()
+            if match == normalized:
+                self.exact_hits += 1
+            else:
+                self.semantic_hits += 1
+            self.saved_seconds += row[3]
+        return plan, ("exact" if match == normalized else "semantic"), similarity
+
+    def store(self, kind, question, plan, generate_seconds=0.0):
+        """缓存 LLM 生成的计划；generate_seconds 为生成耗时，用于估算节省的时间"""
+        normalized, slots = normalize_question(question)
+        template, used = make_template(plan, slots)
+        vector = self._encode(normalized)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO plans (kind, question, template, slots, vector, created, last_access, "
+                "hits, generate_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)",
+                (kind, normalized, json.dumps(template, ensure_ascii=False), json.dumps(sorted(used)),
+                 vector.tobytes() if vector is not None else None, now, now, generate_seconds)
+            )
+            self.stores += 1
+            self._vectors.pop(kind, None)
+            self._evict()
+            self._conn.commit()
+
+    def _delete(self, kind, question):
+        """调用方持有锁"""
+        self._conn.execute("DELETE FROM plans WHERE kind = ? AND question = ?", (kind, question))
+        self._conn.commit()
+        self._vectors.pop(kind, None)
+        self.evictions += 1
+
+    def _evict(self):
+        """删除过期条目，超出条目上限时删除最久未访问的（调用方持有锁）"""
+        evicted = 0
+        if self.ttl_seconds:
+            evicted += self._conn.execute(
+                "DELETE FROM plans WHERE created < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+        count = self._conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+        if count > self.max_entries:
+            evicted += self._conn.execute(
+                "DELETE FROM plans WHERE rowid IN (SELECT rowid FROM plans ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,)
+            ).rowcount
+        if evicted:
+            self._vectors.clear()
+            self.evictions += evicted
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM plans")
+            self._conn.commit()
+            self._vectors.clear()
+
+    def get_stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            lookups = hits + self.misses
+            entries = self._conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+            return {
+                "entries": entries,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "saved_seconds": self.saved_seconds
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_query_plan_cache():
+    """获取全局查询计划缓存，未启用时返回 None"""
+    global _cache
+    config = get_query_plan_cache_config()
+    if not config.get("enabled", False):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryPlanCache(
+                    config["path"],
+                    ttl_seconds=config.get("ttl_seconds", 7 * 24 * 3600),
+                    max_entries=config.get("max_entries", 5000),
+                    similarity_threshold=config.get("similarity_threshold", 0.95)
+                )
+    return _cache
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+LLM 请求限流
+按 (base_url, api_key) 为每个端点/密钥维护两个令牌桶：每分钟请求数和每分钟 token 数。
+取令牌采用预约方式：令牌不足时先记下欠账并返回需要等待的秒数，先到的请求先拿到额度；
+等待发生在锁外（同步调用 time.sleep，异步调用 asyncio.sleep），并发会话之间互不阻塞；
+同步和异步调用预约的是同一组令牌桶，共用同一份额度。
+配置了 shared_state_path 时令牌桶状态保存在 SQLite 中，多进程部署的 Streamlit 共用同一份额度
+"""
+
+import asyncio
+import collections
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from config import get_rate_limit_config
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：中日韩字符约 1 个 token，其他字符约 4 个一个（请求完成后按 usage 校正）"""
+    wide = sum(1 for char in text if ord(char) >= 0x2E80)
+    return wide + (len(text) - wide + 3) // 4
+
+
+def estimate_request_tokens(messages, max_tokens=None, completion_tokens=1024):
+    """一次对话请求预约的 token 数：提示词估算值 + 回答上限"""
+    prompt_tokens = sum(estimate_tokens(str(message.get("content", ""))) + 4 for message in messages)
+    return prompt_tokens + (max_tokens or completion_tokens)
+
+
+def response_total_tokens(response):
+    """从响应的 usage 中取实际消耗的 token 数，取不到时返回 None"""
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+class TokenBucket:
+    """进程内令牌桶（线程安全）；rate 为每秒补充的令牌数，capacity 为可突发的上限"""
+    def __init__(self, capacity, rate, clock=time.monotonic):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def reserve(self, amount):
+        """预约 amount 个令牌，返回需要等待的秒数（0 表示立即可用）；超过容量的请求按容量计"""
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= min(float(amount), self.capacity)
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, delta):
+        """按实际用量校正：delta 为正表示补扣，为负表示退还"""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class SQLiteTokenBucket:
+    """保存在 SQLite 中的令牌桶，BEGIN IMMEDIATE 串行化多个进程的读改写；使用墙上时钟以便跨进程比较"""
+    def __init__(self, path, key, capacity, rate, clock=time.time):
+        self.path = path
+        self.key = key
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.clock = clock
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _update(self, change):
+        """在一个写事务内补充令牌并应用 change(tokens) -> (新令牌数, 返回值)"""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = self.clock()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (self.key,)).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+            tokens, result = change(tokens)
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                         (self.key, tokens, now))
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def reserve(self, amount):
+        def take(tokens):
+            tokens -= min(float(amount), self.capacity)
+            return tokens, (0.0 if tokens >= 0 else -tokens / self.rate)
+        return self._update(take)
+
+    def adjust(self, delta):
+        self._update(lambda tokens: (min(self.capacity, tokens - delta), None))
+
+
+class RateLimiter:
+    """一个端点/密钥的限流器：请求数桶 + token 数桶（额度为 0 表示不限）"""
+    def __init__(self, requests_per_minute, tokens_per_minute=0, burst=None, bucket_factory=None):
+        bucket_factory = bucket_factory or (lambda name, capacity, rate: TokenBucket(capacity, rate))
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.burst = burst or requests_per_minute
+        self.request_bucket = (bucket_factory("requests", self.burst, requests_per_minute / 60.0)
+                               if requests_per_minute > 0 else None)
+        self.token_bucket = (bucket_factory("tokens", tokens_per_minute, tokens_per_minute / 60.0)
+                             if tokens_per_minute > 0 else None)
+        self.lock = threading.Lock()
+        self.recent_requests = collections.deque()
+        self.last_request_time = 0.0
+        self.total_requests = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def reserve(self, tokens=0):
+        """同时预约 1 个请求和 tokens 个 token，返回需要等待的秒数"""
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket is not None and tokens:
+            wait = max(wait, self.token_bucket.reserve(tokens))
+        with self.lock:
+            now = time.time()
+            start = now + wait
+            self.recent_requests.append(start)
+            self.last_request_time = start
+            self.total_requests += 1
+            if wait > 0:
+                self.waits += 1
+                self.wait_seconds += wait
+        return wait
+
+    def acquire(self, tokens=0, on_wait=None):
+        """同步取额度，额度不足时在锁外 sleep；on_wait(秒数) 用于提示用户"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            if on_wait is not None:
+                on_wait(wait)
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens=0, on_wait=None):
+        """异步取额度，等待期间让出事件循环，不阻塞其他协程"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            if on_wait is not None:
+                on_wait(wait)
+            await asyncio.sleep(wait)
+        return wait
+
+    def settle(self, reserved, actual):
+        """请求完成后用实际 token 用量校正预约值；请求失败时 actual 传 0 退还全部预约"""
+        if self.token_bucket is not None and actual is not None and reserved:
+            self.token_bucket.adjust(actual - reserved)
+
+    def get_stats(self):
+        """本进程内的使用统计"""
+        with self.lock:
+            now = time.time()
+            while self.recent_requests and now - self.recent_requests[0] >= 60:
+                self.recent_requests.popleft()
+            return {
+                "requests_this_minute": len(self.recent_requests),
+                "max_requests_per_minute": self.requests_per_minute,
+                "max_tokens_per_minute": self.tokens_per_minute,
+                "burst": self.burst,
+                "time_since_last_request": max(0.0, now - self.last_request_time) if self.last_request_time else 0,
+                "total_requests": self.total_requests,
+                "waits": self.waits,
+                "wait_seconds": self.wait_seconds
+            }
+
+
+def limiter_key(base_url, api_key):
+    """端点/密钥标识：密钥只保留哈希前缀，不写入共享状态文件"""
+    digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:12]
+    return f"{str(base_url or '').rstrip('/')}#{digest}"
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(base_url, api_key):
+    """获取某个端点/密钥的全局限流器，同一进程内所有会话共用"""
+    key = limiter_key(base_url, api_key)
+    limiter = _limiters.get(key)
+    if limiter is not None:
+        return limiter
+    with _limiters_lock:
+        if key not in _limiters:
+            config = get_rate_limit_config()
+            limits = dict(config)
+            limits.update(config.get("endpoints", {}).get(str(base_url or "").rstrip("/"), {}))
+            shared_path = limits.get("shared_state_path")
+            bucket_factory = None
+            if shared_path:
+                def bucket_factory(name, capacity, rate):
+                    return SQLiteTokenBucket(shared_path, f"{key}:{name}", capacity, rate)
+            _limiters[key] = RateLimiter(
+                limits.get("requests_per_minute", 0),
+                tokens_per_minute=limits.get("tokens_per_minute", 0),
+                burst=limits.get("burst"),
+                bucket_factory=bucket_factory
+            )
+        return _limiters[key]
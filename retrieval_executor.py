@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+混合检索执行器
+向量、MongoDB、图数据库三路检索在线程池中并发执行，每一路有独立超时，另有全局截止时间；
+超时或出错的一路返回空结果，其余结果照常返回，混合检索耗时约等于最慢一路而不是三路之和；
+超时的一路失去 Streamlit 会话上下文，之后的 st.* 调用不再显示到页面上
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config import get_system_config
+
+
+# Streamlit 把会话上下文挂在线程的这个属性上（与 add_script_run_ctx / get_script_run_ctx 一致）
+SCRIPT_RUN_CONTEXT_ATTR_NAME = "streamlit_script_run_ctx"
+
+
+def _script_context():
+    """当前 Streamlit 会话的上下文，不在 Streamlit 中运行时返回 None"""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    return get_script_run_ctx()
+
+
+class ScriptContextLease:
+    """
+    把会话上下文借给执行某一路检索的工作线程，检索函数里的 st.write / st.warning 才能正常显示
+    这一路超时后 revoke() 收回上下文：后台继续跑的检索不再往已经向下执行的页面写内容
+    """
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.lock = threading.Lock()
+        self.thread = None
+        self.revoked = False
+
+    def wrap(self, func):
+        if self.ctx is None:
+            return func
+
+        def wrapper(*args, **kwargs):
+            with self.lock:
+                if not self.revoked:
+                    self.thread = threading.current_thread()
+                    setattr(self.thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, self.ctx)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                # 线程池的线程会被复用，执行完也要收回
+                self.revoke()
+        return wrapper
+
+    def revoke(self):
+        with self.lock:
+            self.revoked = True
+            if self.thread is not None:
+                setattr(self.thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+                self.thread = None
+
+
+class RetrievalOutcome:
+    """一次混合检索的结果；超时或出错的一路结果为空列表"""
+    def __init__(self):
+        self.results = {}  # 检索名 -> 结果列表
+        self.status = {}  # 检索名 -> "ok" / "timeout" / "error"
+        self.errors = {}  # 检索名 -> 错误信息
+        self.latencies = {}  # 检索名 -> 耗时（秒），超时的为等待时长
+        self.total_seconds = 0.0
+
+    @property
+    def partial(self):
+        return any(status != "ok" for status in self.status.values())
+
+
+class RetrievalExecutor:
+    """
+    进程级共享的检索线程池
+    超时的任务无法强行终止，会在后台继续跑完，因此线程数要留有余量
+    """
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or get_system_config().get("retrieval_workers", 8)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="retrieval")
+        self.runs = 0
+        self.partial_runs = 0
+
+    def run(self, retrievers, query, timeouts=None, deadline=None):
+        """
+        retrievers 为 {检索名: func(query) -> list}
+        timeouts 为每一路的超时（秒），deadline 为全部检索的总截止时间（秒）
+        """
+        system_config = get_system_config()
+        timeouts = timeouts or system_config.get("retrieval_timeouts", {})
+        deadline = deadline or system_config.get("retrieval_deadline", 60)
+
+        start = time.perf_counter()
+        global_deadline = start + deadline
+        outcome = RetrievalOutcome()
+        ctx = _script_context()
+        pending = {}
+        leases = {}
+        for name, retriever in retrievers.items():
+            leases[name] = ScriptContextLease(ctx)
+            future = self._pool.submit(self._timed, leases[name].wrap(retriever), query)
+            task_deadline = min(start + timeouts.get(name, deadline), global_deadline)
+            pending[future] = (name, task_deadline)
+
+        while pending:
+            now = time.perf_counter()
+            next_deadline = min(task_deadline for _, task_deadline in pending.values())
+            done, _ = wait(list(pending), timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                name, _ = pending.pop(future)
+                try:
+                    result, seconds = future.result()
+                    outcome.results[name] = result or []
+                    outcome.status[name] = "ok"
+                    outcome.latencies[name] = seconds
+                except Exception as e:
+                    outcome.results[name] = []
+                    outcome.status[name] = "error"
+                    outcome.errors[name] = str(e)
+                    outcome.latencies[name] = time.perf_counter() - start
+
+            now = time.perf_counter()
+            for future, (name, task_deadline) in list(pending.items()):
+                if now >= task_deadline:
+                    future.cancel()
+                    leases[name].revoke()
+                    del pending[future]
+                    outcome.results[name] = []
+                    outcome.status[name] = "timeout"
+                    outcome.latencies[name] = now - start
+
+        outcome.total_seconds = time.perf_counter() - start
+        self.runs += 1
+        if outcome.partial:
+            self.partial_runs += 1
+        return outcome
+
+    @staticmethod
+    def _timed(retriever, query):
+        start = time.perf_counter()
+        result = retriever(query)
+        return result, time.perf_counter() - start
+
+
+# 全局检索执行器
+retrieval_executor = RetrievalExecutor()
@@ -0,0 +1,96 @@
+import shutil
+import tempfile
+import json
+import os
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from bm25_index import BM25Index, decode_varints, encode_varint
+from hybrid_search import hybrid_query, reciprocal_rank_fusion
+
+
+class TestBM25Index(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.index = BM25Index(self.path)
+        self.index.add_documents(
+            ["a", "b", "c"],
+            ["口服阿司匹林 100mg 每日一次", "头颅CT提示多发性脑梗死，脑梗死范围较大", "血肌酐升高，复查血肌酐"],
+            [{"patient_name": "周某某"}, {"patient_name": "马某某"}, {"patient_name": "周某某"}]
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_varint_round_trip(self):
+        values = [0, 1, 127, 128, 300, 16384, 2 ** 40]
+        buffer = bytearray()
+        for value in values:
+            encode_varint(value, buffer)
+        self.assertEqual(decode_varints(buffer).tolist(), values)
+
+    def test_exact_terms_rank_first(self):
+        self.assertEqual(self.index.query("阿司匹林")['matches'][0]['id'], "a")
+        self.assertEqual(self.index.query("血肌酐")['matches'][0]['id'], "c")
+        results = self.index.query("脑梗死", filter={"patient_name": "周某某"})
+        self.assertEqual(results['matches'], [])
+
+    def test_incremental_add_and_persistence(self):
+        for i in range(200):
+            self.index.add_documents([f"n{i}"], [f"记录{i} 脑梗死随访"])
+        self.index.save()
+        reloaded = BM25Index(self.path)
+        self.assertEqual(reloaded.get_stats(), self.index.get_stats())
+        np.testing.assert_allclose(reloaded.scores("脑梗死 阿司匹林"), self.index.scores("脑梗死 阿司匹林"))
+        self.assertEqual(reloaded.query("记录199")['matches'][0]['id'], "n199")
+        self.assertGreater(reloaded.get_stats()['compression_ratio'], 1.0)
+
+    def test_delete_documents(self):
+        self.assertEqual(self.index.delete_documents(["a"]), 1)
+        self.assertEqual(self.index.query("阿司匹林")['matches'], [])
+        self.assertEqual(self.index.query("血肌酐")['matches'][0]['id'], "c")
+        self.index.save()
+        reloaded = BM25Index(self.path)
+        self.assertEqual(reloaded.get_stats(), self.index.get_stats())
+        self.assertEqual(reloaded.get_stats()['documents'], 2)
+
+    def test_tokenizer_change_rebuilds_on_load(self):
+        self.index.save()
+        # 分词方式变化：改为逐字切分并提升版本号
+        with mock.patch("bm25_index.LEXICAL_VERSION", "chars-v1"), \
+                mock.patch("bm25_index.lexical_terms", lambda text: [ch for ch in text if ch.strip()]):
+            reloaded = BM25Index(self.path)
+            self.assertEqual(reloaded.query("匹")['matches'][0]['id'], "a")
+        with open(os.path.join(self.path, BM25Index.META_FILE), "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["tokenizer_version"], "chars-v1")
+
+
+class TestHybridSearch(unittest.TestCase):
+    def test_rrf_prefers_documents_in_both_lists(self):
+        dense = {"matches": [{"id": "x", "score": 0.9}, {"id": "y", "score": 0.8}]}
+        lexical = {"matches": [{"id": "y", "score": 12.0}, {"id": "z", "score": 3.0}]}
+        fused = reciprocal_rank_fusion([dense, lexical], k=60, top_k=3)
+        self.assertEqual([m['id'] for m in fused['matches']], ["y", "x", "z"])
+        self.assertAlmostEqual(fused['matches'][0]['score'], 1 / 62 + 1 / 61)
+
+    def test_similarity_threshold_applies_before_fusion(self):
+        dense = lambda query, top_k, filter: {"matches": [{"id": "d", "score": 0.8}, {"id": "weak", "score": 0.1}]}
+        lexical = lambda query, top_k, filter: {"matches": [{"id": "l", "score": 7.5}]}
+        fused = hybrid_query(dense, lexical, "q", min_score=0.3)
+        self.assertEqual({m['id'] for m in fused['matches']}, {"d", "l"})
+        dense_only = hybrid_query(dense, lexical, "q", mode="dense", min_score=0.3)
+        self.assertEqual([m['id'] for m in dense_only['matches']], ["d"])
+
+    def test_modes(self):
+        dense = lambda query, top_k, filter: {"matches": [{"id": "d", "score": 1.0}]}
+        lexical = lambda query, top_k, filter: {"matches": [{"id": "l", "score": 1.0}]}
+        self.assertEqual(hybrid_query(dense, lexical, "q", mode="bm25")['matches'][0]['id'], "l")
+        self.assertEqual({m['id'] for m in hybrid_query(dense, lexical, "q")['matches']}, {"d", "l"})
+        with self.assertRaises(ValueError):
+            hybrid_query(dense, lexical, "q", mode="unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from config import _send_request, make_api_request_async, stream_api_request
+from llm_health import LLMHealthMonitor
+from rate_limiter import estimate_tokens
+
+MESSAGES = [{"role": "user", "content": "周某某的主诉是什么？"}]
+
+ENDPOINTS = {
+    "primary": {"base_url": "https://primary/v1", "api_key": "k1"},
+    "backup": {"base_url": "https://backup/v1", "api_key": "k2"}
+}
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.settled = []
+
+    def acquire(self, tokens=0, on_wait=None):
+        return 0.0
+
+    async def acquire_async(self, tokens=0, on_wait=None):
+        return 0.0
+
+    def settle(self, reserved, actual):
+        self.settled.append((reserved, actual))
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class FakeStream:
+    def __init__(self, items):
+        self.items = items
+        self.closed = False
+
+    def __iter__(self):
+        for item in self.items:
+            if isinstance(item, Exception):
+                raise item
+            yield chunk(item)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    def __init__(self, base_url, api_key, result):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.result = result
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **params):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeAsyncClient(FakeClient):
+    async def create(self, **params):
+        return super().create(**params)
+
+
+class TestStreamApiRequest(unittest.TestCase):
+    def setUp(self):
+        self.limiter = RecordingLimiter()
+        self.monitor = LLMHealthMonitor(ENDPOINTS, failure_threshold=1)
+        patches = [
+            mock.patch("rate_limiter.get_rate_limiter", return_value=self.limiter),
+            mock.patch("llm_health.get_llm_health_monitor", return_value=self.monitor)
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def client(self, result):
+        return FakeClient("https://primary/v1", "k1", result)
+
+    def test_failure_without_output_refunds_like_send_request(self):
+        error = ValueError("bad request")
+        with self.assertRaises(ValueError):
+            list(stream_api_request(self.client(error), "m", MESSAGES, max_tokens=100))
+        with self.assertRaises(ValueError):
+            _send_request(self.client(error), "m", MESSAGES, 0.1, 100)
+        self.assertEqual([actual for _, actual in self.limiter.settled], [0, 0])
+
+    def test_early_close_settles_and_records(self):
+        stream = FakeStream(["头晕", "3天", "伴呕吐"])
+        generator = stream_api_request(self.client(stream), "m", MESSAGES, max_tokens=100)
+        self.assertEqual(next(generator), "头晕")
+        generator.close()
+        self.assertTrue(stream.closed)
+        # 只计提示词和已输出的 "头晕"，退还其余回答预算
+        ((reserved, actual),) = self.limiter.settled
+        self.assertEqual(reserved - actual, 100 - estimate_tokens("头晕"))
+        self.assertEqual(self.monitor.get_stats()["primary"]["state"], "closed")
+        self.assertIsNotNone(self.monitor.get_stats()["primary"]["last_checked"])
+
+    def test_completed_stream_settles_once(self):
+        answer = "".join(stream_api_request(self.client(FakeStream(["头晕", "3天"])), "m", MESSAGES, max_tokens=100))
+        self.assertEqual(answer, "头晕3天")
+        ((reserved, actual),) = self.limiter.settled
+        self.assertEqual(reserved - actual, 100 - estimate_tokens("头晕3天"))
+
+    def test_async_request_settles_and_records(self):
+        response = SimpleNamespace(usage=SimpleNamespace(total_tokens=30))
+        client = FakeAsyncClient("https://primary/v1", "k1", response)
+        self.assertIs(asyncio.run(make_api_request_async(client, "m", MESSAGES, max_tokens=100)), response)
+        failing = FakeAsyncClient("https://primary/v1", "k1", ValueError("bad request"))
+        with self.assertRaises(ValueError):
+            asyncio.run(make_api_request_async(failing, "m", MESSAGES, max_tokens=100))
+        self.assertEqual([actual for _, actual in self.limiter.settled], [30, 0])
+        self.assertIsNotNone(self.monitor.get_stats()["primary"]["last_checked"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "cache.sqlite3")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_hit_miss_and_persistence(self):
+        cache = EmbeddingCache(self.path)
+        key = cache.make_key("model", "v1", "脑梗死")
+        self.assertNotEqual(key, cache.make_key("model", "v2", "脑梗死"))
+        self.assertEqual(cache.get_many([key]), {})
+        cache.put_many([(key, np.array([0.5, 0.25], dtype=np.float32))], encode_seconds=2.0)
+        self.assertEqual(cache.get_many([key, key])[key].tolist(), [0.5, 0.25])
+
+        stats = cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (2, 1, 1))
+        self.assertEqual(stats["saved_seconds"], 4.0)
+
+        reopened = EmbeddingCache(self.path)
+        self.assertEqual(reopened.get_stats()["entries"], 1)
+        self.assertIn(key, reopened.get_many([key]))
+
+    def test_lru_eviction(self):
+        cache = EmbeddingCache(self.path, max_entries=2)
+        vector = np.zeros(4, dtype=np.float32)
+        cache.put_many([("a", vector)])
+        time.sleep(0.01)
+        cache.put_many([("b", vector)])
+        time.sleep(0.01)
+        cache.get_many(["a"])  # 访问 a，b 成为最久未访问
+        time.sleep(0.01)
+        cache.put_many([("c", vector)])
+        self.assertEqual(set(cache.get_many(["a", "b", "c"])), {"a", "c"})
+        self.assertEqual(cache.get_stats()["evictions"], 1)
+
+    def test_byte_limit(self):
+        cache = EmbeddingCache(self.path, max_bytes=3 * 16)
+        cache.put_many([(str(i), np.zeros(4, dtype=np.float32)) for i in range(5)])
+        stats = cache.get_stats()
+        self.assertLessEqual(stats["bytes"], 3 * 16)
+        cache.clear()
+        self.assertEqual(cache.get_stats()["entries"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
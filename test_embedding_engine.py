@@ -0,0 +1,69 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+from embedding_engine import cast_embeddings, encode_texts, iter_embeddings
+
+
+class FakeModel:
+    """向量第一维为文本长度，记录每批收到的文本"""
+    def __init__(self):
+        self.batches = []
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+    def encode(self, batch, batch_size, convert_to_numpy, normalize_embeddings, show_progress_bar):
+        self.batches.append(list(batch))
+        vectors = np.array([[len(text), 1.0] for text in batch], dtype=np.float32)
+        if normalize_embeddings:
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors
+
+
+class TestEmbeddingEngine(unittest.TestCase):
+    def setUp(self):
+        # 预处理只按空格切分，测试不依赖 jieba 的分词结果
+        patcher = mock.patch("embedding_engine.preprocess_texts", side_effect=lambda texts: list(texts))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bucketing_keeps_input_order(self):
+        model = FakeModel()
+        texts = ["aaaa", "a", "aaa", "aa"]
+        vectors = encode_texts(texts, batch_size=2, normalize=False, model=model)
+        # 按长度分桶编码，输出仍按输入顺序
+        self.assertEqual(model.batches, [["a", "aa"], ["aaa", "aaaa"]])
+        self.assertEqual(vectors[:, 0].tolist(), [4, 1, 3, 2])
+
+    def test_normalize_and_dtypes(self):
+        vectors = encode_texts(["abc"], normalize=True, model=FakeModel())
+        self.assertAlmostEqual(float(np.linalg.norm(vectors[0])), 1.0, places=5)
+        self.assertEqual(encode_texts(["abc"], dtype="float16", model=FakeModel()).dtype, np.float16)
+        quantized = cast_embeddings(np.array([[1.0, -1.0, 0.5]], dtype=np.float32), "int8")
+        self.assertEqual(quantized.tolist(), [[127, -127, 64]])
+        with self.assertRaises(ValueError):
+            cast_embeddings(vectors, "int4")
+
+    def test_iter_embeddings_windows(self):
+        windows = list(iter_embeddings(["a", "bb", "ccc"], window_size=2, normalize=False, model=FakeModel()))
+        self.assertEqual([window for window, _ in windows], [["a", "bb"], ["ccc"]])
+        self.assertEqual(windows[1][1][:, 0].tolist(), [3])
+
+    def test_cache_skips_encoded_texts(self):
+        cache = EmbeddingCache(":memory:")
+        model = FakeModel()
+        with mock.patch("embedding_engine.get_embedding_cache", return_value=cache), \
+                mock.patch("embedding_engine.get_sentence_transformer", return_value=model):
+            first = encode_texts(["ab", "ab", "abc"], normalize=False)
+            second = encode_texts(["abc", "abcd"], normalize=False)
+        # 重复文本和已缓存文本都不再编码
+        self.assertEqual(model.batches, [["ab", "abc"], ["abcd"]])
+        self.assertEqual(first[:, 0].tolist(), [2, 2, 3])
+        self.assertEqual(second[:, 0].tolist(), [3, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
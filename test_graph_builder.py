@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from graph_builder import update_graph_from_mongodb
+from graph_store import GraphStore
+
+
+class FakeCursor(list):
+    def batch_size(self, size):
+        self.size = size
+        return self
+
+
+class FakeCollection:
+    """只实现 graph_builder 用到的 find：投影和 患者姓名 $in 查询"""
+    def __init__(self, docs):
+        self.docs = docs
+        self.full_reads = 0
+
+    def find(self, query=None, projection=None):
+        docs = self.docs
+        names = (query or {}).get("患者姓名", {}).get("$in")
+        if names is not None:
+            docs = [doc for doc in docs if doc.get("患者姓名") in names]
+        elif projection is None:
+            self.full_reads += 1
+        return FakeCursor(dict(doc) for doc in docs)
+
+
+class FakeDB:
+    def __init__(self, docs):
+        self.patients = FakeCollection(docs)
+
+
+def patient_doc(doc_id, name, diagnosis, updated):
+    return {"_id": doc_id, "患者姓名": name, "诊断": diagnosis, "性别": "男",
+            "生化指标": {"肌酐": "329.5"}, "metadata": {"last_updated": updated}}
+
+
+class TestGraphBuilder(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.graph_file = os.path.join(self.dir, "graph.gexf")
+        self.state_file = os.path.join(self.dir, "state.json")
+        self.db = FakeDB([
+            patient_doc(1, "马某某", "脑梗死", "2024-01-01"),
+            patient_doc(2, "周某某", "肾衰竭", "2024-01-01"),
+        ])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def update(self):
+        return update_graph_from_mongodb(self.db, self.graph_file, self.state_file, batch_size=1, warn=self.fail)
+
+    def test_incremental_update(self):
+        stats = self.update()
+        self.assertTrue(stats["full"])
+        self.assertEqual(stats["added"], 2)
+
+        stats = self.update()
+        self.assertFalse(stats["full"])
+        self.assertEqual(stats["unchanged"], 2)
+        self.assertEqual(self.db.patients.full_reads, 1)
+
+        docs = self.db.patients.docs
+        docs[0] = patient_doc(1, "马某某", "脑出血", "2024-02-01")
+        del docs[1]
+        docs.append(patient_doc(3, "李某某", "高血压", "2024-02-01"))
+        stats = self.update()
+        self.assertEqual((stats["added"], stats["updated"], stats["removed"], stats["unchanged"]), (1, 1, 1, 0))
+        self.assertEqual(self.db.patients.full_reads, 1)
+
+        G = GraphStore(self.graph_file).graph
+        self.assertIn("诊断_脑出血_马某某", G)
+        self.assertNotIn("诊断_脑梗死_马某某", G)
+        self.assertFalse(any("周某某" in node for node in G))
+        self.assertIn("生化指标_肌酐_329.5_李某某", G)
+        self.assertEqual(stats["nodes"], G.number_of_nodes())
+
+    def test_rebuilds_when_graph_rewritten_elsewhere(self):
+        self.update()
+        os.remove(self.graph_file)
+        stats = self.update()
+        self.assertTrue(stats["full"])
+        self.assertTrue(os.path.exists(self.graph_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import operator
+import unittest
+
+from graph_cypher import Neo4jGraphQueryEngine, compile_query
+from graph_query_engine import match_predicate
+from neo4j_sync import node_properties
+
+
+class FakeSummary:
+    result_available_after = 3
+    result_consumed_after = 1
+
+
+class FakeResult:
+    def __init__(self, records):
+        self.records = records
+
+    def data(self):
+        return self.records
+
+    def consume(self):
+        return FakeSummary()
+
+
+class FakeDriver:
+    """返回预置记录，并记录收到的 Cypher 和参数"""
+    def __init__(self, records):
+        self.records = records
+        self.queries = []
+
+    def session(self, database=None):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute_read(self, work):
+        return work(self)
+
+    def run(self, cypher, **params):
+        self.queries.append((cypher, params))
+        return FakeResult(self.records)
+
+
+MULTI_PATTERN = {
+    "match": [
+        {"path": [{"var": "p", "type": "patient"}, "has_diagnosis",
+                  {"var": "d", "type": "diagnosis", "where": {"content": {"$contains": "脑梗死"}}}]},
+        {"path": [{"var": "p"}, {"type": "has_lab_result"},
+                  {"var": "l", "type": "lab_result", "where": {"indicator_value": {"$gt": 133}}}]}
+    ],
+    "return": ["p.name", "l.indicator_value"],
+    "limit": 5
+}
+
+LEGACY = {
+    "start_node": {"type": "patient", "name": "周某某"},
+    "relationship": "has_chief_complaint",
+    "end_node": {"type": "chief_complaint"},
+    "return": ["end_node.content"]
+}
+
+
+class TestGraphCypher(unittest.TestCase):
+    def test_compile_multi_pattern(self):
+        cypher, params, _ = compile_query(MULTI_PATTERN)
+        self.assertIn("MATCH (`p`:`patient`)-[:`HAS_DIAGNOSIS`]-(`d`:`diagnosis`)", cypher)
+        self.assertIn("MATCH (`p`)-[:`HAS_LAB_RESULT`]-(`l`:`labresult`)", cypher)
+        self.assertIn("CONTAINS $p0", cypher)
+        self.assertIn("`l`.`indicator_value__number` > $p1", cypher)
+        self.assertIn("RETURN DISTINCT `p`.id AS c0, `l`.`indicator_value` AS c1", cypher)
+        self.assertEqual(params, {"p0": "脑梗死", "p1": 133.0, "p2": 5})
+        # 用户输入只通过参数传递
+        self.assertNotIn("脑梗死", cypher)
+
+    def test_compile_legacy_with_bindings(self):
+        cypher, params, output = compile_query(LEGACY, with_bindings=True)
+        self.assertIn("`start_node`.id IN $p0", cypher)
+        self.assertIn("type(`relationship`) AS `relationship__type`", cypher)
+        self.assertEqual(params["p0"], ["周某某"])
+        self.assertEqual(output["node_vars"], ["start_node", "end_node"])
+
+    def test_numeric_comparison_parity(self):
+        # Neo4j 比较同步时写入的数值属性，结果应与本地引擎对原始字符串的比较一致
+        comparators = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+        for value in ["329.5", "329.5μmol/L", "329.5 μmol/L↑", "<5", "偏高", "", 42]:
+            number = node_properties("l", {"indicator_value": value}).get("indicator_value__number")
+            for op, compare in comparators.items():
+                for expected in (5, 133, 400):
+                    neo4j = number is not None and compare(number, float(expected))
+                    self.assertEqual(neo4j, match_predicate(value, {op: expected}), (value, op, expected))
+
+    def test_execute_rows(self):
+        driver = FakeDriver([{"c0": "马某某", "c1": "329.5"}])
+        result = Neo4jGraphQueryEngine(driver, database="neo4j").execute(MULTI_PATTERN)
+        self.assertEqual(result.rows, [{"p.name": "马某某", "l.indicator_value": "329.5"}])
+        self.assertEqual(result.report["backend"], "neo4j")
+        self.assertEqual(result.report["server_ms"], 4.0)
+
+    def test_execute_legacy_bindings(self):
+        driver = FakeDriver([{
+            "start_node": "周某某", "start_node__props": {"id": "周某某"}, "start_node__labels": ["patient"],
+            "end_node": "主诉_周某某",
+            "end_node__props": {"id": "主诉_周某某", "content": "头晕3天", "content__number": 3.0},
+            "end_node__labels": ["chiefcomplaint"],
+            "relationship__type": "HAS_CHIEF_COMPLAINT", "relationship__props": {}
+        }])
+        result = Neo4jGraphQueryEngine(driver, database="neo4j").execute(LEGACY)
+        binding = result.bindings[0]
+        self.assertEqual(binding["relationship"]["edge_type"], "has_chief_complaint")
+        # 同步时附加的数值属性不出现在结果中
+        self.assertEqual(result.node(binding["end_node"]), {"content": "头晕3天", "node_type": "chief_complaint"})
+        self.assertEqual(result.rows, [{"end_node.content": "头晕3天"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
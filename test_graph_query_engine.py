@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+
+from graph_query_engine import GraphQueryEngine, format_rows, match_predicate
+from graph_store import GraphStore
+
+
+def build_graph():
+    G = nx.Graph()
+    patients = [
+        ("马某某", "多发性脑梗死", "329.5↑"),
+        ("周某某", "脑梗死", "88"),
+        ("李某某", "高血压", "410"),
+    ]
+    for name, diagnosis, creatinine in patients:
+        G.add_node(name, node_type="patient")
+        G.add_node(f"诊断_{diagnosis}_{name}", node_type="diagnosis", content=diagnosis)
+        G.add_edge(name, f"诊断_{diagnosis}_{name}", edge_type="has_diagnosis")
+        lab = f"生化指标_肌酐_{creatinine}_{name}"
+        G.add_node(lab, node_type="lab_result", indicator_name="肌酐", indicator_value=creatinine)
+        G.add_edge(name, lab, edge_type="has_lab_result")
+    return G
+
+
+class TestGraphQueryEngine(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        path = os.path.join(self.dir, "graph.gexf")
+        nx.write_gexf(build_graph(), path)
+        self.engine = GraphQueryEngine(GraphStore(path))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_predicates(self):
+        self.assertTrue(match_predicate("329.5↑", {"$gt": 133}))
+        self.assertFalse(match_predicate("阴性", {"$gt": 133}))
+        self.assertTrue(match_predicate("多发性脑梗死", {"$contains": "脑梗死", "$ne": "脑梗死"}))
+        self.assertTrue(match_predicate("男", {"$in": ["男", "女"]}))
+
+    def test_multi_pattern_join(self):
+        result = self.engine.execute({
+            "match": [
+                {"path": [{"var": "p", "type": "patient"}, "has_diagnosis",
+                          {"var": "d", "type": "diagnosis", "where": {"content": {"$contains": "脑梗死"}}}]},
+                {"path": [{"var": "p"}, "has_lab_result",
+                          {"var": "l", "type": "lab_result", "where": {"indicator_value": {"$gt": 133}}}]}
+            ],
+            "return": ["p.name", "d.content", "l.indicator_value"]
+        })
+        self.assertEqual(result.rows, [{"p.name": "马某某", "d.content": "多发性脑梗死", "l.indicator_value": "329.5↑"}])
+        self.assertEqual(len(result.report["patterns"]), 2)
+        self.assertIn("p.name: 马某某", format_rows(result)[0])
+
+    def test_disconnected_patterns_rejected(self):
+        with self.assertRaises(ValueError):
+            self.engine.execute({
+                "match": [
+                    [{"var": "p", "type": "patient"}, "has_diagnosis", {"var": "d", "type": "diagnosis"}],
+                    [{"var": "q", "type": "patient"}, "has_lab_result", {"var": "l", "type": "lab_result"}]
+                ],
+                "return": ["p", "l"]
+            })
+        # 通过第三个模式连起来即可执行，且每一步连接都有共享变量
+        result = self.engine.execute({
+            "match": [
+                [{"var": "p", "type": "patient"}, "has_diagnosis", {"var": "d", "type": "diagnosis"}],
+                [{"var": "l", "type": "lab_result", "name": "生化指标_肌酐_410_李某某"}, "has_lab_result",
+                 {"var": "q", "type": "patient"}],
+                [{"var": "p"}, "has_lab_result", {"var": "l"}]
+            ],
+            "return": ["p", "d.content"]
+        })
+        self.assertEqual(result.rows, [{"p": "李某某", "d.content": "高血压"}])
+
+    def test_two_hop_with_multiple_starts(self):
+        # 从诊断节点出发经患者到生化指标的两跳路径
+        result = self.engine.execute({
+            "match": [[{"var": "d", "type": "diagnosis",
+                        "name": ["诊断_脑梗死_周某某", "诊断_高血压_李某某"]},
+                       "has_diagnosis", {"var": "p", "type": "patient"},
+                       "has_lab_result", {"var": "l", "type": "lab_result"}]],
+            "return": ["p", "l.indicator_value"]
+        })
+        self.assertEqual(sorted(row["p"] for row in result.rows), ["周某某", "李某某"])
+        self.assertEqual(result.report["patterns"][0]["anchor"], "d")
+
+    def test_legacy_query(self):
+        result = self.engine.execute({
+            "start_node": {"type": "patient", "name": "周某某"},
+            "relationship": "has_lab_result",
+            "end_node": {"type": "lab_result"},
+            "return": ["end_node.indicator_value"]
+        })
+        self.assertEqual(len(result.bindings), 1)
+        self.assertEqual(result.bindings[0]["start_node"], "周某某")
+        self.assertEqual(result.bindings[0]["relationship"]["edge_type"], "has_lab_result")
+        self.assertEqual(result.rows, [{"end_node.indicator_value": "88"}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+
+from graph_snapshot import GraphSnapshot, save_graph, snapshot_path_for, synthetic_graph, write_snapshot
+from graph_store import GraphStore
+
+
+class TestGraphSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_round_trip(self):
+        G = synthetic_graph(5)
+        path = os.path.join(self.dir, "g.snapshot")
+        write_snapshot(G, path)
+        snapshot = GraphSnapshot(path)
+
+        restored = snapshot.to_networkx()
+        self.assertEqual(set(restored.nodes), set(G.nodes))
+        self.assertEqual({frozenset(e) for e in restored.edges}, {frozenset(e) for e in G.edges})
+        self.assertEqual(restored.nodes["主诉_患者000001"], G.nodes["主诉_患者000001"])
+
+        self.assertEqual(sorted(snapshot.nodes_by_type("patient")), [f"患者{i:06d}" for i in range(5)])
+        self.assertEqual(snapshot.node_attrs("患者000003"), {"node_type": "patient"})
+        self.assertIsNone(snapshot.node_attrs("不存在"))
+        complaints = snapshot.neighbors("患者000002", "has_complaint")
+        self.assertEqual([n for n, _ in complaints], ["主诉_患者000002"])
+        self.assertEqual(snapshot.neighbors("主诉_患者000002")[0][0], "患者000002")
+
+    def test_attribute_types_and_gexf_labels(self):
+        G = nx.Graph()
+        G.add_node("马某某", node_type="patient", age=67, weight=58.5, inpatient=True)
+        G.add_node("肌酐", node_type="lab_result", label="Cr", value="329.5")
+        G.add_edge("马某某", "肌酐", edge_type="has_lab_result", order=2)
+        graph_file = os.path.join(self.dir, "g.gexf")
+        save_graph(G, graph_file)
+
+        snapshot = GraphSnapshot(snapshot_path_for(graph_file))
+        restored = snapshot.to_networkx()
+        # 与解析 GEXF 得到的节点属性（含 read_gexf 补上的 label）完全一致
+        parsed = nx.read_gexf(graph_file)
+        self.assertEqual(dict(restored.nodes(data=True)), dict(parsed.nodes(data=True)))
+        self.assertIs(restored.nodes["马某某"]["inpatient"], True)
+        self.assertEqual(snapshot.node_attrs("马某某")["age"], 67)
+        self.assertEqual(snapshot.neighbors("肌酐")[0][1]["order"], 2)
+
+    def test_rewrite_swaps_directory(self):
+        path = os.path.join(self.dir, "g.snapshot")
+        write_snapshot(synthetic_graph(2), path)
+        write_snapshot(synthetic_graph(3), path)
+        self.assertEqual(GraphSnapshot(path).meta["nodes"], synthetic_graph(3).number_of_nodes())
+        # 临时目录和换下的旧目录都已清理
+        self.assertEqual(os.listdir(self.dir), ["g.snapshot"])
+
+    def test_store_prefers_matching_snapshot(self):
+        graph_file = os.path.join(self.dir, "g.gexf")
+        save_graph(synthetic_graph(3), graph_file)
+        store = GraphStore(graph_file)
+        self.assertEqual(len(store.nodes_by_type("patient")), 3)
+        self.assertEqual(store.get_stats()["source"], "snapshot")
+
+        # GEXF 被其他工具改写后快照过期，退回解析 GEXF
+        nx.write_gexf(synthetic_graph(4), graph_file)
+        store.invalidate()
+        self.assertEqual(len(store.nodes_by_type("patient")), 4)
+        self.assertEqual(store.get_stats()["source"], "gexf")
+        self.assertTrue(os.path.isdir(snapshot_path_for(graph_file)))
+
+
+if __name__ == '__main__':
+    unittest.main()
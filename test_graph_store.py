@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import networkx as nx
+
+from graph_store import GraphStore
+
+
+def build_graph():
+    G = nx.Graph()
+    G.add_node("马某某", node_type="patient")
+    G.add_node("主诉_马某某", node_type="chief_complaint", content="意识模糊 3 天")
+    G.add_node("生化指标_肌酐_329.5_马某某", node_type="lab_result", indicator_name="肌酐", indicator_value="329.5")
+    G.add_edge("马某某", "主诉_马某某", edge_type="has_complaint")
+    G.add_edge("马某某", "生化指标_肌酐_329.5_马某某", edge_type="has_lab_result")
+    return G
+
+
+class TestGraphStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "graph.gexf")
+        nx.write_gexf(build_graph(), self.path)
+        self.store = GraphStore(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_indexed_match(self):
+        matches = self.store.match("patient", "马某某", "has_lab_result", "lab_result")
+        self.assertEqual([m[1]["indicator_name"] for m in matches], ["肌酐"])
+        self.assertEqual(self.store.match("patient", "马某某", "has_lab_result", "diagnosis"), [])
+        self.assertEqual(self.store.match("patient", "周某某", "has_complaint", "chief_complaint"), [])
+        # 无向图两个方向都可以查
+        self.assertEqual(self.store.neighbors("主诉_马某某", "has_complaint")[0][0], "马某某")
+        self.assertEqual(self.store.nodes_by_type("patient"), ["马某某"])
+
+    def test_reload_only_when_file_changes(self):
+        self.store.schema()
+        self.store.match("patient", "马某某", "has_complaint", "chief_complaint")
+        self.assertEqual(self.store.get_stats()["loads"], 1)
+
+        G = build_graph()
+        G.add_node("周某某", node_type="patient")
+        nx.write_gexf(G, self.path)
+        self.store.invalidate()
+        self.assertEqual(sorted(self.store.nodes_by_type("patient")), ["周某某", "马某某"])
+        self.assertEqual(self.store.get_stats()["loads"], 2)
+        self.assertIn("has_lab_result", self.store.schema()["relationships"])
+
+        os.remove(self.path)
+        self.assertIsNone(self.store.graph)
+        self.assertEqual(self.store.nodes_by_type("patient"), [])
+
+    def test_match_uses_one_graph_version(self):
+        store = self.store
+        store.nodes_by_type("patient")
+        path = self.path
+
+        class ReloadingNeighbors(list):
+            """遍历邻居时图文件被替换并重新加载（模拟另一个会话触发的重载）"""
+            def __iter__(self):
+                G = build_graph()
+                G.remove_node("生化指标_肌酐_329.5_马某某")
+                nx.write_gexf(G, path)
+                store.invalidate()
+                store.nodes_by_type("patient")
+                return super().__iter__()
+
+        key = ("马某某", "has_lab_result")
+        store._adjacency[key] = ReloadingNeighbors(store._adjacency[key])
+        matches = store.match("patient", "马某某", "has_lab_result", "lab_result")
+        self.assertEqual([m[1]["indicator_name"] for m in matches], ["肌酐"])
+        self.assertEqual(store.match("patient", "马某某", "has_lab_result", "lab_result"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import unittest
+
+from llm_client_pool import OpenAIClientPool
+
+
+class FakeClient:
+    def __init__(self, base_url, api_key, timeout, config):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestLLMClientPool(unittest.TestCase):
+    def test_reuse_by_endpoint_and_key(self):
+        pool = OpenAIClientPool({"timeout": 30}, client_factory=FakeClient, async_client_factory=FakeClient)
+        first = pool.get("https://openrouter.ai/api/v1", "k1")
+        self.assertIs(pool.get("https://openrouter.ai/api/v1/", "k1"), first)
+        self.assertIsNot(pool.get("https://openrouter.ai/api/v1", "k2"), first)
+        self.assertEqual(first.timeout, 30)
+        self.assertEqual(pool.get_stats(), {"clients": 2, "async_loops": 0, "created": 2, "hits": 1})
+
+        pool.close()
+        self.assertTrue(first.closed)
+        self.assertIsNot(pool.get("https://openrouter.ai/api/v1", "k1"), first)
+
+    def test_concurrent_get_creates_one_client(self):
+        pool = OpenAIClientPool(client_factory=FakeClient)
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(pool.get("https://x/v1", "k")))
+                   for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len({id(client) for client in clients}), 1)
+        self.assertEqual(pool.get_stats()["created"], 1)
+
+    def test_async_clients_per_event_loop(self):
+        pool = OpenAIClientPool(client_factory=FakeClient, async_client_factory=FakeClient)
+
+        async def get_twice():
+            return pool.get_async("https://x/v1", "k"), pool.get_async("https://x/v1", "k")
+
+        first, second = asyncio.run(get_twice())
+        self.assertIs(first, second)
+        # 新的事件循环不复用旧循环上的连接
+        third, _ = asyncio.run(get_twice())
+        self.assertIsNot(third, first)
+
+
+if __name__ == '__main__':
+    unittest.main()
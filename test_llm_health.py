@@ -0,0 +1,96 @@
+import unittest
+
+from llm_health import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, LLMHealthMonitor, is_endpoint_failure
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FakeClient:
+    def __init__(self, base_url, api_key):
+        self.base_url = base_url + "/"
+        self.api_key = api_key
+
+
+ENDPOINTS = {
+    "primary": {"base_url": "https://primary/v1", "api_key": "k1"},
+    "backup": {"base_url": "https://backup/v1", "api_key": "k2"}
+}
+
+
+class TestLLMHealth(unittest.TestCase):
+    def test_failure_classification(self):
+        self.assertTrue(is_endpoint_failure(StatusError(503)))
+        self.assertTrue(is_endpoint_failure(StatusError(429)))
+        self.assertTrue(is_endpoint_failure(ConnectionResetError()))
+        self.assertFalse(is_endpoint_failure(StatusError(400)))
+        self.assertFalse(is_endpoint_failure(ValueError("bad json")))
+
+    def test_breaker_states(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30, clock=clock)
+        breaker.record_failure("timeout")
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record_failure("timeout")
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow_request())
+
+        clock.now = 31
+        self.assertTrue(breaker.available())
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, HALF_OPEN)
+        # 半开状态只放行一个试探请求
+        self.assertFalse(breaker.allow_request())
+        breaker.record_failure("still down")
+        self.assertEqual(breaker.state, OPEN)
+
+        clock.now = 62
+        self.assertTrue(breaker.allow_request())
+        breaker.record_success(0.2)
+        self.assertEqual(breaker.snapshot()["state"], CLOSED)
+
+    def test_probe_and_failover_selection(self):
+        clock = FakeClock()
+        down = {"primary"}
+
+        def probe(config, timeout):
+            if config is ENDPOINTS["primary"] and "primary" in down:
+                raise StatusError(502)
+
+        monitor = LLMHealthMonitor(ENDPOINTS, probe=probe, failure_threshold=2, recovery_timeout=30, clock=clock)
+        self.assertEqual(monitor.select_endpoint(), "primary")
+        self.assertEqual(monitor.probe_all(), {"primary": False, "backup": True})
+        monitor.probe_all()
+        self.assertEqual(monitor.select_endpoint(), "backup")
+        self.assertEqual(monitor.fallback_for("primary"), "backup")
+        self.assertIsNone(monitor.fallback_for("backup"))
+
+        # 端点恢复后，下一轮探测即关闭熔断
+        down.clear()
+        monitor.probe_all()
+        self.assertEqual(monitor.select_endpoint(), "primary")
+        self.assertEqual(monitor.endpoint_of(FakeClient("https://backup/v1", "k2")), "backup")
+        self.assertIsNone(monitor.endpoint_of(FakeClient("https://other/v1", "k2")))
+
+    def test_all_open(self):
+        clock = FakeClock()
+        monitor = LLMHealthMonitor(ENDPOINTS, failure_threshold=1, clock=clock)
+        monitor.record_failure("primary", "down")
+        monitor.record_failure("backup", "down")
+        self.assertFalse(monitor.any_available())
+        self.assertEqual(monitor.select_endpoint(), "primary")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from llm_stream import CONTINUE_PROMPT, AnswerStreamError, continuation_messages, stream_answer
+
+MESSAGES = [{"role": "user", "content": "周某某的主诉是什么？"}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyStream:
+    """按预设脚本产出片段；脚本中的异常在该位置抛出，模拟流中断"""
+    def __init__(self, clock, *attempts):
+        self.clock = clock
+        self.attempts = list(attempts)
+        self.received = []
+
+    def __call__(self, messages):
+        self.received.append(messages)
+        script = self.attempts.pop(0)
+        for item in script:
+            self.clock.now += 0.5
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+
+class TestLLMStream(unittest.TestCase):
+    def test_streams_and_records_ttft(self):
+        clock = FakeClock()
+        shown = []
+        answer, stats = stream_answer(FlakyStream(clock, ["头晕", "3天"]), MESSAGES,
+                                      on_text=shown.append, clock=clock, sleep=lambda _: None)
+        self.assertEqual(answer, "头晕3天")
+        self.assertEqual(shown, ["头晕", "头晕3天"])
+        self.assertEqual(stats["ttft_seconds"], 0.5)
+        self.assertEqual(stats["total_seconds"], 1.0)
+        self.assertEqual((stats["attempts"], stats["resumed"]), (1, 0))
+
+    def test_resume_after_interruption(self):
+        clock = FakeClock()
+        stream = FlakyStream(clock, ["头晕", ConnectionError("reset")], ["3天"])
+        retries = []
+        answer, stats = stream_answer(stream, MESSAGES, on_retry=lambda n, e: retries.append(n),
+                                      clock=clock, sleep=lambda _: None)
+        self.assertEqual(answer, "头晕3天")
+        self.assertEqual(retries, [1])
+        self.assertEqual((stats["attempts"], stats["resumed"]), (2, 1))
+        # 第二次请求带上已生成的部分，请模型接着写
+        self.assertEqual(stream.received[1][-2], {"role": "assistant", "content": "头晕"})
+        self.assertEqual(stream.received[1][-1]["content"], CONTINUE_PROMPT)
+
+    def test_retries_exhausted_keeps_partial(self):
+        clock = FakeClock()
+        stream = FlakyStream(clock, [TimeoutError("t1")], ["头晕", TimeoutError("t2")])
+        with self.assertRaises(AnswerStreamError) as ctx:
+            stream_answer(stream, MESSAGES, max_retries=2, clock=clock, sleep=lambda _: None)
+        self.assertEqual(ctx.exception.partial_answer, "头晕")
+        self.assertIsInstance(ctx.exception.__cause__, TimeoutError)
+        self.assertEqual(continuation_messages(MESSAGES, ""), MESSAGES)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from local_vector_store import LocalVectorIndex, VectorIndexBackend
+
+
+class TestLocalVectorIndex(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.index = LocalVectorIndex(self.path, dimension=4)
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _upsert_basis(self):
+        vectors = []
+        for i in range(4):
+            values = np.zeros(4)
+            values[i] = 1.0
+            vectors.append({
+                'id': f"v{i}",
+                'values': values.tolist(),
+                'metadata': {'text': f"文本{i}", 'chunk_index': i}
+            })
+        self.index.upsert(vectors=vectors)
+
+    def test_query_returns_nearest_first(self):
+        self._upsert_basis()
+        results = self.index.query(vector=[0.1, 0.9, 0, 0], top_k=2, include_metadata=True)
+        self.assertEqual([m['id'] for m in results['matches']], ["v1", "v0"])
+        self.assertEqual(results['matches'][0]['metadata']['text'], "文本1")
+        self.assertAlmostEqual(results['matches'][0]['score'], 0.9 / np.sqrt(0.82), places=5)
+
+    def test_upsert_same_id_replaces(self):
+        self._upsert_basis()
+        self.index.upsert(vectors=[{'id': "v0", 'values': [0, 0, 0, 1], 'metadata': {'text': "新"}}])
+        self.assertEqual(self.index.describe_index_stats().total_vector_count, 4)
+        results = self.index.query(vector=[0, 0, 0, 1], top_k=2, include_metadata=True)
+        self.assertEqual({m['id'] for m in results['matches']}, {"v0", "v3"})
+        self.assertNotIn('chunk_index', self.index.fetch(["v0"]).vectors["v0"]['metadata'])
+
+    def test_delete_keeps_rows_consistent(self):
+        self._upsert_basis()
+        self.index.delete(ids=["v1"])
+        results = self.index.query(vector=[0, 0, 0, 1], top_k=1, include_metadata=True)
+        self.assertEqual(results['matches'][0]['id'], "v3")
+        self.assertEqual(results['matches'][0]['metadata']['text'], "文本3")
+        self.index.delete(delete_all=True)
+        self.assertEqual(self.index.describe_index_stats().total_vector_count, 0)
+
+    def test_filter_ranks_only_matching_rows(self):
+        self._upsert_basis()
+        self.index.upsert(vectors=[
+            {'id': "p0", 'values': [0, 0, 0.2, 1], 'metadata': {'text': "甲", 'patient_name': "周某某"}},
+            {'id': "p1", 'values': [1, 0, 0, 0.1], 'metadata': {'text': "乙", 'patient_name': "马某某"}},
+            {'id': "p2", 'values': [0, 1, 0, 0], 'metadata': {'text': "丙", 'patient_name': "周某某",
+                                                             'record_date': "2024-06-18"}}
+        ])
+        results = self.index.query(vector=[0, 1, 0, 0.1], top_k=5, include_metadata=True,
+                                   filter={"patient_name": {"$eq": "周某某"}})
+        self.assertEqual([m['id'] for m in results['matches']], ["p2", "p0"])
+
+        results = self.index.query(vector=[1, 0, 0, 0], top_k=5,
+                                   filter={"patient_name": {"$in": ["周某某", "马某某"]},
+                                           "record_date": "2024-06-18"})
+        self.assertEqual([m['id'] for m in results['matches']], ["p2"])
+
+        self.index.delete(ids=["p0"])
+        self.index.upsert(vectors=[{'id': "p2", 'values': [0, 1, 0, 0], 'metadata': {'text': "丙"}}])
+        results = self.index.query(vector=[1, 0, 0, 0], top_k=5, filter={"patient_name": "周某某"})
+        self.assertEqual(results['matches'], [])
+
+    def test_persistence_round_trip(self):
+        self._upsert_basis()
+        reloaded = LocalVectorIndex(self.path, dimension=4)
+        self.assertEqual(reloaded.describe_index_stats().total_vector_count, 4)
+        results = reloaded.query(vector=[0, 0, 1, 0], top_k=1, include_metadata=True)
+        self.assertEqual(results['matches'][0]['id'], "v2")
+        reloaded.upsert(vectors=[{'id': "v4", 'values': [1, 1, 0, 0]}])
+        self.assertEqual(reloaded.describe_index_stats().total_vector_count, 5)
+        results = reloaded.query(vector=[1, 0, 0, 0], top_k=5, filter={"original_file_name": "缺失"})
+        self.assertEqual(results['matches'], [])
+
+    def test_writes_append_to_log_until_compaction(self):
+        index = LocalVectorIndex(self.path, dimension=4, compact_min_rows=6)
+        self.index = index
+        self._upsert_basis()
+        index.delete(ids=["v1"])
+        # 单次写入只追加日志，不重写主文件
+        self.assertFalse(os.path.exists(os.path.join(self.path, LocalVectorIndex.VECTORS_FILE)))
+        with open(os.path.join(self.path, LocalVectorIndex.LOG_FILE), "a", encoding="utf-8") as f:
+            f.write('{"id": "torn", "val')  # 写到一半中断的末行
+
+        reloaded = LocalVectorIndex(self.path, dimension=4, compact_min_rows=6)
+        self.assertEqual(sorted(reloaded._ids), ["v0", "v2", "v3"])
+        self.assertEqual(reloaded.fetch(["v3"]).vectors["v3"]['metadata']['text'], "文本3")
+
+        # 日志记录数达到阈值后合并回主文件并清空日志
+        index.upsert(vectors=[{'id': "v4", 'values': [1, 1, 0, 0]}])
+        self.assertTrue(os.path.exists(os.path.join(self.path, LocalVectorIndex.VECTORS_FILE)))
+        self.assertFalse(os.path.exists(os.path.join(self.path, LocalVectorIndex.LOG_FILE)))
+        self.assertEqual(LocalVectorIndex(self.path, dimension=4).describe_index_stats().total_vector_count, 4)
+
+    def test_backend_interface_is_abstract(self):
+        with self.assertRaises(TypeError):
+            VectorIndexBackend()
+
+
+class TestLocalVectorIndexANN(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(20, 16))
+        data = centers[rng.integers(0, 20, 2000)] + 0.1 * rng.normal(size=(2000, 16))
+        self.data = data / np.linalg.norm(data, axis=1, keepdims=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _build(self, pq_m=0):
+        ann_config = {'enabled': True, 'nlist': 20, 'nprobe': 4, 'pq_m': pq_m, 'min_train_size': 1000}
+        index = LocalVectorIndex(self.path, dimension=16, ann_config=ann_config)
+        index.upsert(vectors=[
+            {'id': f"v{i}", 'values': vector.tolist()} for i, vector in enumerate(self.data[:1500])
+        ])
+        return index, ann_config
+
+    def _recall(self, index, queries, top_k=10):
+        hits = 0
+        for query in queries:
+            approx = {m['id'] for m in index.query(vector=query, top_k=top_k)['matches']}
+            exact = {m['id'] for m in index.query(vector=query, top_k=top_k, exact=True)['matches']}
+            hits += len(approx & exact)
+        return hits / (len(queries) * top_k)
+
+    def test_ivf_recall_close_to_exact(self):
+        index, _ = self._build()
+        self.assertGreaterEqual(self._recall(index, self.data[:50]), 0.9)
+
+    def test_ivf_pq_recall_close_to_exact(self):
+        index, _ = self._build(pq_m=4)
+        self.assertGreaterEqual(self._recall(index, self.data[:50]), 0.9)
+
+    def test_incremental_insert_and_reload(self):
+        index, ann_config = self._build()
+        index.upsert(vectors=[
+            {'id': f"v{i}", 'values': vector.tolist()} for i, vector in enumerate(self.data[1500:], start=1500)
+        ])
+        top = index.query(vector=self.data[1999], top_k=1)['matches'][0]
+        self.assertEqual(top['id'], "v1999")
+
+        index.delete(ids=["v0"])
+        reloaded = LocalVectorIndex(self.path, dimension=16, ann_config=ann_config)
+        self.assertEqual(reloaded.describe_index_stats().total_vector_count, 1999)
+        top = reloaded.query(vector=self.data[1999], top_k=1)['matches'][0]
+        self.assertEqual(top['id'], "v1999")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import sys
+import threading
+import time
+import types
+import unittest
+from unittest import mock
+
+from model_registry import ModelRegistry
+
+
+class FakeSentenceTransformer:
+    """记录构造次数的假模型，加载时稍作等待以暴露并发重复加载"""
+    instances = 0
+    lock = threading.Lock()
+
+    def __init__(self, model_name, cache_folder=None, device=None):
+        with FakeSentenceTransformer.lock:
+            FakeSentenceTransformer.instances += 1
+        time.sleep(0.05)
+        self.model_name = model_name
+        self.device = device
+
+    def parameters(self):
+        return []
+
+    def buffers(self):
+        return []
+
+
+class TestModelRegistry(unittest.TestCase):
+    def setUp(self):
+        FakeSentenceTransformer.instances = 0
+        fake_module = types.SimpleNamespace(SentenceTransformer=FakeSentenceTransformer)
+        patcher = mock.patch.dict(sys.modules, {"sentence_transformers": fake_module})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.registry = ModelRegistry()
+
+    def test_reuse_and_hits(self):
+        first = self.registry.get_model("m", "./models", "cpu")
+        self.assertIs(self.registry.get_model("m", "./models", "cpu"), first)
+        self.assertIsNot(self.registry.get_model("m", "./models", "cuda"), first)
+        self.assertEqual(FakeSentenceTransformer.instances, 2)
+        stats = {s["device"]: s for s in self.registry.get_stats()}
+        self.assertEqual(stats["cpu"]["hits"], 1)
+        self.assertTrue(stats["cpu"]["loaded"])
+
+    def test_concurrent_sessions_load_once(self):
+        threads = [threading.Thread(target=self.registry.get_model, args=("m", "./models", "cpu"))
+                   for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(FakeSentenceTransformer.instances, 1)
+        self.assertEqual(self.registry.get_stats()[0]["hits"], 15)
+
+    def test_unload_forces_reload(self):
+        first = self.registry.get_model("m", "./models", "cpu")
+        self.registry.unload("m", "cpu")
+        self.assertFalse(self.registry.is_loaded("m", "cpu"))
+        self.assertFalse(self.registry.get_stats()[0]["loaded"])
+        self.assertIsNot(self.registry.get_model("m", "./models", "cpu"), first)
+        self.assertEqual(FakeSentenceTransformer.instances, 2)
+
+    def test_load_failure_recorded(self):
+        def broken(*args, **kwargs):
+            raise OSError("download failed")
+
+        with mock.patch.dict(sys.modules, {"sentence_transformers": types.SimpleNamespace(SentenceTransformer=broken)}):
+            with self.assertRaises(OSError):
+                self.registry.get_model("bad", "./models", "cpu")
+        stats = self.registry.get_stats()[0]
+        self.assertEqual((stats["load_failures"], stats["last_error"]), (1, "download failed"))
+
+
+if __name__ == '__main__':
+    unittest.main()
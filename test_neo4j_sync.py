@@ -0,0 +1,208 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import networkx as nx
+
+from neo4j_sync import (
+    bulk_import_graph,
+    group_edges,
+    load_sync_state,
+    node_label,
+    node_properties,
+    save_sync_state,
+    sync_graph
+)
+
+
+class FakeResult:
+    def __init__(self, records):
+        self.records = records
+
+    def data(self):
+        return self.records
+
+    def consume(self):
+        return None
+
+
+class FakeDriver:
+    """记录收到的语句；UNWIND 语句按行数计数，DETACH DELETE 第一次返回有删除、之后返回 0"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.statements = []
+        self.deletes = 0
+
+    def session(self, database=None):
+        return FakeSession(self)
+
+    def record(self, query, params):
+        with self.lock:
+            self.statements.append((query, params))
+            if "DETACH DELETE" in query:
+                self.deletes += 1
+                return FakeResult([{"deleted": 5 if self.deletes == 1 else 0}])
+        return FakeResult([])
+
+
+class FailingDriver(FakeDriver):
+    """清空目标库之后、写入第 fail_after 条 UNWIND 语句时抛出异常，模拟导入中途断开"""
+    def __init__(self, fail_after):
+        super().__init__()
+        self.fail_after = fail_after
+        self.unwinds = 0
+
+    def record(self, query, params):
+        if query.startswith("UNWIND"):
+            with self.lock:
+                self.unwinds += 1
+                failing = self.unwinds >= self.fail_after
+            if failing:
+                raise ConnectionError("connection lost")
+        return super().record(query, params)
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, **params):
+        return self.driver.record(query, params)
+
+    def execute_write(self, work):
+        return work(self)
+
+
+def build_graph(patients):
+    G = nx.Graph()
+    for p in range(patients):
+        name = f"患者{p}"
+        G.add_node(name, node_type="patient")
+        for kind in ("主诉", "现病史"):
+            G.add_node(f"{kind}_{name}", node_type="chief_complaint" if kind == "主诉" else "present_illness",
+                       content=kind)
+            G.add_edge(name, f"{kind}_{name}", edge_type="has_complaint" if kind == "主诉" else "has_present_illness")
+    return G
+
+
+class TestNeo4jSync(unittest.TestCase):
+    def test_labels_and_groups(self):
+        self.assertEqual(node_label({"node_type": "chief_complaint"}), "chiefcomplaint")
+        self.assertEqual(node_label({}), "Entity")
+        groups = group_edges(build_graph(3))
+        self.assertEqual(len(groups[("patient", "HAS_COMPLAINT", "chiefcomplaint")]), 3)
+
+    def test_bulk_import(self):
+        driver = FakeDriver()
+        progress = []
+        G = build_graph(50)
+        stats = bulk_import_graph(G, driver, progress_callback=lambda *args: progress.append(args),
+                                  batch_size=16, workers=3)
+        self.assertEqual(stats["nodes"], G.number_of_nodes())
+        self.assertEqual(stats["relationships"], G.number_of_edges())
+
+        queries = [query for query, _ in driver.statements]
+        constraints = [query for query in queries if query.startswith("CREATE CONSTRAINT")]
+        self.assertEqual(len(constraints), 3)
+        self.assertEqual(driver.deletes, 2)
+
+        unwinds = [(query, params["rows"]) for query, params in driver.statements if query.startswith("UNWIND")]
+        self.assertEqual(len(unwinds), stats["transactions"])
+        self.assertTrue(all(len(rows) <= 16 for _, rows in unwinds))
+        # 所有节点写完后才写关系
+        kinds = ["CREATE (n:" in query for query, _ in unwinds]
+        self.assertEqual(kinds, sorted(kinds, reverse=True))
+        self.assertEqual(sum(len(rows) for query, rows in unwinds if "MATCH (a:`patient`" in query), 100)
+        self.assertEqual(progress[-1][1:3], (100, 100))
+
+    def test_incremental_sync(self):
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state_dir, True)
+        state_file = os.path.join(state_dir, "state.json")
+        G = build_graph(10)
+
+        stats = sync_graph(G, FakeDriver(), graph_version=(1, 100), state_file=state_file, batch_size=16)
+        self.assertEqual(stats["mode"], "full")
+
+        # 水位线未变：不做任何写入
+        driver = FakeDriver()
+        stats = sync_graph(G, driver, graph_version=(1, 100), state_file=state_file)
+        self.assertEqual(stats["mode"], "unchanged")
+        self.assertEqual(driver.statements, [])
+
+        # 文件版本变了但内容没变：差异为空
+        driver = FakeDriver()
+        stats = sync_graph(G, driver, graph_version=(2, 100), state_file=state_file)
+        self.assertEqual(stats["mode"], "incremental")
+        self.assertEqual(stats["transactions"], 0)
+        self.assertEqual(driver.statements, [])
+
+        G.nodes["主诉_患者0"]["content"] = "新的主诉"
+        G.remove_node("现病史_患者1")
+        G.remove_edge("患者2", "主诉_患者2")
+        G.add_node("患者10", node_type="patient")
+        G.add_node("主诉_患者10", node_type="chief_complaint", content="主诉")
+        G.add_edge("患者10", "主诉_患者10", edge_type="has_complaint")
+
+        driver = FakeDriver()
+        stats = sync_graph(G, driver, graph_version=(3, 100), state_file=state_file)
+        self.assertEqual((stats["nodes_upserted"], stats["nodes_deleted"]), (3, 1))
+        self.assertEqual((stats["relationships_upserted"], stats["relationships_deleted"]), (1, 1))
+        queries = [query for query, _ in driver.statements]
+        self.assertFalse(any("MATCH (n) WITH n LIMIT" in query for query in queries))
+        self.assertTrue(any("DETACH DELETE n" in query and "`presentillness`" in query for query in queries))
+        self.assertTrue(any(query.endswith("DELETE r") for query in queries))
+
+    def test_numbers_and_format_change(self):
+        properties = node_properties("肌酐_李某某", {"node_type": "lab_result", "indicator_value": "329.5μmol/L"})
+        self.assertEqual(properties["indicator_value__number"], 329.5)
+        self.assertNotIn("id__number", properties)
+
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state_dir, True)
+        state_file = os.path.join(state_dir, "state.json")
+        G = build_graph(10)
+        sync_graph(G, FakeDriver(), graph_version=(1, 100), state_file=state_file)
+
+        # 旧格式的同步状态没有数值属性：图文件未变也不能判为未变化
+        state = load_sync_state(state_file)
+        del state["watermark"]["format"]
+        save_sync_state(state_file, state)
+        self.assertEqual(sync_graph(G, FakeDriver(), graph_version=(1, 100), state_file=state_file)["mode"],
+                         "incremental")
+        self.assertEqual(sync_graph(G, FakeDriver(), graph_version=(1, 100), state_file=state_file)["mode"],
+                         "unchanged")
+
+    def test_failed_full_import_forces_full_resync(self):
+        state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, state_dir, True)
+        state_file = os.path.join(state_dir, "state.json")
+        G = build_graph(10)
+        sync_graph(G, FakeDriver(), graph_version=(1, 100), state_file=state_file)
+
+        # 强制全量导入，目标库清空后写入中途失败
+        with self.assertRaises(ConnectionError):
+            sync_graph(G, FailingDriver(fail_after=2), graph_version=(1, 100), state_file=state_file,
+                       full=True, batch_size=4, workers=1)
+        self.assertTrue(load_sync_state(state_file)["dirty"])
+
+        # 水位线相同也不能判为未变化，必须重新全量导入
+        driver = FakeDriver()
+        stats = sync_graph(G, driver, graph_version=(1, 100), state_file=state_file)
+        self.assertEqual(stats["mode"], "full")
+        self.assertEqual(stats["nodes_upserted"], G.number_of_nodes())
+        self.assertNotIn("dirty", load_sync_state(state_file))
+        self.assertEqual(sync_graph(G, FakeDriver(), graph_version=(1, 100), state_file=state_file)["mode"],
+                         "unchanged")
+
+
+if __name__ == '__main__':
+    unittest.main()
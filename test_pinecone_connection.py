@@ -0,0 +1,97 @@
+import sys
+import types
+import unittest
+from unittest import mock
+
+from pinecone_connection import PineconeConnectionManager, is_transport_error
+
+
+class MaxRetryError(Exception):
+    """与 urllib3 同名的连接错误"""
+
+
+def raising(error):
+    def fail():
+        raise error
+    return fail
+
+
+class FakeIndex:
+    def __init__(self, client):
+        self.client = client
+
+    def query(self, vector, top_k=10, **kwargs):
+        self.client.calls += 1
+        if self.client.failures:
+            self.client.failures.pop(0)()
+        return {"matches": [], "handle": id(self)}
+
+
+class FakePinecone:
+    """记录创建次数；failures 中的函数按顺序在 query 时抛出异常"""
+    instances = []
+
+    def __init__(self, api_key=None):
+        self.calls = 0
+        self.failures = []
+        self.list_calls = 0
+        FakePinecone.instances.append(self)
+
+    def list_indexes(self):
+        self.list_calls += 1
+        return [types.SimpleNamespace(name="medical-records")]
+
+    def Index(self, name, pool_threads=None):
+        return FakeIndex(self)
+
+
+CONFIG = {"api_key": "k", "index_name": "medical-records", "dimension": 4, "metric": "cosine",
+          "validate_ttl": 600, "pool_threads": 1}
+
+
+class TestPineconeConnection(unittest.TestCase):
+    def setUp(self):
+        FakePinecone.instances = []
+        fake_module = types.SimpleNamespace(Pinecone=FakePinecone, ServerlessSpec=lambda **kwargs: kwargs)
+        for patcher in (mock.patch.dict(sys.modules, {"pinecone": fake_module}),
+                        mock.patch("pinecone_connection.get_pinecone_config", return_value=CONFIG)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.manager = PineconeConnectionManager()
+
+    def test_handle_cached_within_ttl(self):
+        proxy, status = self.manager.get_index()
+        self.assertEqual(status, "validated")
+        self.assertEqual(self.manager.get_index()[1], "cached")
+        proxy.query(vector=[0, 0, 0, 1])
+        self.assertEqual((self.manager.connects, self.manager.validations), (1, 1))
+
+    def test_attribute_lookup_does_not_connect(self):
+        proxy = self.manager._proxy
+        self.assertFalse(hasattr(proxy, "save"))
+        self.assertTrue(callable(proxy.upsert))
+        self.assertEqual(FakePinecone.instances, [])
+
+    def test_reconnects_only_on_transport_errors(self):
+        proxy, _ = self.manager.get_index()
+        client = FakePinecone.instances[0]
+        client.failures.append(raising(MaxRetryError("connection reset")))
+        proxy.query(vector=[0, 0, 0, 1])
+        self.assertEqual(len(FakePinecone.instances), 2)
+
+        # 调用方错误直接抛出，不重连也不重试
+        new_client = FakePinecone.instances[1]
+        new_client.failures.append(raising(ValueError("bad filter")))
+        with self.assertRaises(ValueError):
+            proxy.query(vector=[0, 0, 0, 1])
+        self.assertEqual(len(FakePinecone.instances), 2)
+        self.assertEqual(new_client.calls, 2)
+
+    def test_transport_error_classification(self):
+        self.assertTrue(is_transport_error(ConnectionResetError()))
+        self.assertTrue(is_transport_error(MaxRetryError()))
+        self.assertFalse(is_transport_error(ValueError("dimension mismatch")))
+
+
+if __name__ == '__main__':
+    unittest.main()
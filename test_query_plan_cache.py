@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from query_plan_cache import QueryPlanCache, bind_template, make_template, normalize_question
+
+
+def char_embed(texts):
+    """按字符计数的玩具向量，相近的问法相似度高"""
+    vectors = np.zeros((len(texts), 512), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for char in text:
+            vectors[i, hash(char) % 512] += 1
+    return vectors
+
+
+GRAPH_PLAN = {
+    "start_node": {"type": "patient", "name": "周某某"},
+    "relationship": "has_lab_result",
+    "end_node": {"type": "lab_result", "where": {"indicator_value": {"$gt": 133}}},
+    "return": ["end_node.indicator_name", "end_node.indicator_value"]
+}
+
+
+class TestQueryPlanCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "plans.sqlite3")
+        self.cache = QueryPlanCache(self.path, embed=char_embed, similarity_threshold=0.9)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_normalize_and_bind(self):
+        normalized, slots = normalize_question("周某某的肌酐是否高于 133 ？")
+        self.assertEqual(normalized, "{患者0}的肌酐是否高于{数值0}")
+        self.assertEqual(slots, {"患者0": "周某某", "数值0": "133"})
+
+        template, used = make_template({"query": {"患者姓名": "周某某"}, "projection": {"_id": 0}}, slots)
+        self.assertEqual(used, {"患者0"})
+        self.assertEqual(bind_template(template, {"患者0": "马某某"}),
+                         {"query": {"患者姓名": "马某某"}, "projection": {"_id": 0}})
+
+    def test_exact_hit_rebinds_slots(self):
+        self.assertIsNone(self.cache.lookup("graph", "周某某的肌酐是否高于133"))
+        self.cache.store("graph", "周某某的肌酐是否高于133", GRAPH_PLAN, generate_seconds=3.0)
+
+        plan, match_type, _ = self.cache.lookup("graph", "马某某的肌酐是否高于 200？")
+        self.assertEqual(match_type, "exact")
+        self.assertEqual(plan["start_node"]["name"], "马某某")
+        self.assertEqual(plan["end_node"]["where"]["indicator_value"]["$gt"], 200)
+        # 其他计划类型不共用
+        self.assertIsNone(self.cache.lookup("mongodb", "马某某的肌酐是否高于200"))
+
+        stats = self.cache.get_stats()
+        self.assertEqual((stats["exact_hits"], stats["misses"]), (1, 2))
+        self.assertEqual(stats["saved_seconds"], 3.0)
+
+    def test_semantic_hit_and_persistence(self):
+        self.cache.store("graph", "请问周某某的肌酐是否高于133", GRAPH_PLAN)
+        reopened = QueryPlanCache(self.path, embed=char_embed, similarity_threshold=0.9)
+        plan, match_type, similarity = reopened.lookup("graph", "周某某的肌酐是否高于150呢")
+        self.assertEqual(match_type, "semantic")
+        self.assertGreaterEqual(similarity, 0.9)
+        self.assertEqual(plan["end_node"]["where"]["indicator_value"]["$gt"], 150)
+        # 槽位数量对不上的相近问题不复用
+        self.assertIsNone(reopened.lookup("graph", "请问的肌酐是否高于133"))
+
+    def test_semantic_match_requires_same_terms(self):
+        self.cache.store("graph", "周某某的肌酐是否高于133", GRAPH_PLAN)
+        # 向量相似度很高，但比较方向相反，不能复用
+        self.assertIsNone(self.cache.lookup("graph", "周某某的肌酐是否低于133"))
+        self.assertEqual(self.cache.get_stats()["semantic_hits"], 0)
+
+    def test_ttl_and_lru(self):
+        cache = QueryPlanCache(self.path, ttl_seconds=0.05, max_entries=2, embed=char_embed)
+        cache.store("graph", "周某某的主诉", GRAPH_PLAN)
+        time.sleep(0.1)
+        self.assertIsNone(cache.lookup("graph", "周某某的主诉"))
+
+        cache.ttl_seconds = 0
+        for question in ("周某某的主诉", "周某某的诊断", "周某某的治疗方案"):
+            cache.store("graph", question, GRAPH_PLAN)
+        self.assertEqual(cache.get_stats()["entries"], 2)
+        # 最久未访问的 "主诉" 已被淘汰，也不会语义命中 "诊断" 或 "治疗方案"
+        self.assertIsNone(cache.lookup("graph", "马某某的主诉"))
+        self.assertIsNotNone(cache.lookup("graph", "马某某的治疗方案"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from rate_limiter import (
+    RateLimiter,
+    SQLiteTokenBucket,
+    TokenBucket,
+    estimate_request_tokens,
+    estimate_tokens,
+    limiter_key
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens("肌酐偏高"), 4)
+        self.assertEqual(estimate_tokens("creatinine"), 3)
+        messages = [{"role": "user", "content": "肌酐偏高"}]
+        self.assertEqual(estimate_request_tokens(messages, max_tokens=10), 4 + 4 + 10)
+
+    def test_bucket_reservations_queue_in_order(self):
+        clock = FakeClock()
+        bucket = TokenBucket(capacity=2, rate=1.0, clock=clock)
+        self.assertEqual(bucket.reserve(1), 0)
+        self.assertEqual(bucket.reserve(1), 0)
+        # 桶空后后到的请求排在更后面
+        self.assertAlmostEqual(bucket.reserve(1), 1.0)
+        self.assertAlmostEqual(bucket.reserve(1), 2.0)
+        clock.now += 2
+        self.assertAlmostEqual(bucket.reserve(1), 1.0)
+        # 退还多预约的令牌
+        bucket.adjust(-5)
+        self.assertEqual(bucket.tokens, 2)
+
+    def test_limiter_waits_on_token_budget(self):
+        limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=600, burst=5)
+        self.assertEqual(limiter.reserve(tokens=500), 0)
+        wait = limiter.reserve(tokens=200)
+        self.assertAlmostEqual(wait, 10.0, places=1)
+        # 实际只用了 100 个 token，退还后余额转正
+        limiter.settle(500, 100)
+        limiter.settle(200, 0)
+        self.assertEqual(limiter.reserve(tokens=100), 0)
+        stats = limiter.get_stats()
+        self.assertEqual((stats["total_requests"], stats["waits"]), (3, 1))
+
+    def test_concurrent_reservations(self):
+        limiter = RateLimiter(requests_per_minute=60, burst=10)
+        waits = []
+        lock = threading.Lock()
+
+        def worker():
+            wait = limiter.reserve()
+            with lock:
+                waits.append(wait)
+
+        threads = [threading.Thread(target=worker) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 10 个立即放行，其余按 1 秒一个排队
+        self.assertEqual(sum(1 for wait in waits if wait == 0), 10)
+        self.assertAlmostEqual(max(waits), 10.0, places=1)
+
+    def test_acquire_async_shares_bucket_without_blocking(self):
+        limiter = RateLimiter(requests_per_minute=6000, burst=2)
+        # 同步调用先用掉一个令牌，异步调用预约的是同一个桶
+        self.assertEqual(limiter.reserve(), 0)
+        ticks, done = [], []
+
+        async def acquire():
+            wait = await limiter.acquire_async()
+            done.append(time.monotonic())
+            return wait
+
+        async def ticker():
+            for _ in range(3):
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0)
+
+        async def run():
+            return await asyncio.gather(acquire(), acquire(), ticker())
+
+        first, second, _ = asyncio.run(run())
+        self.assertEqual(first, 0)
+        self.assertAlmostEqual(second, 0.01, places=2)
+        # 等待期间事件循环上的其他协程照常运行，在第二个请求拿到额度之前就已执行完
+        self.assertEqual(len(ticks), 3)
+        self.assertLess(max(ticks), max(done))
+        self.assertEqual(limiter.get_stats()["waits"], 1)
+
+    def test_shared_sqlite_bucket(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        path = os.path.join(directory, "limits.sqlite3")
+        clock = FakeClock()
+        key = limiter_key("https://openrouter.ai/api/v1/", "sk-secret")
+        self.assertNotIn("sk-secret", key)
+        first = SQLiteTokenBucket(path, key + ":requests", capacity=2, rate=1.0, clock=clock)
+        second = SQLiteTokenBucket(path, key + ":requests", capacity=2, rate=1.0, clock=clock)
+        # 两个进程（两个实例）共用同一份额度
+        self.assertEqual(first.reserve(1), 0)
+        self.assertEqual(second.reserve(1), 0)
+        self.assertAlmostEqual(first.reserve(1), 1.0)
+        clock.now += 3
+        self.assertEqual(second.reserve(1), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
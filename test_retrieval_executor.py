@@ -0,0 +1,67 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from retrieval_executor import SCRIPT_RUN_CONTEXT_ATTR_NAME, RetrievalExecutor
+
+
+def slow(seconds, result):
+    def retriever(query):
+        time.sleep(seconds)
+        return [f"{query}:{result}"]
+    return retriever
+
+
+def broken(query):
+    raise RuntimeError("backend down")
+
+
+class TestRetrievalExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = RetrievalExecutor(max_workers=4)
+
+    def test_runs_concurrently(self):
+        outcome = self.executor.run({"a": slow(0.2, "a"), "b": slow(0.2, "b"), "c": slow(0.2, "c")}, "q",
+                                    timeouts={}, deadline=5)
+        self.assertEqual(outcome.results, {"a": ["q:a"], "b": ["q:b"], "c": ["q:c"]})
+        self.assertLess(outcome.total_seconds, 0.5)
+        self.assertFalse(outcome.partial)
+
+    def test_timeout_and_error_return_partial_results(self):
+        outcome = self.executor.run({"fast": slow(0.01, "ok"), "slow": slow(1.0, "late"), "bad": broken}, "q",
+                                    timeouts={"slow": 0.1}, deadline=5)
+        self.assertEqual(outcome.results["fast"], ["q:ok"])
+        self.assertEqual((outcome.status["slow"], outcome.results["slow"]), ("timeout", []))
+        self.assertEqual(outcome.status["bad"], "error")
+        self.assertIn("backend down", outcome.errors["bad"])
+        self.assertLess(outcome.total_seconds, 0.5)
+
+    def test_global_deadline(self):
+        outcome = self.executor.run({"a": slow(1.0, "a")}, "q", timeouts={"a": 10}, deadline=0.1)
+        self.assertEqual(outcome.status["a"], "timeout")
+
+    def test_timed_out_retriever_loses_script_context(self):
+        seen = {}
+        finished = threading.Event()
+
+        def late(query):
+            seen["before"] = getattr(threading.current_thread(), SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+            time.sleep(0.3)
+            # 超时之后再写页面时已经拿不到会话上下文
+            seen["after"] = getattr(threading.current_thread(), SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+            finished.set()
+            return []
+
+        ctx = object()
+        with mock.patch("retrieval_executor._script_context", return_value=ctx):
+            outcome = self.executor.run({"late": late, "fast": slow(0.01, "ok")}, "q",
+                                        timeouts={"late": 0.1}, deadline=5)
+        self.assertEqual(outcome.status["late"], "timeout")
+        self.assertTrue(finished.wait(2))
+        self.assertIs(seen["before"], ctx)
+        self.assertIsNone(seen["after"])
+
+
+if __name__ == '__main__':
+    unittest.main()
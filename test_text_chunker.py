@@ -0,0 +1,32 @@
+import unittest
+
+from text_chunker import iter_chunks, iter_sections
+
+
+class TestTextChunker(unittest.TestCase):
+    def test_sections_with_spaced_headers(self):
+        text = "姓名 李某某\n主 诉 : 头痛 2 天。\n现病史：头痛。恶心。"
+        sections = list(iter_sections(text))
+        self.assertEqual([header for header, _ in sections], [None, "主诉", "现病史"])
+        self.assertEqual(sections[1][1], "头痛 2 天。")
+
+    def test_chunks_respect_budget_and_overlap(self):
+        text = "现病史：" + "".join(f"症状{i}持续{i}天。" for i in range(20))
+        chunks = list(iter_chunks(text, max_tokens=30, overlap_tokens=10, count_tokens=len))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertTrue(chunk.startswith("现病史："))
+            self.assertLessEqual(len(chunk), 30)
+        # 相邻块之间至少共享一个完整句子
+        first_tail = chunks[0].split("。")[-2]
+        self.assertIn(first_tail, chunks[1])
+
+    def test_long_sentence_is_split(self):
+        text = "出院医嘱：" + "药" * 100
+        chunks = list(iter_chunks(text, max_tokens=20, overlap_tokens=0, count_tokens=len))
+        self.assertTrue(all(len(chunk) <= 20 for chunk in chunks))
+        self.assertEqual("".join(chunk[len("出院医嘱："):] for chunk in chunks), "药" * 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
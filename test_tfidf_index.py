@@ -0,0 +1,70 @@
+import shutil
+import tempfile
+import json
+import os
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from tfidf_index import TfidfIndex
+
+
+class TestTfidfIndex(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.index = TfidfIndex(self.path)
+        self.index.add_documents(
+            ["a", "b", "c"],
+            ["患者服用阿司匹林后出现胃出血", "头颅CT提示多发性脑梗死", "血压控制良好，继续服用降压药"],
+            [{"patient_name": "周某某"}, {"patient_name": "马某某"}, {"patient_name": "周某某"}]
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_query_uses_corpus_vocabulary(self):
+        results = self.index.query("阿司匹林", top_k=3)
+        self.assertEqual([m['id'] for m in results['matches']], ["a"])
+        self.assertEqual(results['matches'][0]['metadata']['text'], "患者服用阿司匹林后出现胃出血")
+        self.assertEqual(self.index.query("完全无关的词汇xyz")['matches'], [])
+
+    def test_filter_and_incremental_add(self):
+        results = self.index.query("服用", top_k=3, filter={"patient_name": {"$eq": "周某某"}})
+        self.assertEqual({m['id'] for m in results['matches']}, {"a", "c"})
+        self.assertEqual(self.index.add_documents(["a", "d"], ["重复", "脑梗死复查"]), 1)
+        results = self.index.query("脑梗死", top_k=3)
+        self.assertEqual({m['id'] for m in results['matches']}, {"b", "d"})
+
+    def test_persistence_and_stable_embeddings(self):
+        before = self.index.hashed_embeddings(["阿司匹林 胃出血"], 16)
+        self.index.save()
+        reloaded = TfidfIndex(self.path)
+        self.assertEqual(reloaded.get_stats(), self.index.get_stats())
+        after = reloaded.hashed_embeddings(["阿司匹林 胃出血"], 16)
+        np.testing.assert_allclose(before, after, rtol=1e-6)
+        self.assertAlmostEqual(float(np.linalg.norm(after)), 1.0, places=5)
+
+    def test_delete_documents_keeps_columns(self):
+        before = self.index.hashed_embeddings(["阿司匹林 胃出血"], 16)
+        self.assertEqual(self.index.delete_documents(["b", "missing"]), 1)
+        self.assertEqual(self.index.query("脑梗死")['matches'], [])
+        self.assertEqual(self.index.get_stats()['documents'], 2)
+        self.assertEqual(self.index.query("阿司匹林")['matches'][0]['metadata']['patient_name'], "周某某")
+        # 词表列号不变，哈希向量在删除前后仍可比
+        after = self.index.hashed_embeddings(["阿司匹林 胃出血"], 16)
+        self.assertGreater(float((before @ after.T)[0, 0]), 0.9)
+
+
+    def test_tokenizer_change_rebuilds_on_load(self):
+        self.index.save()
+        with mock.patch("tfidf_index.LEXICAL_VERSION", "chars-v1"), \
+                mock.patch("tfidf_index.lexical_terms", lambda text: [ch for ch in text if ch.strip()]):
+            reloaded = TfidfIndex(self.path)
+            self.assertEqual(reloaded.query("匹")['matches'][0]['id'], "a")
+        with open(os.path.join(self.path, TfidfIndex.VOCAB_FILE), "r", encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["tokenizer_version"], "chars-v1")
+
+
+if __name__ == '__main__':
+    unittest.main()
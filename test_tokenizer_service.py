@@ -0,0 +1,40 @@
+import unittest
+from unittest import mock
+
+from tokenizer_service import TokenizerService
+
+
+class TestTokenizerService(unittest.TestCase):
+    def setUp(self):
+        self.service = TokenizerService()
+
+    def test_medical_terms_stay_whole(self):
+        tokens = self.service.cut("患者诊断为冠状动脉粥样硬化性心脏病，予美罗培南抗感染")
+        self.assertIn("冠状动脉粥样硬化性心脏病", tokens)
+        self.assertIn("美罗培南", tokens)
+        self.assertGreater(self.service.get_stats()["user_dict_terms"], 0)
+
+    def test_memoization(self):
+        first = self.service.cut("多发性脑梗死")
+        second = self.service.cut("多发性脑梗死")
+        self.assertIs(first, second)
+        stats = self.service.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_parallel_matches_sequential(self):
+        texts = [f"第{i}天复查血肌酐，较前升高，继续透析治疗" for i in range(40)]
+        sequential = [tuple(TokenizerService().cut(text)) for text in texts]
+        config = {"parallel_workers": 2, "parallel_min_chars": 1, "memo_size": 100,
+                  "user_dict_path": "./medical_dict.txt", "dict_cache_file": None}
+        with mock.patch("tokenizer_service.get_tokenizer_config", return_value=config):
+            try:
+                parallel = self.service.cut_many(texts + texts[:5])
+            finally:
+                self.service.shutdown()
+        self.assertEqual(parallel[:40], sequential)
+        self.assertEqual(parallel[40:], sequential[:5])
+        self.assertGreater(self.service.get_stats()["parallel_batches"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import vector_store
+from bm25_index import BM25Index
+from local_vector_store import LocalVectorIndex
+from tfidf_index import TfidfIndex
+from vector_upsert import source_record_key
+
+DOCUMENT = "周某某，入院日期：2024-03-05。\n\n主诉：头晕3天，伴恶心呕吐。\n\n既往史：高血压10年，规律服用降压药。"
+
+
+def fake_embeddings(texts, dtype=None):
+    """每个窗口产出固定的二维向量，不加载模型"""
+    window = list(texts)
+    yield window, np.ones((len(window), 2), dtype="float32")
+
+
+class TestVectorizeDocument(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path, True)
+        self.index = LocalVectorIndex(self.path + "/vectors", dimension=2)
+        self.session = mock.MagicMock()
+        patches = [
+            mock.patch("vector_store.st", session_state=self.session),
+            mock.patch("vector_store.init_pinecone", return_value=self.index),
+            mock.patch("vector_store.iter_embeddings", side_effect=fake_embeddings),
+            mock.patch("vector_store.get_tfidf_index", return_value=TfidfIndex(self.path + "/tfidf")),
+            mock.patch("vector_store.get_bm25_index", return_value=BM25Index(self.path + "/bm25"))
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _import(self, text):
+        # 与 import_medical_data 相同：记录标识由源文档内容生成
+        chunks, _ = vector_store.vectorize_document(text, "周某某的病历", record_id=source_record_key(text))
+        self.assertTrue(chunks)
+        return self.session.last_upsert_stats
+
+    def test_reimporting_same_document_writes_nothing(self):
+        first = self._import(DOCUMENT)
+        total = self.index.describe_index_stats().total_vector_count
+        self.assertGreater(total, 0)
+        self.assertEqual(first["vectors"], total)
+
+        second = self._import(DOCUMENT)
+        self.assertEqual((second["vectors"], second["deleted"]), (0, 0))
+        self.assertEqual(second["skipped"], total)
+        self.assertEqual(self.index.describe_index_stats().total_vector_count, total)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import shutil
+import tempfile
+import unittest
+
+from local_vector_store import LocalVectorIndex
+from vector_upsert import (
+    BatchUpserter,
+    delete_ids,
+    iter_new_chunks,
+    list_record_ids,
+    make_chunk_id,
+    source_record_key
+)
+
+
+class FlakyIndex:
+    """前 failures 次 upsert 抛出异常的假索引"""
+    def __init__(self, failures):
+        self.failures = failures
+        self.batches = []
+
+    def upsert(self, vectors):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("temporary failure")
+        self.batches.append(vectors)
+
+
+class TestVectorUpsert(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.index = LocalVectorIndex(self.path, dimension=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _upload(self, record_key, chunks):
+        seen, positions = [], {}
+        with BatchUpserter(self.index, batch_size=2, workers=2) as upserter:
+            for chunk in iter_new_chunks(self.index, record_key, chunks, positions, seen):
+                chunk_id = make_chunk_id(record_key, chunk)
+                upserter.add({'id': chunk_id, 'values': [1, positions[chunk_id]],
+                              'metadata': {'text': chunk}})
+        upserter.stats['positions'] = positions
+        return upserter.stats
+
+    def test_reimport_skips_existing_chunks(self):
+        stats = self._upload("a.pdf", ["甲", "乙", "丙", "甲"])
+        self.assertEqual((stats['vectors'], stats['batches']), (3, 2))
+        self.assertEqual(self.index.describe_index_stats().total_vector_count, 3)
+
+        stats = self._upload("a.pdf", ["甲", "乙", "丁"])
+        self.assertEqual(stats['vectors'], 1)
+        # 不同文件中的相同文本是不同的块
+        self._upload("b.pdf", ["甲"])
+        self.assertEqual(LocalVectorIndex(self.path, dimension=2).describe_index_stats().total_vector_count, 5)
+
+    def test_records_of_same_patient_do_not_collide(self):
+        # 同一患者的两份病历文件名相同，但记录 ID 不同
+        self._upload("64f0c1", ["主诉：头晕"])
+        stats = self._upload("64f0c2", ["主诉：头晕"])
+        self.assertEqual(stats['vectors'], 1)
+        self.assertEqual(len(list_record_ids(self.index, "64f0c1")), 1)
+        self.assertEqual(len(list_record_ids(self.index, "64f0c2")), 1)
+
+    def test_source_record_key_is_stable(self):
+        # 同一份文档重复导入得到同一个记录标识，内容不同则标识不同
+        self.assertEqual(source_record_key("主诉：头晕"), source_record_key("主诉：头晕"))
+        self.assertNotEqual(source_record_key("主诉：头晕"), source_record_key("主诉：头痛"))
+        self.assertTrue(make_chunk_id(source_record_key("主诉：头晕"), "主诉：头晕").isascii())
+
+    def test_reimport_deletes_stale_chunks(self):
+        self._upload("a.pdf", ["甲", "乙"])
+        self._upload("b.pdf", ["乙"])
+        stats = self._upload("a.pdf", ["甲", "乙（修订）"])
+        stale = list_record_ids(self.index, "a.pdf") - set(stats['positions'])
+        self.assertEqual(stale, {make_chunk_id("a.pdf", "乙")})
+        delete_ids(self.index, stale, batch_size=1)
+        self.assertEqual(list_record_ids(self.index, "a.pdf"), set(stats['positions']))
+        # 其他记录的相同文本不受影响
+        self.assertEqual(list_record_ids(self.index, "b.pdf"), {make_chunk_id("b.pdf", "乙")})
+
+    def test_retry_then_success(self):
+        index = FlakyIndex(failures=2)
+        upserter = BatchUpserter(index, batch_size=3, workers=1, max_retries=3, backoff=0)
+        for i in range(5):
+            upserter.add({'id': str(i), 'values': [0, 1]})
+        stats = upserter.close()
+        self.assertEqual([len(batch) for batch in index.batches], [3, 2])
+        self.assertEqual(stats['retries'], 2)
+
+    def test_retry_exhausted_raises(self):
+        upserter = BatchUpserter(FlakyIndex(failures=5), batch_size=1, workers=1, max_retries=1, backoff=0)
+        upserter.add({'id': "x", 'values': [0, 1]})
+        with self.assertRaises(ConnectionError):
+            upserter.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+中文病历分块
+先按病历章节标题（主诉、现病史、出院诊断……）切分，再按中文句末标点切句，
+在 token 预算内组成带重叠的窗口；全部以生成器实现，边读边产出
+"""
+
+import re
+
+from config import get_system_config
+
+# 病历常见章节标题（PDF 抽取的文本中标题字之间可能夹有空格）
+SECTION_HEADERS = (
+    "主诉", "现病史", "既往史", "个人史", "婚育史", "月经史", "家族史",
+    "体格检查", "专科检查", "辅助检查", "入院情况", "入院诊断",
+    "诊疗经过", "治疗经过", "出院情况", "出院时情况", "出院诊断", "出院医嘱"
+)
+
+SECTION_PATTERN = re.compile(
+    "(" + "|".join(r"\s*".join(header) for header in sorted(SECTION_HEADERS, key=len, reverse=True)) + r")\s*[:：]"
+)
+# 句子以句末标点或换行结束，标点保留在句子中
+SENTENCE_PATTERN = re.compile(r"[^。！？；!?;\n]+[。！？；!?;\n]*|[。！？；!?;\n]+")
+
+
+def _fallback_token_count(text):
+    # 没有可用分词器时按字符数估算：中文一个字约等于一个 token，估算偏保守
+    return len(text)
+
+
+def get_token_counter():
+    """
+    返回计算 token 数的函数
+    优先使用已加载的向量模型分词器（与截断长度一致），其次 tiktoken，最后按字符数估算
+    """
+    try:
+        from model_registry import model_registry
+        if model_registry.is_loaded():
+            tokenizer = model_registry.get_model().tokenizer
+            return lambda text: len(tokenizer(text, add_special_tokens=False)["input_ids"])
+    except Exception:
+        pass
+
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text))
+    except Exception:
+        return _fallback_token_count
+
+
+def iter_sections(text):
+    """按章节标题切分，产出 (标题, 正文)；第一个标题之前的内容标题为 None"""
+    header = None
+    start = 0
+    for match in SECTION_PATTERN.finditer(text):
+        body = text[start:match.start()].strip()
+        if body:
+            yield header, body
+        header = re.sub(r"\s+", "", match.group(1))
+        start = match.end()
+    body = text[start:].strip()
+    if body:
+        yield header, body
+
+
+def iter_sentences(text):
+    """按中文句末标点切句，句末的换行保留，拼接后仍保持原有排版"""
+    for match in SENTENCE_PATTERN.finditer(text):
+        sentence = match.group(0)
+        if sentence.strip():
+            yield sentence
+
+
+def _split_long_sentence(sentence, max_tokens, count_tokens):
+    """超出预算的单句按字符二分切开，保证每段都不超过 max_tokens"""
+    if count_tokens(sentence) <= max_tokens or len(sentence) <= 1:
+        yield sentence
+        return
+    middle = len(sentence) // 2
+    yield from _split_long_sentence(sentence[:middle], max_tokens, count_tokens)
+    yield from _split_long_sentence(sentence[middle:], max_tokens, count_tokens)
+
+
+def iter_chunks(text, max_tokens=None, overlap_tokens=None, count_tokens=None):
+    """
+    流式分块：每个章节内按句子累积到 max_tokens，相邻窗口重叠约 overlap_tokens
+    每个块都以章节标题开头，便于单独检索时仍能看出上下文
+    """
+    system_config = get_system_config()
+    max_tokens = max_tokens or system_config.get("chunk_max_tokens", 200)
+    if overlap_tokens is None:
+        overlap_tokens = system_config.get("chunk_overlap_tokens", 40)
+    count_tokens = count_tokens or get_token_counter()
+
+    for header, body in iter_sections(text):
+        prefix = f"{header}：" if header else ""
+        budget = max(max_tokens - (count_tokens(prefix) if prefix else 0), 1)
+
+        window = []  # [(句子, token数)]
+        window_tokens = 0
+        for sentence in iter_sentences(body):
+            for piece in _split_long_sentence(sentence, budget, count_tokens):
+                piece_tokens = count_tokens(piece)
+                if window and window_tokens + piece_tokens > budget:
+                    yield prefix + "".join(s for s, _ in window).strip()
+
+                    # 保留窗口末尾若干句作为下一个窗口的开头
+                    overlap = []
+                    overlap_total = 0
+                    for s, t in reversed(window):
+                        if overlap_total + t > overlap_tokens or overlap_total + t + piece_tokens > budget:
+                            break
+                        overlap.insert(0, (s, t))
+                        overlap_total += t
+                    window, window_tokens = overlap, overlap_total
+
+                window.append((piece, piece_tokens))
+                window_tokens += piece_tokens
+
+        if window:
+            yield prefix + "".join(s for s, _ in window).strip()
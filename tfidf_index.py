@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+持久化 TF-IDF 词法索引
+词表和文档频率在导入时增量更新并保存到磁盘，查询用同一份词表转换，
+打分使用稀疏矩阵乘法；向量模型不可用时作为检索的备选方案
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+
+from config import get_system_config
+from embedding_engine import LEXICAL_VERSION, lexical_terms
+
+
+def metadata_matches(metadata, filter):
+    """判断元数据是否满足 Pinecone 风格的过滤条件（$eq / $in / $and）"""
+    for field, condition in (filter or {}).items():
+        if field == "$and":
+            if not all(metadata_matches(metadata, sub_filter) for sub_filter in condition):
+                return False
+            continue
+        value = metadata.get(field)
+        values = value if isinstance(value, list) else [value]
+        if isinstance(condition, dict):
+            if "$eq" in condition:
+                wanted = [condition["$eq"]]
+            elif "$in" in condition:
+                wanted = list(condition["$in"])
+            else:
+                raise ValueError(f"词法索引不支持的过滤条件: {condition}")
+        else:
+            wanted = [condition]
+        if not set(wanted).intersection(values):
+            return False
+    return True
+
+
+class TfidfIndex:
+    """
+    增量 TF-IDF 索引
+    文档按原始词频存成 CSR 矩阵，IDF 随语料变化，打分时再加权并按行归一化
+    """
+    VOCAB_FILE = "tfidf_vocab.json"
+    MATRIX_FILE = "tfidf_tf.npz"
+    DOCS_FILE = "tfidf_docs.json"
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self.vocabulary = {}  # 词 -> 列号
+        self._df = np.zeros(0, dtype=np.int64)
+        self._tf = sp.csr_matrix((0, 0), dtype=np.float32)
+        self._pending_rows = []  # 新文档的词频，用到矩阵时再一次性拼接
+        self._ids = []
+        self._id_to_row = {}
+        self._metadata = []
+        self._weighted = None  # 缓存的 TF-IDF 文档矩阵，有新文档时失效
+        self._load()
+
+    # ---------- 持久化 ----------
+
+    def _load(self):
+        vocab_path = os.path.join(self.path, self.VOCAB_FILE)
+        if not os.path.exists(vocab_path):
+            return
+        with open(vocab_path, "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        with open(os.path.join(self.path, self.DOCS_FILE), "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        self.vocabulary = {term: col for col, term in enumerate(vocab["terms"])}
+        self._df = np.asarray(vocab["df"], dtype=np.int64)
+        self._tf = sp.load_npz(os.path.join(self.path, self.MATRIX_FILE)).tocsr()
+        self._ids = docs["ids"]
+        self._metadata = docs["metadata"]
+        self._id_to_row = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        if vocab.get("tokenizer_version") != LEXICAL_VERSION:
+            # 分词方式变了，旧词频与查询的分词结果对不上：用保存的原文重建
+            self._rebuild(range(len(self._ids)))
+            self.save()
+
+    def save(self):
+        """原子写入：先写临时文件再替换"""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            terms = [None] * len(self.vocabulary)
+            for term, col in self.vocabulary.items():
+                terms[col] = term
+
+            matrix_tmp = os.path.join(self.path, self.MATRIX_FILE + ".tmp.npz")
+            sp.save_npz(matrix_tmp, self._term_matrix())
+            os.replace(matrix_tmp, os.path.join(self.path, self.MATRIX_FILE))
+            for name, payload in (
+                (self.DOCS_FILE, {"ids": self._ids, "metadata": self._metadata}),
+                (self.VOCAB_FILE, {"terms": terms, "df": self._df.tolist(), "tokenizer_version": LEXICAL_VERSION})
+            ):
+                tmp = os.path.join(self.path, name + ".tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(payload, f, ensure_ascii=False)
+                os.replace(tmp, os.path.join(self.path, name))
+
+    # ---------- 建索引 ----------
+
+    def _term_counts(self, text, grow):
+        """统计词频；grow=False 时忽略词表外的词"""
+        counts = {}
+        for term in lexical_terms(text):
+            col = self.vocabulary.get(term)
+            if col is None:
+                if not grow:
+                    continue
+                col = len(self.vocabulary)
+                self.vocabulary[term] = col
+            counts[col] = counts.get(col, 0) + 1
+        return counts
+
+    @staticmethod
+    def _rows_to_csr(rows, width):
+        indptr = [0]
+        indices = []
+        data = []
+        for counts in rows:
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        return sp.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int64), np.asarray(indptr)),
+            shape=(len(rows), width)
+        )
+
+    def add_documents(self, ids, texts, metadatas=None):
+        """增量加入文档，已存在的 ID 跳过；词表立即更新，返回新加入的文档数"""
+        metadatas = metadatas or [{} for _ in ids]
+        with self._lock:
+            added = 0
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                if doc_id in self._id_to_row:
+                    continue
+                self._pending_rows.append(self._term_counts(text, grow=True))
+                self._id_to_row[doc_id] = len(self._ids)
+                self._ids.append(doc_id)
+                self._metadata.append({**metadata, "text": text})
+                added += 1
+            if added:
+                self._weighted = None
+            return added
+
+    def _term_matrix(self):
+        """拼接待加入的文档并更新文档频率，返回完整的词频矩阵"""
+        width = len(self.vocabulary)
+        if self._pending_rows:
+            rows, self._pending_rows = self._pending_rows, []
+            df = np.zeros(width, dtype=np.int64)
+            df[:self._df.shape[0]] = self._df
+            for counts in rows:
+                df[list(counts.keys())] += 1
+            self._df = df
+
+            old = self._tf
+            old.resize((old.shape[0], width))
+            self._tf = sp.vstack([old, self._rows_to_csr(rows, width)], format="csr")
+        elif self._tf.shape[1] != width:
+            self._tf.resize((self._tf.shape[0], width))
+        return self._tf
+
+    def _reset(self):
+        self.vocabulary = {}
+        self._df = np.zeros(0, dtype=np.int64)
+        self._tf = sp.csr_matrix((0, 0), dtype=np.float32)
+        self._pending_rows = []
+        self._ids = []
+        self._id_to_row = {}
+        self._metadata = []
+        self._weighted = None
+
+    def _rebuild(self, rows):
+        """
+        用 rows 指定的文档（保存在元数据中的原文）重新分词建索引（调用方持有锁）
+        保留原词表：列号不变，已写入向量库的哈希向量仍然可比
+        """
+        documents = [(self._ids[row], self._metadata[row]) for row in rows]
+        vocabulary = self.vocabulary
+        self._reset()
+        self.vocabulary = vocabulary
+        for doc_id, metadata in documents:
+            metadata = dict(metadata)
+            text = metadata.pop("text")
+            self.add_documents([doc_id], [text], [metadata])
+
+    def delete_documents(self, ids):
+        """删除文档，返回删除的文档数；词频矩阵和文档频率无法原地扣减，用剩余文档重建，不自动保存"""
+        with self._lock:
+            ids = set(ids).intersection(self._id_to_row)
+            if ids:
+                self._rebuild([row for row, doc_id in enumerate(self._ids) if doc_id not in ids])
+            return len(ids)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self.save()
+
+    # ---------- 向量化与检索 ----------
+
+    def idf(self):
+        """平滑 IDF：log((1 + N) / (1 + df)) + 1"""
+        n_docs = len(self._ids)
+        return (np.log((1.0 + n_docs) / (1.0 + self._df)) + 1.0).astype(np.float32)
+
+    def _weight(self, tf):
+        """次线性词频 × IDF，并做 L2 行归一化"""
+        weighted = tf.copy()
+        weighted.data = 1.0 + np.log(weighted.data)
+        weighted = weighted @ sp.diags(self.idf())
+        norms = np.sqrt(weighted.multiply(weighted).sum(axis=1)).A1
+        norms[norms == 0] = 1.0
+        return sp.csr_matrix(sp.diags(1.0 / norms) @ weighted, dtype=np.float32)
+
+    def transform(self, texts):
+        """用当前词表把文本转换为稀疏 TF-IDF 向量（词表外的词忽略）"""
+        with self._lock:
+            self._term_matrix()
+            rows = [self._term_counts(text, grow=False) for text in texts]
+            return self._weight(self._rows_to_csr(rows, len(self.vocabulary)))
+
+    def document_matrix(self):
+        with self._lock:
+            if self._weighted is None:
+                self._weighted = self._weight(self._term_matrix())
+            return self._weighted
+
+    def query(self, text, top_k=10, include_metadata=True, filter=None):
+        """返回与 Pinecone 相同结构的结果：{'matches': [{'id', 'score', 'metadata'}]}"""
+        with self._lock:
+            if not self._ids:
+                return {"matches": []}
+            scores = (self.document_matrix() @ self.transform([text]).T).toarray().ravel()
+            if filter:
+                mask = np.array([metadata_matches(metadata, filter) for metadata in self._metadata])
+                scores = np.where(mask, scores, -1.0)
+
+            top_k = min(top_k, len(self._ids))
+            order = np.argpartition(-scores, top_k - 1)[:top_k]
+            order = order[np.argsort(-scores[order], kind="stable")]
+            matches = []
+            for row in order:
+                if scores[row] <= 0:
+                    break
+                match = {"id": self._ids[row], "score": float(scores[row])}
+                if include_metadata:
+                    match["metadata"] = dict(self._metadata[row])
+                matches.append(match)
+            return {"matches": matches}
+
+    def hashed_embeddings(self, texts, dimension):
+        """
+        把 TF-IDF 向量按列号哈希折叠到固定维度，得到可写入向量库的稠密向量
+        词表只增不减、列号固定，同一个词在不同调用中总是落在同一维上
+        """
+        tfidf = self.transform(texts).tocoo()
+        embeddings = np.zeros((len(texts), dimension), dtype=np.float32)
+        # 用列号的奇偶决定符号，减少哈希碰撞带来的偏差
+        signs = np.where(tfidf.col % 2 == 0, 1.0, -1.0).astype(np.float32)
+        np.add.at(embeddings, (tfidf.row, (tfidf.col // 2) % dimension), tfidf.data * signs)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return embeddings / norms
+
+    def get_stats(self):
+        with self._lock:
+            nnz = int(self._term_matrix().nnz)
+        return {"documents": len(self._ids), "vocabulary": len(self.vocabulary), "nnz": nnz}
+
+
+_tfidf_index = None
+_tfidf_index_lock = threading.Lock()
+
+
+def get_tfidf_index():
+    """进程内共享的 TF-IDF 索引"""
+    global _tfidf_index
+    with _tfidf_index_lock:
+        if _tfidf_index is None:
+            _tfidf_index = TfidfIndex(get_system_config().get("lexical_index_path", "./lexical_index"))
+        return _tfidf_index
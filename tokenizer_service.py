@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+中文分词服务
+在可控的时机一次性加载 jieba 词典和医学用户词典，分词结果按文本做 LRU 缓存，
+大批量文本用进程池并行切分，并统计吞吐量（字/秒）
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import jieba
+
+from config import get_tokenizer_config
+
+
+def _configure_jieba(user_dict_path, dict_cache_file):
+    """初始化 jieba：指定词典缓存文件并加载用户词典（主进程和子进程共用）"""
+    jieba.setLogLevel(logging.WARNING)
+    if dict_cache_file:
+        # jieba 会把相对路径拼到系统临时目录下，这里统一转成绝对路径
+        dict_cache_file = os.path.abspath(dict_cache_file)
+        os.makedirs(os.path.dirname(dict_cache_file), exist_ok=True)
+        jieba.dt.cache_file = dict_cache_file
+    jieba.initialize()
+    if user_dict_path and os.path.exists(user_dict_path):
+        jieba.load_userdict(user_dict_path)
+
+
+def _segment(text, for_search):
+    """for_search=True 时使用搜索引擎模式，长词会额外切出其中的短词"""
+    return tuple(jieba.cut_for_search(text) if for_search else jieba.cut(text))
+
+
+def _cut_batch(texts, for_search=False):
+    """子进程中执行的批量分词"""
+    return [_segment(text, for_search) for text in texts]
+
+
+class TokenizerService:
+    """进程级分词服务，线程安全"""
+    def __init__(self):
+        self._init_lock = threading.Lock()
+        self._memo_lock = threading.Lock()
+        self._initialized = False
+        self._memo = OrderedDict()
+        self._pool = None
+        self.init_seconds = 0.0
+        self.user_dict_terms = 0
+        self.hits = 0
+        self.misses = 0
+        self.chars = 0
+        self.seconds = 0.0
+        self.parallel_batches = 0
+
+    def initialize(self):
+        """加载词典；重复调用无副作用"""
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            config = get_tokenizer_config()
+            start = time.perf_counter()
+            _configure_jieba(config.get("user_dict_path"), config.get("dict_cache_file"))
+            self.init_seconds = time.perf_counter() - start
+
+            user_dict_path = config.get("user_dict_path")
+            if user_dict_path and os.path.exists(user_dict_path):
+                with open(user_dict_path, "r", encoding="utf-8") as f:
+                    self.user_dict_terms = sum(1 for line in f if line.strip())
+            self._initialized = True
+
+    # ---------- 缓存 ----------
+
+    def _memo_get(self, text):
+        with self._memo_lock:
+            tokens = self._memo.get(text)
+            if tokens is None:
+                self.misses += 1
+                return None
+            self._memo.move_to_end(text)
+            self.hits += 1
+            return tokens
+
+    def _memo_put(self, text, tokens):
+        memo_size = get_tokenizer_config().get("memo_size", 50000)
+        with self._memo_lock:
+            self._memo[text] = tokens
+            self._memo.move_to_end(text)
+            while len(self._memo) > memo_size:
+                self._memo.popitem(last=False)
+
+    # ---------- 分词 ----------
+
+    def cut(self, text, for_search=False):
+        """分词，返回词元组（结果会被缓存，不要修改）"""
+        key = (for_search, text)
+        tokens = self._memo_get(key)
+        if tokens is not None:
+            return tokens
+        self.initialize()
+        start = time.perf_counter()
+        tokens = _segment(text, for_search)
+        self._record(len(text), time.perf_counter() - start)
+        self._memo_put(key, tokens)
+        return tokens
+
+    def cut_many(self, texts, for_search=False):
+        """批量分词，结果与输入顺序一致；未命中缓存的文本总字数较大时使用进程池"""
+        texts = list(texts)
+        results = [None] * len(texts)
+        missing = {}
+        for i, text in enumerate(texts):
+            tokens = self._memo_get((for_search, text))
+            if tokens is not None:
+                results[i] = tokens
+            else:
+                missing.setdefault(text, []).append(i)
+        if not missing:
+            return results
+
+        self.initialize()
+        pending = list(missing.keys())
+        total_chars = sum(len(text) for text in pending)
+        config = get_tokenizer_config()
+        workers = config.get("parallel_workers") or os.cpu_count() or 1
+
+        start = time.perf_counter()
+        if workers > 1 and len(pending) > 1 and total_chars >= config.get("parallel_min_chars", 200000):
+            segmented = self._cut_parallel(pending, workers, for_search)
+        else:
+            segmented = _cut_batch(pending, for_search)
+        self._record(total_chars, time.perf_counter() - start)
+
+        for text, tokens in zip(pending, segmented):
+            self._memo_put((for_search, text), tokens)
+            for i in missing[text]:
+                results[i] = tokens
+        return results
+
+    def _cut_parallel(self, texts, workers, for_search):
+        pool = self._get_pool(workers)
+        # 每个进程分到若干批，兼顾负载均衡和进程间传输开销
+        batch_size = max(1, len(texts) // (workers * 4))
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        self.parallel_batches += len(batches)
+        segmented = []
+        for batch_result in pool.map(_cut_batch, batches, [for_search] * len(batches)):
+            segmented.extend(batch_result)
+        return segmented
+
+    def _get_pool(self, workers):
+        with self._init_lock:
+            if self._pool is None:
+                config = get_tokenizer_config()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    initializer=_configure_jieba,
+                    initargs=(config.get("user_dict_path"), config.get("dict_cache_file"))
+                )
+                atexit.register(self.shutdown)
+            return self._pool
+
+    def shutdown(self):
+        with self._init_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _record(self, chars, seconds):
+        with self._memo_lock:
+            self.chars += chars
+            self.seconds += seconds
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "initialized": self._initialized,
+            "init_seconds": self.init_seconds,
+            "user_dict_terms": self.user_dict_terms,
+            "memo_entries": len(self._memo),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "chars": self.chars,
+            "chars_per_second": self.chars / self.seconds if self.seconds else 0.0,
+            "parallel_batches": self.parallel_batches
+        }
+
+
+# 全局分词服务
+tokenizer_service = TokenizerService()
@@ -1,79 +1,67 @@
-from pinecone import Pinecone, ServerlessSpec
-from sentence_transformers import SentenceTransformer
 import streamlit as st
 import tiktoken
 import traceback
 import time
-import jieba  # 添加中文分词库
 import networkx as nx
 import json
-from openai import OpenAI
+import re
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from config import get_pinecone_config, get_openai_client, get_sentence_transformer_config
+from config import get_pinecone_config, get_openai_client, get_system_config, make_api_request
+from embedding_engine import encode_texts, iter_embeddings
+from local_vector_store import get_local_index
+from pinecone_connection import pinecone_manager
+from text_chunker import iter_chunks
+from tfidf_index import get_tfidf_index
+from bm25_index import get_bm25_index
+from hybrid_search import SCORE_LABELS, filter_by_score, hybrid_query
+from graph_store import get_graph_store
+from vector_upsert import BatchUpserter, delete_ids, iter_new_chunks, list_record_ids, make_chunk_id
+
+# 患者姓名识别（病历中的姓名均为"姓+某某"形式）
+COMMON_SURNAMES = "李王张刘陈杨黄周吴马蒲赵钱孙朱胡郭何高林罗郑梁谢宋唐许邓冯韩曹曾彭萧蔡潘田董袁于余叶蒋杜苏魏程吕丁沈任姚卢傅钟姜崔谭廖范汪陆金石戴贾韦夏邱方侯邹熊孟秦白江阎薛尹段雷黎史龙陶贺顾毛郝龚邵万钱严覃武戴莫孔向汤"
+PATIENT_NAME_PATTERN = re.compile(f'([{COMMON_SURNAMES}])某某')
+RECORD_DATE_PATTERN = re.compile(r'(?:入院日期|住院日期)\s*[:：]?\s*(\d{4})\s*[-年./]\s*(\d{1,2})\s*[-月./]\s*(\d{1,2})')
+
+def extract_patient_name(text: str):
+    """从文本中提取患者姓名，未识别到时返回 None"""
+    match = PATIENT_NAME_PATTERN.search(text or "")
+    return match.group(1) + "某某" if match else None
+
+def extract_record_date(text: str):
+    """从病历中提取入院日期（YYYY-MM-DD），未识别到时返回 None"""
+    match = RECORD_DATE_PATTERN.search(text or "")
+    if not match:
+        return None
+    year, month, day = match.groups()
+    return f"{year}-{int(month):02d}-{int(day):02d}"
 
 # 初始化 Pinecone
 def init_pinecone():
-    """初始化 Pinecone 客户端"""
+    """初始化向量索引（Pinecone 或本地后端，由 PINECONE_CONFIG["backend"] 决定）"""
     try:
         # 使用配置文件中的Pinecone设置
         config = get_pinecone_config()
-        pc = Pinecone(api_key=config["api_key"])
-        
-        index_name = config["index_name"]
-        
-        # 检查索引是否存在
-        existing_indexes = pc.list_indexes()
-        index_names = [index.name for index in existing_indexes]
-        
-        if index_name not in index_names:
-            st.write("创建新的 Pinecone 索引...")
-            pc.create_index(
-                name=index_name,
-                dimension=config["dimension"],
-                metric=config["metric"],
-                spec=ServerlessSpec(
-                    cloud="aws",
-                    region="us-east-1"
-                )
+        if config.get("backend", "pinecone") == "local":
+            return get_local_index(
+                config["local_index_path"], config["dimension"], config["metric"], config.get("ann")
             )
-            st.write("✅ 新索引创建成功")
-        else:
-            st.write("✅ 使用现有的 Pinecone 索引")
         
-        return pc.Index(index_name)
+        # 客户端和 Index 句柄在进程内复用，索引存在性按 TTL 惰性校验
+        index, status = pinecone_manager.get_index()
+        if status == "created":
+            st.write("✅ 新的 Pinecone 索引创建成功")
+        
+        return index
     except Exception as e:
-        st.error(f"Pinecone 初始化失败: {str(e)}")
+        st.error(f"向量索引初始化失败: {str(e)}")
         return None
 
 def get_embeddings(texts):
     """获取文本的向量表示"""
     try:
-        # 使用配置文件中的sentence transformer设置
-        import os
-        os.environ['HF_HUB_OFFLINE'] = '0'
-        os.environ['TRANSFORMERS_OFFLINE'] = '0'
-        
-        st_config = get_sentence_transformer_config()
-        model = SentenceTransformer(
-            st_config["model_name"], 
-            cache_folder=st_config["cache_folder"],
-            device=st_config["device"]
-        )
-        
-        # 对中文文本进行预处理
-        processed_texts = []
-        for text in texts:
-            # 使用jieba进行中文分词
-            words = jieba.cut(text)
-            # 将分词结果重新组合，用空格连接
-            processed_text = " ".join(words)
-            processed_texts.append(processed_text)
-        
-        # 获取向量表示
-        embeddings = model.encode(processed_texts)
-        return embeddings
+        # 分词预处理后按长度分桶批量编码，输出归一化的 float32 向量
+        # （模型从进程级注册表获取，只有首次调用会加载权重）
+        return encode_texts(texts, dtype="float32")
     except Exception as e:
         st.warning(f"无法使用sentence-transformers模型: {str(e)}")
         st.info("使用简单的文本向量化方法作为备选...")
@@ -82,71 +70,137 @@ def get_embeddings(texts):
         return get_simple_embeddings(texts)
 
 def get_simple_embeddings(texts):
-    """使用TF-IDF的简单向量化方法"""
+    """
+    不依赖模型的向量化：用持久化的 TF-IDF 词表计算向量，再哈希折叠到索引维度
+    词表在导入时增量更新，不同调用之间的向量可以相互比较
+    """
+    return get_tfidf_index().hashed_embeddings(texts, get_pinecone_config()["dimension"])
+
+def query_index(index, query: str, top_k: int, filter=None, min_score=None):
+    """
+    按 SYSTEM_CONFIG 的 retrieval_mode 检索：dense 向量 / bm25 词法 / hybrid 两路 RRF 融合
+    min_score 为余弦相似度阈值（混合模式下在融合前作用于向量一路），返回的结果已经过滤
+    模型不可用时退化为词法检索；返回 {'matches': [...], 'score_label': 分数名称}
+    """
+    system_config = get_system_config()
+    mode = system_config.get("retrieval_mode", "dense")
+    if mode != "bm25":
+        try:
+            query_embedding = encode_texts([query], dtype="float32")[0]
+        except Exception as e:
+            st.warning(f"无法使用sentence-transformers模型: {str(e)}")
+            if mode == "dense":
+                st.info("改用 TF-IDF 词法检索...")
+                results = filter_by_score(get_tfidf_index().query(query, top_k=top_k, filter=filter), min_score)
+                return {'matches': results['matches'], 'score_label': SCORE_LABELS["dense"]}
+            st.info("改用 BM25 词法检索...")
+            mode = "bm25"
+    
+    def dense_search(_query, dense_top_k, dense_filter):
+        return index.query(
+            vector=query_embedding.tolist(),
+            top_k=dense_top_k,
+            include_metadata=True,
+            filter=dense_filter
+        )
+    
+    def lexical_search(lexical_query, lexical_top_k, lexical_filter):
+        return get_bm25_index().query(lexical_query, top_k=lexical_top_k, filter=lexical_filter)
+    
+    results = hybrid_query(dense_search, lexical_search, query, top_k, filter, mode,
+                           rrf_k=system_config.get("rrf_k", 60), min_score=min_score)
+    return {'matches': list(results['matches']), 'score_label': SCORE_LABELS[mode]}
+
+def iter_chunk_embeddings(chunks):
+    """按窗口流式产出 (文本块, 向量)，模型不可用时剩余部分改用简单向量化"""
+    chunks = iter(chunks)
+    pending = []  # 已从生成器取出、尚未产出向量的文本块
+    
+    def feed():
+        for chunk in chunks:
+            pending.append(chunk)
+            yield chunk
+    
     try:
-        # 对中文文本进行预处理
-        processed_texts = []
-        for text in texts:
-            # 使用jieba进行中文分词
-            words = jieba.cut(text)
-            processed_text = " ".join(words)
-            processed_texts.append(processed_text)
-        
-        # 使用TF-IDF向量化
-        vectorizer = TfidfVectorizer(max_features=384, stop_words=None)
-        tfidf_matrix = vectorizer.fit_transform(processed_texts)
-        
-        # 转换为密集矩阵并确保维度为384
-        embeddings = tfidf_matrix.toarray()
-        
-        # 如果特征数少于384，用零填充
-        if embeddings.shape[1] < 384:
-            padding = np.zeros((embeddings.shape[0], 384 - embeddings.shape[1]))
-            embeddings = np.hstack([embeddings, padding])
-        elif embeddings.shape[1] > 384:
-            # 如果特征数多于384，截取前384个
-            embeddings = embeddings[:, :384]
-        
-        return embeddings
+        for window, embeddings in iter_embeddings(feed(), dtype="float32"):
+            del pending[:len(window)]
+            yield window, embeddings
     except Exception as e:
-        st.error(f"简单向量化也失败了: {str(e)}")
-        # 最后的备选方案：返回随机向量
-        return np.random.random((len(texts), 384))
+        st.warning(f"无法使用sentence-transformers模型: {str(e)}")
+        st.info("使用简单的文本向量化方法作为备选...")
+        remaining = pending + list(chunks)
+        if remaining:
+            yield remaining, get_simple_embeddings(remaining)
 
-def vectorize_document(text: str, file_name: str = None):
-    """向量化文档并存储到 Pinecone"""
+def vectorize_document(text: str, file_name: str = None, record_id=None):
+    """
+    向量化文档并存储到 Pinecone
+    record_id 为记录的稳定标识（如 vector_upsert.source_record_key 按文档内容生成的标识），
+    重复导入时必须相同才能跳过已有的块；未提供时以文件名标识记录
+    """
     try:
-        # 文本分块
-        chunks = text_to_chunks(text)
-        
-        # 获取 embeddings
-        embeddings = get_embeddings(chunks)
-        
         # 初始化 Pinecone
         index = init_pinecone()
         if not index:
             return None, None
         
-        # 生成唯一的文档ID前缀（确保是ASCII字符）
-        doc_id = f"doc_{int(time.time())}"  # 不使用文件名，改用时间戳
-        
-        # 上传向量到 Pinecone
-        vectors = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            vector = {
-                'id': f"{doc_id}_chunk_{i}",  # 使用时间戳作为ID前缀
-                'values': embedding.tolist(),
-                'metadata': {
-                    'text': chunk,
-                    'original_file_name': file_name,  # 在元数据中保存原始文件名
-                    'chunk_index': i,
-                    'timestamp': time.time()
-                }
-            }
-            vectors.append(vector)
-        
-        # 批量上传
-        index.upsert(vectors=vectors)
+        # 可过滤的元数据：患者姓名优先取自文件名，其次取自正文
+        patient_name = extract_patient_name(file_name) or extract_patient_name(text)
+        record_date = extract_record_date(text)
+        filter_metadata = {}
+        if patient_name:
+            filter_metadata['patient_name'] = patient_name
+        if record_date:
+            filter_metadata['record_date'] = record_date
+        
+        # 边分块边编码边上传，不在内存中保留整份文档的向量列表
+        # 块 ID 由记录标识和内容哈希生成：重复导入时已存在的块既不编码也不上传
+        record_key = str(record_id) if record_id is not None else file_name
+        tfidf_index = get_tfidf_index()
+        bm25_index = get_bm25_index()
+        
+        def index_lexically(chunk_stream):
+            # 所有块都写入 TF-IDF 词表和 BM25 倒排表（已存在的 ID 会被跳过），备选向量化和词法检索依赖它们
+            for chunk in chunk_stream:
+                chunk_ids = [make_chunk_id(record_key, chunk)]
+                chunk_metadata = [{'original_file_name': file_name, **filter_metadata}]
+                tfidf_index.add_documents(chunk_ids, [chunk], chunk_metadata)
+                bm25_index.add_documents(chunk_ids, [chunk], chunk_metadata)
+                yield chunk
+        
+        chunks = []
+        positions = {}
+        new_chunks = iter_new_chunks(index, record_key, index_lexically(iter_chunks(text)), positions, chunks)
+        with BatchUpserter(index) as upserter:
+            for window, embeddings in iter_chunk_embeddings(new_chunks):
+                for chunk, embedding in zip(window, embeddings):
+                    chunk_id = make_chunk_id(record_key, chunk)
+                    upserter.add({
+                        'id': chunk_id,
+                        'values': embedding.tolist(),
+                        'metadata': {
+                            'text': chunk,
+                            'original_file_name': file_name,  # 在元数据中保存原始文件名
+                            'chunk_index': positions[chunk_id],
+                            'timestamp': time.time(),
+                            **filter_metadata
+                        }
+                    })
+        
+        # 同一记录重新导入（内容有修改）后，不再出现的旧块从向量库和词法索引中删除；没有记录标识时无法判断归属，不删除
+        stale_ids = list_record_ids(index, record_key) - set(positions) if record_key else set()
+        if stale_ids:
+            delete_ids(index, stale_ids)
+            tfidf_index.delete_documents(stale_ids)
+            bm25_index.delete_documents(stale_ids)
+        
+        tfidf_index.save()
+        bm25_index.save()
+        
+        stats = upserter.stats
+        stats["skipped"] = len(chunks) - stats["vectors"]
+        stats["deleted"] = len(stale_ids)
+        st.session_state.last_upsert_stats = stats
         
         return chunks, index
     except Exception as e:
@@ -155,27 +209,14 @@ def vectorize_document(text: str, file_name: str = None):
         st.error(f"错误堆栈: {traceback.format_exc()}")
         return None, None
 
-def search_similar(query: str, index, chunks=None, top_k=3):
-    """在 Pinecone 中搜索相似内容"""
+def search_similar(query: str, index, chunks=None, top_k=3, filter=None):
+    """在 Pinecone 中搜索相似内容，filter 为元数据过滤条件（如 {"patient_name": "周某某"}）"""
     try:
-        # 获取查询的 embedding
-        query_embedding = get_embeddings([query])[0]
-        
         # 直接从 Pinecone 中搜索，不再使用本地的 chunks
-        results = index.query(
-            vector=query_embedding.tolist(),
-            top_k=top_k,
-            include_metadata=True
-        )
-        
-        # 只返回相似度较高的相关文本
-        matched_texts = []
-        for match in results['matches']:
-            if match['score'] >= 0.3:  # 相似度阈值
-                text = match['metadata']['text']
-                matched_texts.append(text)
-        
-        return matched_texts
+        # 只返回相似度较高的相关文本（阈值在检索时作用于向量相似度）
+        results = query_index(index, query, top_k, filter,
+                              min_score=get_system_config().get("similarity_threshold", 0.3))
+        return [match['metadata']['text'] for match in results['matches']]
     except Exception as e:
         st.error(f"搜索失败: {str(e)}")
         st.error(f"错误类型: {type(e).__name__}")
@@ -190,54 +231,53 @@ def get_vector_search_results(query: str) -> list:
         if not index:
             return []
         
-        # 从查询中提取患者姓名
-        import re
-        # 更宽松的患者姓名匹配，包括常见姓氏+某某的模式
-        common_surnames = "李王张刘陈杨黄周吴马蒲赵钱孙朱胡郭何高林罗郑梁谢宋唐许邓冯韩曹曾彭萧蔡潘田董袁于余叶蒋杜苏魏程吕丁沈任姚卢傅钟姜崔谭廖范汪陆金石戴贾韦夏邱方侯邹熊孟秦白江阎薛尹段雷黎史龙陶贺顾毛郝龚邵万钱严覃武戴莫孔向汤"
-        pattern = f'([{common_surnames}])某某'
-        patient_name_match = re.search(pattern, query)
-        if not patient_name_match:
+        # 从查询中提取患者姓名（常见姓氏+某某的模式）
+        patient_name = extract_patient_name(query)
+        if not patient_name:
             # 如果没有找到特定患者姓名，尝试通用搜索
             st.info("未识别到特定患者姓名，进行通用向量搜索...")
-            patient_name = None
         else:
-            patient_name = patient_name_match.group(1) + "某某"
             st.write(f"查询患者：{patient_name}")
         
-        # 获取查询的 embedding
-        query_embedding = get_embeddings([query])[0]
+        # 指定患者时保持一个最低相似度阈值，通用搜索使用较高的阈值
+        min_score = 0.01 if patient_name else get_system_config().get("similarity_threshold", 0.3)
+        results = {'matches': [], 'score_label': SCORE_LABELS["dense"]}
+        if patient_name:
+            # 把患者过滤条件下推到索引，只在该患者的文档块中排序
+            results = query_index(
+                index, query,
+                top_k=get_system_config()["max_results"],
+                filter={"patient_name": {"$eq": patient_name}},
+                min_score=min_score
+            )
         
-        # 在 Pinecone 中搜索，不使用过滤器
-        results = index.query(
-            vector=query_embedding.tolist(),
-            top_k=50,  # 增加返回结果数量
-            include_metadata=True
-        )
+        if not results['matches']:
+            # 通用搜索，或兼容没有 patient_name 元数据的旧数据（按文件名过滤）
+            results = query_index(index, query, top_k=get_system_config()["vector_top_k"], min_score=min_score)
         
-        # 在结果中过滤和处理匹配结果
+        # 在结果中过滤和处理匹配结果；混合检索的分数是排名融合分，不是相似度
+        score_label = results['score_label']
         matched_texts = []
         if results['matches']:
             for match in results['matches']:
-                file_name = match['metadata'].get('original_file_name', '')
+                file_name = match['metadata'].get('original_file_name') or ''
                 score = match['score']
                 text = match['metadata']['text']
                 
                 # 如果指定了患者姓名，优先匹配该患者的文件
                 if patient_name:
-                    if patient_name in file_name:
+                    if (match['metadata'].get('patient_name') == patient_name or
+                            patient_name in file_name):
                         st.write(f"找到患者匹配：")
                         st.write(f"- 文件名: {file_name}")
-                        st.write(f"- 相似度: {score:.2f}")
-                        
-                        if score >= 0.01:  # 保持一个最低相似度阈值
-                            matched_texts.append(f"[{file_name}] (相似度: {score:.2f}): {text}")
+                        st.write(f"- {score_label}: {score:.4f}")
+                        matched_texts.append(f"[{file_name}] ({score_label}: {score:.4f}): {text}")
                 else:
                     # 如果没有指定患者姓名，返回所有相关度较高的结果
-                    if score >= 0.3:  # 提高通用搜索的相似度阈值
-                        st.write(f"找到相关匹配：")
-                        st.write(f"- 文件名: {file_name}")
-                        st.write(f"- 相似度: {score:.2f}")
-                        matched_texts.append(f"[{file_name}] (相似度: {score:.2f}): {text}")
+                    st.write(f"找到相关匹配：")
+                    st.write(f"- 文件名: {file_name}")
+                    st.write(f"- {score_label}: {score:.4f}")
+                    matched_texts.append(f"[{file_name}] ({score_label}: {score:.4f}): {text}")
                 
                 # 限制返回结果数量
                 if len(matched_texts) >= 5:
@@ -248,26 +288,9 @@ def get_vector_search_results(query: str) -> list:
         st.error(f"向量搜索错误: {str(e)}")
         return []
 
-def text_to_chunks(text: str, chunk_size: int = 100000):
-    """将文本分割成小块"""
-    words = text.split()
-    chunks = []
-    current_chunk = []
-    current_size = 0
-    
-    for word in words:
-        current_chunk.append(word)
-        current_size += len(word) + 1  # +1 for space
-        
-        if current_size >= chunk_size:
-            chunks.append(' '.join(current_chunk))
-            current_chunk = []
-            current_size = 0
-    
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    
-    return chunks
+def text_to_chunks(text: str, max_tokens: int = None, overlap_tokens: int = None):
+    """按病历章节和中文句子把文本切成带重叠的小块（token 预算见 SYSTEM_CONFIG）"""
+    return list(iter_chunks(text, max_tokens, overlap_tokens))
 
 def clean_vector_store():
     """清理向量数据库"""
@@ -284,6 +307,8 @@ def clean_vector_store():
                 if stats.total_vector_count > 0:
                     # 由于新版本可能不支持直接删除所有向量，我们创建一个新的索引来替代
                     st.warning("当前索引包含数据，建议手动清理或重新创建索引")
+            get_tfidf_index().clear()
+            get_bm25_index().clear()
             st.success("✅ Pinecone 向量数据库已清空")
             return True
     except Exception as e:
@@ -305,37 +330,31 @@ def get_graph_search_results(query: str) -> list:
         if not query_obj:
             return []
         
-        G = nx.read_gexf("medical_graph.gexf")
         results = []
         
-        # 根据查询条件执行搜索
-        start_nodes = [node for node, data in G.nodes(data=True)
-                      if data.get('type') == query_obj["start_node"]["type"] and 
-                         node == query_obj["start_node"]["name"]]
+        # 根据查询条件执行搜索（起点和邻接关系都走内存索引）
+        start_node = query_obj["start_node"]["name"]
+        matches = get_graph_store().match(
+            query_obj["start_node"]["type"],
+            start_node,
+            query_obj["relationship"],
+            query_obj["end_node"]["type"]
+        )
         
-        for start_node in start_nodes:
-            # 获取所有邻居节点
-            for neighbor in G.neighbors(start_node):
-                edge_data = G.get_edge_data(start_node, neighbor)
-                neighbor_data = G.nodes[neighbor]
-                
-                # 检查关系类型和终点节点类型是否匹配
-                if (edge_data.get("relationship") == query_obj["relationship"] and
-                    neighbor_data.get('type') == query_obj["end_node"]["type"]):
-                    
-                    # 构建结果
-                    result = []
-                    for attr in query_obj["return"]:
-                        node_type, attr_name = attr.split(".")
-                        if node_type == "end_node":
-                            # 如果是诊断节点，直接使用节点的名称作为诊断内容
-                            if neighbor_data.get('type') in ['admission_diagnosis', 'discharge_diagnosis']:
-                                result.append(f"{attr_name}: {neighbor}")
-                            else:
-                                result.append(f"{attr_name}: {neighbor_data.get(attr_name, '')}")
-                    
-                    if result:  # 只添加有内容的结果
-                        results.append(f"{start_node} -> {edge_data.get('relationship')} -> {' | '.join(result)}")
+        for neighbor, neighbor_data, edge_data in matches:
+            # 构建结果
+            result = []
+            for attr in query_obj["return"]:
+                node_type, attr_name = attr.split(".")
+                if node_type == "end_node":
+                    # 如果是诊断节点，直接使用节点的名称作为诊断内容
+                    if neighbor_data.get('type') in ['admission_diagnosis', 'discharge_diagnosis']:
+                        result.append(f"{attr_name}: {neighbor}")
+                    else:
+                        result.append(f"{attr_name}: {neighbor_data.get(attr_name, '')}")
+            
+            if result:  # 只添加有内容的结果
+                results.append(f"{start_node} -> {edge_data.get('relationship')} -> {' | '.join(result)}")
         
         return results
     except Exception as e:
@@ -348,27 +367,14 @@ def generate_graph_query(query: str) -> dict:
     """使用LLM生成图数据库查询条件"""
     try:
         st.write("开始创建OpenAI客户端...")
-        client = OpenAI(
-            api_key="sk-1pUmQlsIkgla3CuvKTgCrzDZ3r0pBxO608YJvIHCN18lvOrn",
-            base_url="https://api.chatanywhere.tech/v1",
-            timeout=60
-        )
+        client, model, temperature = get_openai_client()
         st.write("✅ OpenAI客户端创建成功")
         
-        # 读取图数据库的结构信息
-        G = nx.read_gexf("medical_graph.gexf")
-        
-        # 获取图的基本信息
-        graph_info = {
-            "node_types": list(set(nx.get_node_attributes(G, 'type').values())),
-            "relationships": list(set(nx.get_edge_attributes(G, 'relationship').values())),
-            "nodes_sample": {
-                node: data for node, data in list(G.nodes(data=True))[:5]
-            },
-            "edges_sample": {
-                f"{u}->{v}": data for u, v, data in list(G.edges(data=True))[:5]
-            }
-        }
+        # 读取图数据库的结构信息（图文件未变化时直接复用缓存）
+        graph_info = get_graph_store().schema()
+        if graph_info is None:
+            st.warning("图数据库文件不存在，请先导入数据")
+            return None
         
         prompt = f"""请根据问题和图数据库结构生成图数据库查询条件。
 
@@ -399,9 +405,9 @@ def generate_graph_query(query: str) -> dict:
 请直接返回查询条件的JSON字符串，不要包含任何其他内容。"""
 
         st.write("🔄 正在调用OpenAI API...")
-        response = client.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
-            messages=[
+        response = make_api_request(
+            client, model,
+            [
                 {
                     "role": "system", 
                     "content": "你是一个图数据库查询专家。请根据实际的图数据库结构生成精确的查询条件。"
@@ -411,7 +417,7 @@ def generate_graph_query(query: str) -> dict:
                     "content": prompt
                 }
             ],
-            temperature=0.1
+            temperature
         )
         st.write("✅ OpenAI API调用成功")
         
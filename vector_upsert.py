@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+向量批量上传
+固定大小分批、有界线程池并发上传、失败指数退避重试；
+文本块 ID 由记录前缀（记录标识的哈希）和内容哈希组成，重复导入时已存在的块直接跳过，
+同一记录不再出现的旧块按前缀列出后删除
+"""
+
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import get_pinecone_config
+
+
+def source_record_key(text):
+    """按源文档内容生成的记录标识：同一份文档无论导入几次都得到同一个标识"""
+    return "source:" + hashlib.sha1((text or "").encode("utf-8")).hexdigest()
+
+
+def record_prefix(record_key):
+    """一条记录所有文本块共用的 ID 前缀（Pinecone 要求 ID 为 ASCII）"""
+    digest = hashlib.sha1(str(record_key or "").encode("utf-8")).hexdigest()[:16]
+    return f"chunk_{digest}#"
+
+
+def make_chunk_id(record_key, chunk_text):
+    """同一记录的同一段文本总是得到同一个 ID"""
+    return record_prefix(record_key) + hashlib.sha1(chunk_text.encode("utf-8")).hexdigest()
+
+
+def list_record_ids(index, record_key):
+    """列出索引中属于某条记录的全部块 ID"""
+    ids = set()
+    for page in index.list(prefix=record_prefix(record_key)):
+        ids.update(page)
+    return ids
+
+
+def delete_ids(index, ids, batch_size=1000):
+    """分批删除向量（Pinecone 单次 delete 最多 1000 个 ID）"""
+    ids = sorted(ids)
+    for start in range(0, len(ids), batch_size):
+        index.delete(ids=ids[start:start + batch_size])
+
+
+def fetch_existing_ids(index, ids, batch_size=100):
+    """查询哪些 ID 已经存在于索引中"""
+    existing = set()
+    ids = list(ids)
+    for start in range(0, len(ids), batch_size):
+        response = index.fetch(ids=ids[start:start + batch_size])
+        existing.update(response.vectors.keys())
+    return existing
+
+
+def iter_new_chunks(index, record_key, chunks, positions, seen_chunks, lookahead=100):
+    """
+    过滤掉索引中已存在的文本块，只产出需要编码上传的块
+    positions 记录 ID -> 块序号，seen_chunks 收集全部块（含跳过的），供调用方使用
+    """
+    def flush(window):
+        ids = [chunk_id for chunk_id, _ in window]
+        existing = fetch_existing_ids(index, ids)
+        for chunk_id, chunk in window:
+            if chunk_id not in existing:
+                yield chunk
+
+    window = []
+    for chunk in chunks:
+        chunk_id = make_chunk_id(record_key, chunk)
+        seen_chunks.append(chunk)
+        if chunk_id in positions:
+            continue  # 同一文档内的重复段落只保留第一次出现
+        positions[chunk_id] = len(seen_chunks) - 1
+        window.append((chunk_id, chunk))
+        if len(window) >= lookahead:
+            yield from flush(window)
+            window = []
+    if window:
+        yield from flush(window)
+
+
+class BatchUpserter:
+    """
+    把向量攒成固定大小的批次，提交到有界线程池并发上传
+    在途批次数不超过 workers * 2，避免上传慢时内存中堆积过多向量
+    """
+    def __init__(self, index, batch_size=None, workers=None, max_retries=None, backoff=0.5):
+        config = get_pinecone_config()
+        self.index = index
+        self.batch_size = batch_size or config.get("upsert_batch_size", 100)
+        self.workers = workers or config.get("upsert_workers", 4)
+        self.max_retries = config.get("upsert_max_retries", 3) if max_retries is None else max_retries
+        self.backoff = backoff
+
+        # 本地后端每次 upsert 都会落盘，批量上传时改为结束后统一保存一次
+        self._local = hasattr(index, "save")
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._slots = threading.BoundedSemaphore(self.workers * 2)
+        self._futures = []
+        self._batch = []
+        self._stats_lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.stats = {"vectors": 0, "batches": 0, "retries": 0, "skipped": 0, "seconds": 0.0}
+
+    def _send(self, batch):
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    if self._local:
+                        self.index.upsert(vectors=batch, persist=False)
+                    else:
+                        self.index.upsert(vectors=batch)
+                    break
+                except Exception:
+                    if attempt == self.max_retries:
+                        raise
+                    with self._stats_lock:
+                        self.stats["retries"] += 1
+                    time.sleep(self.backoff * (2 ** attempt) * (1 + random.random()))
+            with self._stats_lock:
+                self.stats["vectors"] += len(batch)
+                self.stats["batches"] += 1
+        finally:
+            self._slots.release()
+
+    def _submit(self):
+        batch, self._batch = self._batch, []
+        self._slots.acquire()
+        self._futures.append(self._executor.submit(self._send, batch))
+
+    def add(self, vector):
+        self._batch.append(vector)
+        if len(self._batch) >= self.batch_size:
+            self._submit()
+
+    def close(self):
+        """发送剩余批次并等待全部完成；任一批次重试后仍失败时抛出异常"""
+        try:
+            if self._batch:
+                self._submit()
+            for future in self._futures:
+                future.result()
+            if self._local:
+                self.index.save()
+        finally:
+            self._executor.shutdown(wait=True)
+            self.stats["seconds"] = time.perf_counter() - self._started
+        return self.stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(wait=True)
+        return False